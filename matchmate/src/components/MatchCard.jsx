@@ -71,11 +71,17 @@ const MatchCard = ({ match }) => {
     <div className="bg-white/10 backdrop-blur-md rounded-2xl shadow-xl overflow-hidden">
       {/* Profile Image */}
       <div className="relative h-48">
-        <img
-          src={match.profile_picture || 'https://via.placeholder.com/400x300'}
-          alt={`${match.user.first_name}'s profile`}
-          className="w-full h-full object-cover"
-        />
+        <picture>
+          {match.picture_variants && (
+            <source srcSet={match.picture_variants.card.webp} type="image/webp" />
+          )}
+          <img
+            src={match.picture_variants?.card.jpeg || match.profile_picture || 'https://via.placeholder.com/400x300'}
+            alt={`${match.user.first_name}'s profile`}
+            className="w-full h-full object-cover"
+            loading="lazy"
+          />
+        </picture>
         <div className="absolute inset-0 bg-gradient-to-t from-black/60 to-transparent"></div>
       </div>
 
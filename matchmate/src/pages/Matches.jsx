@@ -113,6 +113,7 @@ const MessageBox = ({ match, onClose }) => {
 
 const Matches = () => {
   const [matches, setMatches] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [filters, setFilters] = useState({
     minAge: '',
@@ -126,10 +127,13 @@ const Matches = () => {
     fetchMatches();
   }, []);
 
-  const fetchMatches = async () => {
+  const fetchMatches = async (cursor = null) => {
     try {
       const userData = JSON.parse(localStorage.getItem('user'));
-      const response = await fetch('http://127.0.0.1:8000/api/profiles/potential_matches/', {
+      const url = cursor
+        ? `http://127.0.0.1:8000/api/profiles/potential_matches/?cursor=${encodeURIComponent(cursor)}`
+        : 'http://127.0.0.1:8000/api/profiles/potential_matches/';
+      const response = await fetch(url, {
         headers: {
           'Authorization': `Token ${userData.token}`
         }
@@ -143,10 +147,12 @@ const Matches = () => {
       console.log('Fetched matches:', data); // Debug log
       
       // Filter out the current user's profile
-      const filteredMatches = data.filter(match => match.user.id !== userData.user_id);
+      const filteredMatches = data.results.filter(match => match.user.id !== userData.user_id);
       console.log('Filtered matches:', filteredMatches); // Debug log
       
-      setMatches(filteredMatches);
+      // Results are ranked best first; later pages are appended
+      setMatches(prev => cursor ? [...prev, ...filteredMatches] : filteredMatches);
+      setNextCursor(data.next);
       setLoading(false);
     } catch (error) {
       console.error('Error fetching matches:', error);
@@ -303,6 +309,16 @@ const Matches = () => {
               ))}
             </div>
           )}
+          {!loading && nextCursor && (
+            <div className="text-center mt-8">
+              <button
+                onClick={() => fetchMatches(nextCursor)}
+                className="bg-secondary hover:bg-white text-white hover:text-primary px-6 py-2 rounded-lg font-semibold transition-colors duration-300"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>
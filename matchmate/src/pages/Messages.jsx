@@ -9,10 +9,16 @@ const Messages = () => {
   const [conversations, setConversations] = useState([]);
   const [selectedConversation, setSelectedConversation] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
+  // Profile cards of message senders, keyed by profile id
+  const [participants, setParticipants] = useState({});
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [socketConnected, setSocketConnected] = useState(false);
   const messagesEndRef = useRef(null);
+  const selectedConversationRef = useRef(null);
+  const messagesRef = useRef([]);
   const selectedUserId = location.state?.selectedUserId;
   const selectedUserName = location.state?.selectedUserName;
 
@@ -24,17 +30,85 @@ const Messages = () => {
       // If no user is specified, just fetch all conversations
       fetchConversations();
     }
+  }, [selectedUserId, selectedUserName]);
+
+  // Live updates are pushed over a WebSocket; the REST endpoints are only
+  // polled while the socket is down
+  useEffect(() => {
+    const userData = JSON.parse(localStorage.getItem('user'));
+    if (!userData || !userData.token) return;
+
+    let socket;
+    let retry;
+    let closedByUs = false;
+
+    const connect = () => {
+      socket = new WebSocket(`ws://127.0.0.1:8000/ws/chat/?token=${userData.token}`);
+      socket.onopen = () => setSocketConnected(true);
+      socket.onmessage = (e) => handleSocketEvent(JSON.parse(e.data));
+      socket.onclose = () => {
+        setSocketConnected(false);
+        if (!closedByUs) {
+          retry = setTimeout(connect, 5000);
+        }
+      };
+    };
+    connect();
+
+    return () => {
+      closedByUs = true;
+      clearTimeout(retry);
+      socket.close();
+    };
+  }, []);
+
+  useEffect(() => {
+    if (socketConnected) return;
     const interval = setInterval(fetchConversations, 5000); // Poll every 5 seconds
     return () => clearInterval(interval);
-  }, [selectedUserId, selectedUserName]);
+  }, [socketConnected]);
 
   useEffect(() => {
+    selectedConversationRef.current = selectedConversation;
     if (selectedConversation) {
+      // Also catches up on anything missed while the socket was reconnecting
       fetchMessages(selectedConversation.id);
-      const interval = setInterval(() => fetchMessages(selectedConversation.id), 3000);
+      if (socketConnected) return;
+      // Only ask for messages newer than the last one we already have
+      const interval = setInterval(() => {
+        const last = messagesRef.current[messagesRef.current.length - 1];
+        fetchMessages(selectedConversation.id, last ? { since: last.id } : {});
+      }, 3000);
       return () => clearInterval(interval);
     }
-  }, [selectedConversation]);
+  }, [selectedConversation, socketConnected]);
+
+  const handleSocketEvent = (event) => {
+    const openConversation = selectedConversationRef.current;
+    switch (event.type) {
+      case 'message.created':
+        if (openConversation?.id === event.conversation_id) {
+          setMessages(prev => prev.some(m => m.id === event.message.id) ? prev : [...prev, event.message]);
+          markRead(event.conversation_id);
+        }
+        break;
+      case 'conversation.read':
+        // Someone else's watermark moved: everything up to it is now read
+        if (openConversation?.id === event.conversation_id && event.reader_id !== JSON.parse(localStorage.getItem('user')).user_id) {
+          setMessages(prev => prev.map(m => m.id <= event.last_read_message_id ? { ...m, is_read: true } : m));
+        }
+        break;
+      case 'conversation.updated':
+        fetchConversations();
+        break;
+      default:
+        break;
+    }
+  };
+
+  useEffect(() => {
+    messagesRef.current = messages;
+  }, [messages]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -66,7 +140,7 @@ const Messages = () => {
       
       // Log each conversation's participants
       data.forEach(conversation => {
-        console.log(`Conversation ${conversation.id} participants:`, conversation.participants.map(p => `${p.user.first_name} (ID: ${p.user.id})`));
+        console.log(`Conversation ${conversation.id} participants:`, conversation.participants.map(p => `${p.first_name} (ID: ${p.user_id})`));
       });
       
       setConversations(data);
@@ -120,7 +194,24 @@ const Messages = () => {
     }
   };
 
-  const fetchMessages = async (conversationId) => {
+  // Moves our read watermark to the latest message in one request
+  const markRead = async (conversationId) => {
+    try {
+      const userData = JSON.parse(localStorage.getItem('user'));
+      await fetch(`http://127.0.0.1:8000/api/chat/conversations/${conversationId}/mark_read/`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Token ${userData.token}`
+        }
+      });
+    } catch (err) {
+      console.error('Error in markRead:', err);
+    }
+  };
+
+  // Without options this loads the latest page of the thread; `since` appends
+  // newer messages and `before` prepends an older page
+  const fetchMessages = async (conversationId, { since, before } = {}) => {
     try {
       const userData = JSON.parse(localStorage.getItem('user'));
       console.log('Fetching messages for conversation ID:', conversationId);
@@ -130,7 +221,12 @@ const Messages = () => {
         return;
       }
       
-      const response = await fetch(`http://127.0.0.1:8000/api/chat/conversations/${conversationId}/messages/`, {
+      const params = new URLSearchParams();
+      if (since) params.set('since', since);
+      if (before) params.set('before', before);
+      const query = params.toString();
+      
+      const response = await fetch(`http://127.0.0.1:8000/api/chat/conversations/${conversationId}/messages/${query ? `?${query}` : ''}`, {
         headers: {
           'Authorization': `Token ${userData.token}`
         }
@@ -144,7 +240,21 @@ const Messages = () => {
       
       const data = await response.json();
       console.log('Messages fetched:', data);
-      setMessages(data);
+      if (data.participants) {
+        setParticipants(prev => ({ ...prev, ...data.participants }));
+      }
+      if (since) {
+        setMessages(prev => [...prev, ...data.results.filter(m => !prev.some(p => p.id === m.id))]);
+      } else if (before) {
+        setMessages(prev => [...data.results, ...prev]);
+        setHasOlderMessages(data.has_more);
+      } else {
+        setMessages(data.results);
+        setHasOlderMessages(data.has_more);
+      }
+      if (!before && data.results.length) {
+        markRead(conversationId);
+      }
     } catch (err) {
       console.error('Error in fetchMessages:', err);
       setError(err.message);
@@ -200,7 +310,11 @@ const Messages = () => {
 
       console.log('Message sent successfully');
       setNewMessage('');
-      fetchMessages(selectedConversation.id);
+      if (responseData) {
+        setMessages(prev => prev.some(m => m.id === responseData.id) ? prev : [...prev, responseData]);
+      } else {
+        fetchMessages(selectedConversation.id);
+      }
     } catch (err) {
       console.error('Error in sendMessage:', err);
       setError(err.message);
@@ -214,16 +328,16 @@ const Messages = () => {
       const currentUserId = userData.id;
       
       // Find the participant that doesn't match the current user's ID
-      const otherParticipant = conversation.participants.find(p => p.user.id !== currentUserId);
+      const otherParticipant = conversation.participants.find(p => p.user_id !== currentUserId);
       
       if (!otherParticipant) {
         console.error('Could not find other participant in conversation:', conversation);
-        return { user: { id: 0, first_name: 'Unknown User' } };
+        return { user_id: 0, first_name: 'Unknown User' };
       }
       return otherParticipant;
     } catch (err) {
       console.error('Error in getOtherParticipant:', err);
-      return { user: { id: 0, first_name: 'Unknown User' } };
+      return { user_id: 0, first_name: 'Unknown User' };
     }
   };
 
@@ -266,7 +380,7 @@ const Messages = () => {
                 conversations.map(conversation => {
                   const otherParticipant = conversation.other_participant;
                   
-                  if (!otherParticipant || !otherParticipant.user) {
+                  if (!otherParticipant) {
                     return null;
                   }
                   
@@ -280,7 +394,7 @@ const Messages = () => {
                           : 'bg-black/30 text-white hover:bg-black/40'
                       }`}
                     >
-                      <div className="font-medium">{otherParticipant.user.first_name || 'Unknown User'}</div>
+                      <div className="font-medium">{otherParticipant.first_name || 'Unknown User'}</div>
                       {conversation.last_message && (
                         <div className="text-sm opacity-75 truncate">
                           {conversation.last_message.content}
@@ -309,15 +423,26 @@ const Messages = () => {
               <>
                 <div className="border-b border-white/10 pb-4 mb-4">
                   <h2 className="text-xl font-semibold text-white">
-                    {selectedConversation.other_participant?.user?.first_name || 'Chat'}
+                    {selectedConversation.other_participant?.first_name || 'Chat'}
                   </h2>
                   </div>
 
                 <div className="flex-1 overflow-y-auto mb-4 space-y-4 px-4">
+                  {hasOlderMessages && (
+                    <div className="text-center">
+                      <button
+                        onClick={() => fetchMessages(selectedConversation.id, { before: messages[0]?.id })}
+                        className="text-sm text-white/70 hover:text-white underline"
+                      >
+                        Load earlier messages
+                      </button>
+                    </div>
+                  )}
                   {messages.length > 0 ? (
                     messages.map(message => {
                       const userData = JSON.parse(localStorage.getItem('user'));
-                      const isCurrentUser = message.sender.user.id === userData.user_id;
+                      const sender = participants[message.sender] || selectedConversation.participants?.find(p => p.id === message.sender);
+                      const isCurrentUser = sender?.user_id === userData.user_id;
 
                       return (
                         <div
@@ -326,7 +451,7 @@ const Messages = () => {
                         >
                           <div className={`flex items-end gap-2 max-w-[70%] ${isCurrentUser ? 'flex-row-reverse' : 'flex-row'}`}>
                             <div className="w-8 h-8 rounded-full bg-gradient-to-br from-primary to-secondary flex items-center justify-center text-white font-bold">
-                              {message.sender.user.first_name[0]}
+                              {sender?.first_name?.[0] || '?'}
                             </div>
                             <div
                               className={`rounded-2xl px-4 py-2 ${
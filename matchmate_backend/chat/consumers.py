@@ -0,0 +1,31 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import user_group
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Server-to-client push channel for chat events. Clients only listen; new
+    messages and read receipts are still sent through the REST endpoints.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.group_name = user_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Lets clients keep intermediaries from timing out idle sockets
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def chat_event(self, event):
+        await self.send_json({'type': event['event'], **event['payload']})
@@ -0,0 +1,61 @@
+"""
+Push notifications for connected chat clients.
+
+Every authenticated WebSocket joins a per-user group; views call the helpers
+below after committing a change and the channel layer fans the event out to
+every socket that user has open. The REST endpoints remain the source of
+truth for catching up after a reconnect.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from profiles.models import Profile
+
+
+def user_group(user_id):
+    return f'chat.user.{user_id}'
+
+
+def _send(user_ids, event_type, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    message = {'type': 'chat.event', 'event': event_type, 'payload': payload}
+    for user_id in user_ids:
+        async_to_sync(channel_layer.group_send)(user_group(user_id), message)
+
+
+def notify(user_ids, event_type, payload):
+    """Send ``event_type`` to ``user_ids`` once the current transaction commits."""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: _send(user_ids, event_type, payload))
+
+
+def participant_user_ids(conversation):
+    return conversation.participants.values_list('user_id', flat=True)
+
+
+def message_created(conversation, message_data):
+    notify(participant_user_ids(conversation), 'message.created', {
+        'conversation_id': conversation.id,
+        'message': message_data,
+    })
+
+
+def conversation_read(conversation_id, reader_user_id, last_read_message_id):
+    notify(
+        Profile.objects.filter(conversations__id=conversation_id).values_list('user_id', flat=True),
+        'conversation.read',
+        {
+            'conversation_id': int(conversation_id),
+            'reader_id': reader_user_id,
+            'last_read_message_id': last_read_message_id,
+        },
+    )
+
+
+def conversation_updated(conversation):
+    notify(participant_user_ids(conversation), 'conversation.updated', {
+        'conversation_id': conversation.id,
+        'updated_at': conversation.updated_at.isoformat(),
+    })
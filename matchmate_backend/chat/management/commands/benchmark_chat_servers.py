@@ -0,0 +1,212 @@
+import contextlib
+import http.client
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from chat import summaries
+from chat.synthetic import REPLIES, chat_actors, seed_conversations
+from matchmate_backend.benchmarking import git_revision, throwaway_database
+from matchmate_backend.profiling import percentile
+from profiles.models import Profile
+from profiles.synthetic import seed_profiles
+
+# Default servers; {python} and {port} are filled in. Both run a single
+# process serving the same DRF views: a WSGI server with a pool of 10
+# threads, and Daphne with asgi.py
+SERVERS = {
+    'wsgi': '{python} -c "from matchmate_backend.benchmarking import serve_wsgi; serve_wsgi({port}, threads=10)"',
+    'asgi': '{python} -m daphne -b 127.0.0.1 -p {port} matchmate_backend.asgi:application',
+}
+
+# Relative frequency of each request in the mix
+MIX = {'conversation_list': 40, 'messages': 45, 'send_message': 15}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the chat endpoints under the WSGI and ASGI deployments. Seeds a throwaway database, starts each '
+        'server in a subprocess and holds many mostly idle keep-alive '
+        'connections open against it, reporting throughput and latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users (each with a profile) to seed.')
+        parser.add_argument('--conversations', type=int, default=2000)
+        parser.add_argument('--messages-per-conversation', type=int, default=20, help='Mean thread length.')
+        parser.add_argument(
+            '--connections', type=int, nargs='+', default=[10, 100, 200],
+            help='Concurrent client connections; each value is one run per server.',
+        )
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per run.')
+        parser.add_argument('--think-ms', type=float, default=200, help='Mean idle time between requests.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=sorted(SERVERS, reverse=True))
+        parser.add_argument('--wsgi-command', default=SERVERS['wsgi'], help='Command starting the WSGI server.')
+        parser.add_argument('--asgi-command', default=SERVERS['asgi'], help='Command starting the ASGI server.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON results to this file.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The servers are pointed at the throwaway database with SQLITE_PATH; use SQLite.')
+        runs = []
+        with throwaway_database(file_backed=True):
+            dataset, actors = self.seed(options)
+            database = str(connection.settings_dict['NAME'])
+            # The servers need the write lock
+            connection.close()
+            for server in options['servers']:
+                with self.server(server, options[f'{server}_command'], database) as port:
+                    for connections in options['connections']:
+                        self.stderr.write(f'{server}: {connections} connections for {options["duration"]:.0f}s...')
+                        runs.append({
+                            'server': server,
+                            'connections': connections,
+                            **self.run(port, actors, connections, options),
+                        })
+        results = {'revision': git_revision(), 'dataset': dataset, 'think_ms': options['think_ms'], 'runs': runs}
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def seed(self, options):
+        self.stderr.write(f"Seeding {options['users']} users...")
+        seed_profiles(options['users'], seed=options['seed'], prefix='bench', password=make_password('unused'))
+        profile_ids = list(Profile.objects.values_list('id', flat=True))
+        conversations, messages = seed_conversations(
+            profile_ids, options['conversations'], seed=options['seed'],
+            messages_per_conversation=options['messages_per_conversation'],
+        )
+        summaries.rebuild()
+        actors = chat_actors(max(options['connections']), seed=options['seed'])
+        if not actors:
+            raise CommandError('No conversations were seeded; increase --conversations.')
+        return {'users': len(profile_ids), 'conversations': conversations, 'messages': messages}, actors
+
+    @contextlib.contextmanager
+    def server(self, name, command, database):
+        """Start the server on a free port and yield the port once it listens."""
+        port = free_port()
+        env = dict(os.environ, SQLITE_PATH=database, LOG_LEVEL='WARNING')
+        process = subprocess.Popen(
+            shlex.split(command.format(python=sys.executable, port=port)),
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise CommandError(f'{name} server exited with {process.returncode}: {command}')
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'{name} server did not start listening: {command}')
+                    time.sleep(0.2)
+            yield port
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run(self, port, actors, connections, options):
+        scenarios, weights = list(MIX), list(MIX.values())
+        samples = []
+        lock = threading.Lock()
+        started = time.perf_counter()
+        deadline = started + options['duration']
+
+        def client(n):
+            rng = random.Random(f"{options['seed']}:{n}")
+            actor = actors[n % len(actors)]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            rows = []
+            # Spread the first requests out instead of starting in lockstep
+            time.sleep(rng.uniform(0, 2 * options['think_ms']) / 1000)
+            while time.perf_counter() < deadline:
+                scenario = rng.choices(scenarios, weights)[0]
+                method, path, body = self.request(rng, scenario, actor)
+                headers = {'Authorization': f"Token {actor['token']}", 'Content-Type': 'application/json'}
+                begun = time.perf_counter()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                    if response.getheader('Connection', '').lower() == 'close':
+                        conn.close()
+                except (OSError, http.client.HTTPException):
+                    status = 599
+                    conn.close()
+                rows.append((time.perf_counter() - begun, status))
+                # Chat clients spend most of their time idle
+                time.sleep(rng.expovariate(1000 / options['think_ms']) if options['think_ms'] else 0)
+            conn.close()
+            with lock:
+                samples.extend(rows)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, _ in samples]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, status in samples if status >= 400),
+            'throughput_rps': len(samples) / duration,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        }
+
+    @staticmethod
+    def request(rng, scenario, actor):
+        if scenario == 'conversation_list':
+            return 'GET', '/api/chat/conversations/', None
+        conversation_id = rng.choice(actor['conversations'])
+        if scenario == 'messages':
+            return 'GET', f'/api/chat/conversations/{conversation_id}/messages/', None
+        body = json.dumps({'content': rng.choice(REPLIES)})
+        return 'POST', f'/api/chat/conversations/{conversation_id}/send_message/', body
+
+    def report(self, results):
+        dataset = results['dataset']
+        self.stdout.write(
+            f"{dataset['users']} users, {dataset['conversations']} conversations, {dataset['messages']} messages; "
+            f"mean think time {results['think_ms']:.0f}ms"
+        )
+        self.stdout.write(f"{'server':<6} {'conns':>6} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for run in results['runs']:
+            self.stdout.write(
+                f"{run['server']:<6} {run['connections']:>6} {run['requests']:>7} {run['errors']:>5} "
+                f"{run['throughput_rps']:>8.1f} {run['p50_ms']:>8.2f} {run['p95_ms']:>8.2f} {run['p99_ms']:>8.2f}"
+            )
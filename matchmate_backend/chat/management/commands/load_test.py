@@ -0,0 +1,228 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from chat import summaries
+from chat.synthetic import REPLIES, chat_actors, seed_conversations
+from matchmate_backend.benchmarking import git_revision, throwaway_database
+from matchmate_backend.profiling import percentile
+from profiles import match_index, response_cache
+from profiles.models import Profile
+from profiles.synthetic import seed_interests, seed_profiles
+
+PASSWORD = 'load-test-password'
+
+# Relative frequency of each scenario in the request mix
+SCENARIOS = {
+    'potential_matches': 30,
+    'conversation_list': 25,
+    'messages': 25,
+    'send_message': 15,
+    'login': 5,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic users, profiles, interests, conversations and messages, '
+        'then drive the REST API concurrently through an in-process client and '
+        'report throughput, latency percentiles and query counts. '
+        'potential_matches misses the response cache unless --cache is given, '
+        'and is reported by cache outcome. Runs against a throwaway test '
+        'database, never the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Users (each with a profile) to seed.')
+        parser.add_argument('--conversations', type=int, default=4000)
+        parser.add_argument('--messages-per-conversation', type=int, default=20, help='Mean thread length.')
+        parser.add_argument('--interests', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=2000, help='Total requests to send.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads.')
+        parser.add_argument('--active-users', type=int, default=200, help='Users the clients act as.')
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+            help='Restrict the mix to these scenarios.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cache', action='store_true',
+            help="Let potential_matches hit the response cache instead of invalidating the actor's entries first.",
+        )
+        parser.add_argument('--output', help='Write the JSON results to this file.')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        # A file-backed database lets the client threads write concurrently
+        with throwaway_database(file_backed=True):
+            dataset = self.seed(options)
+            actors = self.prepare_actors(options)
+            results = self.run(actors, options)
+        results = {
+            'revision': git_revision(),
+            'dataset': dataset,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'cache': options['cache'],
+            **results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results, baseline)
+
+    def seed(self, options):
+        seed = options['seed']
+        self.stderr.write(f"Seeding {options['users']} users...")
+        seed_profiles(options['users'], seed=seed, prefix='load', password=make_password(PASSWORD))
+        user_ids = list(User.objects.values_list('id', flat=True))
+        profile_ids = list(Profile.objects.values_list('id', flat=True))
+        self.stderr.write('Seeding interests, conversations and messages...')
+        interests = seed_interests(user_ids, options['interests'], seed=seed)
+        conversations, messages = seed_conversations(
+            profile_ids, options['conversations'], seed=seed,
+            messages_per_conversation=options['messages_per_conversation'],
+        )
+        summaries.rebuild()
+        return {
+            'users': len(user_ids),
+            'interests': interests,
+            'conversations': conversations,
+            'messages': messages,
+        }
+
+    def prepare_actors(self, options):
+        """Pick the users the clients act as, with a token and their conversations."""
+        actors = chat_actors(options['active_users'], seed=options['seed'])
+        if not actors:
+            raise CommandError('No conversations were seeded; increase --conversations.')
+        # bulk_create skips the signals that maintain the match index
+        match_index.rebuild(profile_ids=[actor['profile_id'] for actor in actors])
+        return actors
+
+    def run(self, actors, options):
+        scenarios = [name for name in SCENARIOS if name in options['scenarios']]
+        weights = [SCENARIOS[name] for name in scenarios]
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        remaining = iter(range(options['requests']))
+
+        def worker(worker_id):
+            rng = random.Random(f"{options['seed']}:{worker_id}")
+            client = APIClient()
+            connection = connections[DEFAULT_DB_ALIAS]
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    scenario = rng.choices(scenarios, weights)[0]
+                    actor = rng.choice(actors)
+                    if scenario == 'potential_matches' and not options['cache']:
+                        # Otherwise nearly every repeat is served from the cache
+                        response_cache.invalidate_users([actor['user_id']])
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = self.request(client, rng, scenario, actor)
+                        elapsed = time.perf_counter() - started
+                    if 'X-Cache' in response:
+                        # Hits only measure the cache; keep them apart
+                        scenario = f"{scenario} {response['X-Cache'].lower()}"
+                    with lock:
+                        samples[scenario].append((elapsed * 1000, len(captured), response.status_code))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for future in [pool.submit(worker, n) for n in range(options['concurrency'])]:
+                future.result()
+        duration = time.perf_counter() - started
+
+        endpoints = {name: self.summarize(rows, duration) for name, rows in sorted(samples.items())}
+        everything = [row for rows in samples.values() for row in rows]
+        return {
+            'duration_s': duration,
+            'overall': self.summarize(everything, duration),
+            'endpoints': endpoints,
+        }
+
+    def request(self, client, rng, scenario, actor):
+        if scenario == 'login':
+            client.credentials()
+            return client.post('/api/auth/login/', {'username': actor['username'], 'password': PASSWORD})
+        client.credentials(HTTP_AUTHORIZATION=f"Token {actor['token']}")
+        if scenario == 'potential_matches':
+            return client.get('/api/profiles/potential_matches/')
+        if scenario == 'conversation_list':
+            return client.get('/api/chat/conversations/')
+        conversation_id = rng.choice(actor['conversations'])
+        if scenario == 'messages':
+            return client.get(f'/api/chat/conversations/{conversation_id}/messages/')
+        return client.post(
+            f'/api/chat/conversations/{conversation_id}/send_message/',
+            {'content': rng.choice(REPLIES)},
+        )
+
+    @staticmethod
+    def summarize(rows, duration):
+        latencies = [latency for latency, _, _ in rows]
+        queries = [count for _, count, _ in rows]
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status in rows if status >= 400),
+            'throughput_rps': len(rows) / duration if duration else 0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'mean_queries': statistics.mean(queries),
+            'max_queries': max(queries),
+        }
+
+    def report(self, results, baseline):
+        dataset = results['dataset']
+        self.stdout.write(
+            f"{dataset['users']} users, {dataset['conversations']} conversations, "
+            f"{dataset['messages']} messages; {results['requests']} requests from "
+            f"{results['concurrency']} threads in {results['duration_s']:.1f}s, "
+            f"response cache {'on' if results.get('cache') else 'bypassed'}"
+        )
+        header = f"{'endpoint':<24} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        if baseline:
+            header += f" {'p95 vs base':>12}"
+        self.stdout.write(header)
+        rows = [*results['endpoints'].items(), ('overall', results['overall'])]
+        for name, row in rows:
+            line = (
+                f"{name:<24} {row['requests']:>6} {row['errors']:>4} {row['throughput_rps']:>8.1f} "
+                f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['mean_queries']:>8.1f}"
+            )
+            if baseline:
+                before = baseline['overall'] if name == 'overall' else baseline['endpoints'].get(name)
+                line += f" {row['p95_ms'] / before['p95_ms']:>11.2f}x" if before else f" {'-':>12}"
+            self.stdout.write(line)
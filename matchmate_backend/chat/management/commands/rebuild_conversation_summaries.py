@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from chat import summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute every conversation summary (last message, unread counters) from Message.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Conversations recomputed per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        def progress(done):
+            self.stdout.write(f'{done} conversations reconciled')
+
+        total = summaries.rebuild(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt summaries for {total} conversations'))
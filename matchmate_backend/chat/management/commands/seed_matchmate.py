@@ -0,0 +1,150 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from chat import summaries
+from chat.synthetic import seed_conversations
+from profiles import interests, match_index
+from profiles.models import Profile
+from profiles.synthetic import seed_interests, seed_profiles
+
+# Positions of the seeded profiles, set once per worker process
+_profile_ids = None
+_user_ids = None
+
+
+def _init_worker(profile_ids=None, user_ids=None):
+    global _profile_ids, _user_ids
+    _profile_ids, _user_ids = profile_ids, user_ids
+    # Connections inherited from the parent must not be shared
+    connections.close_all()
+
+
+def _profiles_task(count, seed, prefix, start, batch_size, password):
+    return seed_profiles(count, seed=seed, prefix=prefix, start=start, batch_size=batch_size, password=password)
+
+
+def _interests_task(count, seed, batch_size, senders):
+    return seed_interests(_user_ids, count, seed=seed, batch_size=batch_size, senders=senders)
+
+
+def _conversations_task(count, seed, messages_per_conversation, batch_size, initiators):
+    return seed_conversations(
+        _profile_ids, count, seed=seed, batch_size=batch_size,
+        messages_per_conversation=messages_per_conversation, initiators=initiators,
+    )
+
+
+def _split(total, parts):
+    """Split ``total`` into ``parts`` contiguous ranges of near-equal size."""
+    size = math.ceil(total / parts)
+    return [range(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, profiles, interests, conversations and messages '
+        'with bulk_create. Output is deterministic for a given --seed and '
+        '--chunk-size; with --workers above 1 chunks run in parallel processes '
+        '(row ids then depend on scheduling, the data does not).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=10_000, help='Users (each with a profile) to add.')
+        parser.add_argument('--interests-per-profile', type=float, default=5, help='Mean interests sent per profile.')
+        parser.add_argument('--conversations-per-profile', type=float, default=1, help='Conversations per profile.')
+        parser.add_argument('--messages-per-conversation', type=int, default=20, help='Mean thread length.')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>-<n>.')
+        parser.add_argument('--password', help='Password for every seeded user; by default they cannot log in.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1, help='Parallel processes.')
+        parser.add_argument('--chunk-size', type=int, default=50_000, help='Profiles per unit of work.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create.')
+        parser.add_argument(
+            '--build-match-index', action='store_true',
+            help='Also rebuild the mutual match index (slow for millions of profiles).',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1 and connections['default'].vendor == 'sqlite':
+            self.stderr.write('SQLite serializes writers; extra workers only help with generation.')
+
+        prefix = options['prefix']
+        start = User.objects.filter(username__startswith=f'{prefix}-').count()
+        password = make_password(options['password']) if options['password'] else '!'
+        self.started = time.perf_counter()
+        self.messages = 0
+
+        chunks = [
+            (len(chunk), options['seed'], prefix, start + chunk.start, options['batch_size'], password)
+            for chunk in _split(options['profiles'], max(1, math.ceil(options['profiles'] / options['chunk_size'])))
+        ]
+        self.run('profiles', _profiles_task, chunks, options['workers'], options['profiles'])
+
+        # Interests and conversations use positions in username order, so
+        # they do not depend on the ids the database handed out
+        seeded = sorted(
+            Profile.objects.filter(user__username__startswith=f'{prefix}-').values_list('user__username', 'id', 'user_id'),
+            key=lambda row: int(row[0].rsplit('-', 1)[1]),
+        )
+        profile_ids = [profile_id for _, profile_id, _ in seeded]
+        user_ids = [user_id for _, _, user_id in seeded]
+        ranges = _split(len(seeded), max(1, math.ceil(len(seeded) / options['chunk_size'])))
+        initargs = (profile_ids, user_ids)
+
+        total = round(len(seeded) * options['interests_per_profile'])
+        chunks = [
+            (round(total * len(senders) / len(seeded)), options['seed'], options['batch_size'], senders)
+            for senders in ranges
+        ]
+        self.run('interests', _interests_task, chunks, options['workers'], total, initargs)
+        # Reverse interests can come from different chunks
+        self.stdout.write(f'{interests.mark_mutual()} interests are mutual')
+
+        total = round(options['profiles'] * options['conversations_per_profile'])
+        chunks = [
+            (round(total * len(initiators) / len(seeded)), options['seed'],
+             options['messages_per_conversation'], options['batch_size'], initiators)
+            for initiators in ranges
+        ]
+        self.run('conversations', _conversations_task, chunks, options['workers'], total, initargs)
+
+        self.stdout.write(f'{self.messages} messages created')
+        self.stdout.write('Rebuilding conversation summaries...')
+        summaries.rebuild(chunk_size=5000)
+        if options['build_match_index']:
+            self.stdout.write('Rebuilding the match index...')
+            match_index.rebuild(profile_ids=profile_ids, progress=lambda done: self.progress('indexed', done, len(profile_ids)))
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - self.started:.1f}s'))
+
+    def run(self, label, task, chunks, workers, total, initargs=()):
+        done = 0
+        if workers <= 1:
+            _init_worker(*initargs)
+            for args in chunks:
+                done += self.count(task(*args))
+                self.progress(label, done, total)
+            return
+        # Forked workers must open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for future in as_completed([pool.submit(task, *args) for args in chunks]):
+                done += self.count(future.result())
+                self.progress(label, done, total)
+
+    def count(self, result):
+        # Conversation tasks also report their messages
+        if isinstance(result, tuple):
+            self.messages += result[1]
+            return result[0]
+        return result
+
+    def progress(self, label, done, total):
+        elapsed = time.perf_counter() - self.started
+        pct = 100 * done / total if total else 100
+        self.stdout.write(f'{label}: {done}/{total} ({pct:.0f}%) after {elapsed:.1f}s')
@@ -0,0 +1,30 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from profiles import token_cache
+
+
+@database_sync_to_async
+def get_user(key):
+    token = token_cache.get_token(key)
+    if token is None:
+        return AnonymousUser()
+    if not token.user.is_active:
+        return AnonymousUser()
+    return token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with the same DRF token the REST API
+    uses. Browsers cannot set headers on a WebSocket handshake, so the token is
+    read from the ``token`` query string parameter.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        key = query.get('token', [None])[0]
+        scope = dict(scope, user=await get_user(key) if key else AnonymousUser())
+        return await super().__call__(scope, receive, send)
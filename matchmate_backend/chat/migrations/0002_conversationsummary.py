@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    summaries = []
+    for conversation in Conversation.objects.prefetch_related('participants').iterator(chunk_size=500):
+        last_message = conversation.messages.order_by('-created_at', '-id').first()
+        unread = conversation.messages.filter(is_read=False)
+        for participant in conversation.participants.all():
+            summaries.append(ConversationSummary(
+                conversation=conversation,
+                participant=participant,
+                last_message=last_message,
+                last_message_sender_id=last_message.sender_id if last_message else None,
+                last_message_preview=last_message.content[:255] if last_message else '',
+                last_message_at=last_message.created_at if last_message else None,
+                last_activity_at=last_message.created_at if last_message else conversation.created_at,
+                unread_count=unread.exclude(sender=participant).count(),
+            ))
+        if len(summaries) >= 1000:
+            ConversationSummary.objects.bulk_create(summaries)
+            summaries = []
+    ConversationSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        ('profiles', '0007_mutualmatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_preview', models.CharField(blank=True, max_length=255)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='chat.conversation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message')),
+                ('last_message_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profiles.profile')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to='profiles.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['participant', '-last_activity_at'], name='summary_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'participant'), name='conversationsummary_unique_participant')],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_conversationsummary'),
+        ('profiles', '0007_mutualmatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='message_history_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_watermarks(apps, schema_editor):
+    # Start each participant's watermark at the newest message from somebody
+    # else that was already flagged as read
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    Message = apps.get_model('chat', 'Message')
+    for summary in ConversationSummary.objects.iterator(chunk_size=500):
+        last_read = (
+            Message.objects
+            .filter(conversation_id=summary.conversation_id, is_read=True)
+            .exclude(sender_id=summary.participant_id)
+            .order_by('-id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if last_read:
+            ConversationSummary.objects.filter(pk=summary.pk).update(last_read_message_id=last_read)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationsummary',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+    ]
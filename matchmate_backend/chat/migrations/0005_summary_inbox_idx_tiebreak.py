@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_read_watermark'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='conversationsummary',
+            name='summary_inbox_idx',
+        ),
+        migrations.AddIndex(
+            model_name='conversationsummary',
+            index=models.Index(fields=['participant', '-last_activity_at', '-conversation'], name='summary_inbox_idx'),
+        ),
+    ]
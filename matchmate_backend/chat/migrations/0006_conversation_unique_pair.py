@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+PREVIEW_LENGTH = 255
+
+
+def merge_duplicates(Conversation, Message, ConversationSummary, keep, duplicates):
+    # Move the duplicates' messages into the oldest conversation, keeping
+    # each participant's furthest read watermark, then drop the duplicates
+    watermarks = defaultdict(int)
+    for participant_id, last_read_id in (
+        ConversationSummary.objects
+        .filter(conversation_id__in=[keep, *duplicates], last_read_message__isnull=False)
+        .values_list('participant_id', 'last_read_message_id')
+    ):
+        watermarks[participant_id] = max(watermarks[participant_id], last_read_id)
+    Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+    Conversation.objects.filter(pk__in=duplicates).delete()
+
+    conversation = Conversation.objects.get(pk=keep)
+    latest = Message.objects.filter(conversation_id=keep).order_by('-created_at', '-id').first()
+    for profile_id in conversation.participants.values_list('id', flat=True):
+        watermark = watermarks.get(profile_id)
+        ConversationSummary.objects.update_or_create(
+            conversation_id=keep,
+            participant_id=profile_id,
+            defaults={
+                'last_message': latest,
+                'last_message_sender_id': latest.sender_id if latest else None,
+                'last_message_preview': latest.content[:PREVIEW_LENGTH] if latest else '',
+                'last_message_at': latest.created_at if latest else None,
+                'last_activity_at': latest.created_at if latest else conversation.created_at,
+                'last_read_message_id': watermark,
+                'unread_count': (
+                    Message.objects
+                    .filter(conversation_id=keep, id__gt=watermark or 0)
+                    .exclude(sender_id=profile_id)
+                    .count()
+                ),
+            },
+        )
+
+
+def assign_pairs(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    Through = Conversation.participants.through
+
+    participants = defaultdict(list)
+    for conversation_id, profile_id in Through.objects.order_by().values_list('conversation_id', 'profile_id').iterator():
+        participants[conversation_id].append(profile_id)
+    by_pair = defaultdict(list)
+    for conversation_id, profile_ids in participants.items():
+        if len(profile_ids) == 2:
+            by_pair[tuple(sorted(profile_ids))].append(conversation_id)
+    for conversation_ids in by_pair.values():
+        if len(conversation_ids) > 1:
+            keep, *duplicates = sorted(conversation_ids)
+            merge_duplicates(Conversation, Message, ConversationSummary, keep, duplicates)
+
+    # Every remaining two-person conversation gets its pair in one UPDATE
+    two_person = (
+        Through.objects.order_by().values('conversation_id')
+        .annotate(participants=Count('profile_id')).filter(participants=2)
+        .values('conversation_id')
+    )
+    profiles = Through.objects.filter(conversation_id=OuterRef('pk')).values('profile_id')
+    Conversation.objects.filter(pk__in=Subquery(two_person)).update(
+        low_profile_id=Subquery(profiles.order_by('profile_id')[:1]),
+        high_profile_id=Subquery(profiles.order_by('-profile_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_summary_inbox_idx_tiebreak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='high_profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profiles.profile'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='low_profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profiles.profile'),
+        ),
+        migrations.RunPython(assign_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('low_profile', 'high_profile'), name='conversation_unique_pair'),
+        ),
+    ]
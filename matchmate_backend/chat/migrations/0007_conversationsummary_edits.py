@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_unique_pair'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationsummary',
+            name='edits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,15 +1,62 @@
 from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.utils import timezone
 from profiles.models import Profile
 
 # Create your models here.
 
+class ConversationQuerySet(models.QuerySet):
+    def for_inbox(self, profile):
+        """
+        Conversations ``profile`` takes part in, with everything the
+        conversation serializer needs loaded up front: participants with
+        their users, ``unread_count`` from the caller's summary row and the
+        latest message in ``latest_messages``.
+        """
+        latest_id = (
+            Message.objects
+            .filter(conversation_id=OuterRef('conversation_id'))
+            .order_by('-created_at', '-id')
+            .values('id')[:1]
+        )
+        return (
+            self.filter(participants=profile)
+            .annotate(unread_count=Subquery(
+                ConversationSummary.objects
+                .filter(conversation_id=OuterRef('pk'), participant=profile)
+                .values('unread_count')[:1]
+            ))
+            .prefetch_related(
+                Prefetch('participants', queryset=Profile.objects.select_related('user')),
+                Prefetch(
+                    'messages',
+                    queryset=Message.objects.filter(id=Subquery(latest_id)).select_related('sender__user'),
+                    to_attr='latest_messages',
+                ),
+            )
+        )
+
 class Conversation(models.Model):
     participants = models.ManyToManyField(Profile, related_name='conversations')
+    # Canonical key of a one-to-one conversation: its two participants, lower
+    # profile id first. Unique, so every pair has exactly one conversation
+    low_profile = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    high_profile = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConversationQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['low_profile', 'high_profile'], name='conversation_unique_pair'),
+        ]
+
+    @staticmethod
+    def pair(first, second):
+        """The canonical ``(low_profile_id, high_profile_id)`` of two profile ids."""
+        return (first, second) if first < second else (second, first)
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
@@ -20,3 +67,40 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination walks one conversation by (created_at, id)
+            models.Index(fields=['conversation', 'created_at', 'id'], name='message_history_idx'),
+        ]
+
+class ConversationSummary(models.Model):
+    """
+    Denormalized inbox row for one participant of one conversation. Kept up
+    to date by ``chat.summaries`` whenever a message is sent or read, so the
+    inbox never has to look at message history.
+    """
+    PREVIEW_LENGTH = 255
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='summaries')
+    participant = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='conversation_summaries')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_sender = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    # Read watermark: the participant has read everything up to this message
+    last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    # Edits to the conversation's messages so far; part of the inbox and
+    # thread ETags, since an edit changes neither the latest message nor
+    # any watermark
+    edits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'participant'], name='conversationsummary_unique_participant'),
+        ]
+        indexes = [
+            # The inbox lists one participant's rows, most recently active first
+            # (ties broken by conversation), so no sort step is needed
+            models.Index(fields=['participant', '-last_activity_at', '-conversation'], name='summary_inbox_idx'),
+        ]
@@ -0,0 +1,77 @@
+"""
+Keyset pagination over a conversation's messages.
+
+Messages are ordered by ``(created_at, id)`` and pages are addressed by a
+message id rather than an offset, so polling a long thread costs the same as
+polling a new one:
+
+* ``?since=<id>`` returns messages newer than ``id``, oldest first.
+* ``?before=<id>`` returns the ``limit`` messages just older than ``id``.
+* Neither returns the latest ``limit`` messages.
+
+Pages are always returned oldest first. The anchor message must exist in the
+conversation: the page query fetches it too, and a stale or foreign id is a
+validation error rather than an empty page a poller would never leave.
+"""
+from django.db.models import Q, Subquery
+from rest_framework.exceptions import ValidationError
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Must be an integer.'})
+    if value < 1:
+        raise ValidationError({name: 'Must be a positive integer.'})
+    return value
+
+
+def paginate_messages(messages, params):
+    """
+    Return ``(page, has_more)`` for ``messages`` (a queryset already limited
+    to one conversation) according to the ``since``, ``before`` and ``limit``
+    query parameters. ``has_more`` tells whether more messages exist in the
+    direction being paged.
+    """
+    since = _int_param(params, 'since')
+    before = _int_param(params, 'before')
+    if since and before:
+        raise ValidationError('Use either since or before, not both.')
+    limit = min(_int_param(params, 'limit') or DEFAULT_LIMIT, MAX_LIMIT)
+
+    anchor_id = since or before
+    if not anchor_id:
+        rows = list(messages.order_by('-created_at', '-id')[:limit + 1])
+        page = rows[:limit]
+        page.reverse()
+        return page, len(rows) > limit
+
+    # The anchor sorts first in either direction
+    anchor_at = Subquery(messages.filter(id=anchor_id).values('created_at')[:1])
+    if since:
+        queryset = (
+            messages
+            .filter(Q(created_at__gt=anchor_at) | Q(created_at=anchor_at, id__gte=since))
+            .order_by('created_at', 'id')
+        )
+    else:
+        queryset = (
+            messages
+            .filter(Q(created_at__lt=anchor_at) | Q(created_at=anchor_at, id__lte=before))
+            .order_by('-created_at', '-id')
+        )
+    rows = list(queryset[:limit + 2])
+    if not rows or rows[0].id != anchor_id:
+        raise ValidationError({'since' if since else 'before': 'No such message in this conversation.'})
+    rows = rows[1:]
+    page = rows[:limit]
+    if before:
+        page.reverse()
+    return page, len(rows) > limit
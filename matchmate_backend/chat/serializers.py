@@ -1,17 +1,62 @@
 from rest_framework import serializers
-from .models import Conversation, Message
-from profiles.serializers import ProfileSerializer
+from .models import Conversation, ConversationSummary, Message
+from profiles.serializers import ProfileCardSerializer
 
-class MessageSerializer(serializers.ModelSerializer):
-    sender = ProfileSerializer(read_only=True)
+
+def requested_fields(request):
+    """Parse ``?fields=id,content`` into a set of names, or None for all fields."""
+    value = request.query_params.get('fields') if request is not None else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def participant_cards(participants, context=None):
+    """Map profile id -> profile card, for side-loading next to messages."""
+    return {
+        str(profile.id): ProfileCardSerializer(profile, context=context).data
+        for profile in participants
+    }
+
+
+class FieldSelectionMixin:
+    """
+    Keep only the fields named in the ``fields`` context entry (see
+    ``requested_fields``). Unknown names are ignored; skipped method fields
+    are never computed.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+class MessageSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    # Senders are referenced by profile id; list endpoints side-load their
+    # profile cards once in a ``participants`` map
+    sender = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = Message
         fields = ['id', 'content', 'created_at', 'is_read', 'sender']
         read_only_fields = ['created_at', 'is_read']
 
-class ConversationSerializer(serializers.ModelSerializer):
-    participants = ProfileSerializer(many=True, read_only=True)
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # A message is read once any other participant's read watermark has
+        # reached it; views that list messages pass the watermarks in
+        watermarks = self.context.get('read_watermarks')
+        if watermarks and not data.get('is_read', True):
+            data['is_read'] = any(
+                last_read is not None and last_read >= instance.id
+                for participant_id, last_read in watermarks.items()
+                if participant_id != instance.sender_id
+            )
+        return data
+
+class ConversationSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    participants = ProfileCardSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
@@ -22,19 +67,61 @@ class ConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_last_message(self, obj):
-        last_message = obj.messages.first()
+        # Conversation.objects.for_inbox() prefetches the latest message
+        if hasattr(obj, 'latest_messages'):
+            last_message = obj.latest_messages[0] if obj.latest_messages else None
+        else:
+            last_message = obj.messages.order_by('-created_at', '-id').first()
         if last_message:
             return MessageSerializer(last_message).data
         return None
 
     def get_unread_count(self, obj):
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count
         user_profile = self.context['request'].user.profile
-        return obj.messages.filter(is_read=False).exclude(sender=user_profile).count()
+        summary = obj.summaries.filter(participant=user_profile).values_list('unread_count', flat=True).first()
+        return summary or 0
         
     def get_other_participant(self, obj):
         """Return the participant that is not the current user"""
         current_user = self.context['request'].user
         for participant in obj.participants.all():
-            if participant.user.id != current_user.id:
-                return ProfileSerializer(participant).data
-        return None 
\ No newline at end of file
+            if participant.user_id != current_user.id:
+                return ProfileCardSerializer(participant, context=self.context).data
+        return None
+
+class ConversationSummarySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    """
+    Inbox entry built from a ``ConversationSummary`` row. Produces the same
+    shape as ``ConversationSerializer``; ``last_message.content`` is the
+    stored preview and ``last_message`` carries no ``is_read`` flag.
+    """
+    id = serializers.IntegerField(source='conversation_id')
+    participants = ProfileCardSerializer(source='conversation.participants', many=True, read_only=True)
+    other_participant = serializers.SerializerMethodField()
+    created_at = serializers.DateTimeField(source='conversation.created_at')
+    updated_at = serializers.DateTimeField(source='last_activity_at')
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ConversationSummary
+        fields = ['id', 'participants', 'other_participant', 'created_at', 'updated_at', 'last_message', 'unread_count']
+
+    def get_last_message(self, obj):
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'content': obj.last_message_preview,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_at),
+            'sender': obj.last_message_sender_id,
+        }
+
+    def get_other_participant(self, obj):
+        """Return the participant that is not the current user"""
+        current_user = self.context['request'].user
+        for participant in obj.conversation.participants.all():
+            if participant.user_id != current_user.id:
+                return ProfileCardSerializer(participant, context=self.context).data
+        return None
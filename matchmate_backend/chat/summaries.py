@@ -0,0 +1,194 @@
+"""
+Maintenance of ``ConversationSummary`` rows.
+
+Each write path that changes what the inbox shows updates the summaries with
+a single ``UPDATE`` inside the same transaction as the change itself.
+``rebuild()`` recomputes them from ``Message`` for reconciliation.
+
+Unread counts are derived from each participant's read watermark
+(``last_read_message``): everything newer than it that somebody else sent.
+Sending a message bumps the stored counter to save a recount; advancing the
+watermark recounts from it.
+"""
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Conversation, ConversationSummary, Message
+
+
+def ensure_summaries(conversation):
+    """Create any missing summary rows for ``conversation``'s participants."""
+    ConversationSummary.objects.bulk_create(
+        [
+            ConversationSummary(
+                conversation=conversation,
+                participant_id=profile_id,
+                last_activity_at=conversation.created_at,
+            )
+            for profile_id in conversation.participants.values_list('id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def unread_since_watermark(watermark=None):
+    """
+    Correlated subquery counting the messages a summary row's participant
+    has not read yet, for use in ``update()`` and ``annotate()``. Pass
+    ``watermark`` when the same ``UPDATE`` also moves the watermark, since
+    the row's stored value is still the old one while the statement runs.
+    """
+    if watermark is None:
+        watermark = Coalesce(OuterRef('last_read_message_id'), Value(0), output_field=BigIntegerField())
+    unread = (
+        Message.objects
+        .filter(
+            conversation_id=OuterRef('conversation_id'),
+            id__gt=watermark,
+        )
+        .exclude(sender_id=OuterRef('participant_id'))
+        .order_by()
+        .values('conversation_id')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    return Coalesce(Subquery(unread), Value(0))
+
+
+def record_message(message):
+    """
+    Point every participant's summary at ``message`` and bump the unread
+    counter of everyone except the sender, whose watermark moves up to their
+    own message.
+    """
+    is_sender = Q(participant_id=message.sender_id)
+    ConversationSummary.objects.filter(conversation_id=message.conversation_id).update(
+        last_message=message,
+        last_message_sender_id=message.sender_id,
+        last_message_preview=message.content[:ConversationSummary.PREVIEW_LENGTH],
+        last_message_at=message.created_at,
+        last_activity_at=message.created_at,
+        last_read_message=Case(
+            When(is_sender, then=Value(message.id)),
+            default=F('last_read_message'),
+            output_field=BigIntegerField(),
+        ),
+        unread_count=Case(When(is_sender, then=Value(0)), default=F('unread_count') + 1),
+    )
+
+
+def record_edit(message):
+    """
+    Count an edit of ``message`` in every participant's summary, and refresh
+    the preview if it is the latest message.
+    """
+    ConversationSummary.objects.filter(conversation_id=message.conversation_id).update(
+        edits=F('edits') + 1,
+        last_message_preview=Case(
+            When(last_message_id=message.id, then=Value(message.content[:ConversationSummary.PREVIEW_LENGTH])),
+            default=F('last_message_preview'),
+        ),
+    )
+
+
+def advance_read_watermark(conversation_id, reader, message_id=None):
+    """
+    Move ``reader``'s watermark in a conversation up to ``message_id`` (by
+    default the latest message) and recount their unread messages from it.
+    This is a single ``UPDATE`` however many messages it covers; it never
+    moves the watermark backwards and ignores ids from other conversations.
+    Returns the number of rows changed (0 or 1).
+    """
+    rows = ConversationSummary.objects.filter(conversation_id=conversation_id, participant=reader)
+    if message_id is None:
+        return rows.filter(
+            Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=F('last_message_id')),
+            last_message__isnull=False,
+        ).update(last_read_message=F('last_message'), unread_count=0)
+
+    in_conversation = Message.objects.filter(conversation_id=conversation_id, id=message_id)
+    return (
+        rows
+        .filter(Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=message_id))
+        .filter(Exists(in_conversation))
+        .update(last_read_message_id=message_id, unread_count=unread_since_watermark(message_id))
+    )
+
+
+def read_watermarks(conversation_id):
+    """Map participant profile id -> last read message id for a conversation."""
+    return dict(
+        ConversationSummary.objects
+        .filter(conversation_id=conversation_id)
+        .values_list('participant_id', 'last_read_message_id')
+    )
+
+
+def rebuild(chunk_size=500, progress=None):
+    """
+    Recompute every summary from ``Message``, ``chunk_size`` conversations
+    per transaction. Returns the number of conversations processed.
+    """
+    latest_id = (
+        Message.objects
+        .filter(conversation_id=OuterRef('conversation_id'))
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    Through = Conversation.participants.through
+
+    processed = 0
+    last_pk = 0
+    while True:
+        conversations = list(
+            Conversation.objects.filter(pk__gt=last_pk).order_by('pk')[:chunk_size]
+        )
+        if not conversations:
+            break
+        ids = [conversation.pk for conversation in conversations]
+
+        latest = {
+            message.conversation_id: message
+            for message in Message.objects.filter(conversation_id__in=ids, id=Subquery(latest_id))
+        }
+        # Watermarks are state, not derived data, so they survive a rebuild;
+        # so do edit counts, or a rebuilt row could repeat an older ETag
+        state = {
+            (conversation_id, participant_id): (last_read_id, edits)
+            for conversation_id, participant_id, last_read_id, edits in (
+                ConversationSummary.objects
+                .filter(conversation_id__in=ids)
+                .values_list('conversation_id', 'participant_id', 'last_read_message_id', 'edits')
+            )
+        }
+
+        created_at = {conversation.pk: conversation.created_at for conversation in conversations}
+        summaries = []
+        for link in Through.objects.filter(conversation_id__in=ids):
+            message = latest.get(link.conversation_id)
+            last_read_id, edits = state.get((link.conversation_id, link.profile_id), (None, 0))
+            summaries.append(ConversationSummary(
+                conversation_id=link.conversation_id,
+                participant_id=link.profile_id,
+                last_message=message,
+                last_message_sender_id=message.sender_id if message else None,
+                last_message_preview=message.content[:ConversationSummary.PREVIEW_LENGTH] if message else '',
+                last_message_at=message.created_at if message else None,
+                last_activity_at=message.created_at if message else created_at[link.conversation_id],
+                last_read_message_id=last_read_id,
+                edits=edits,
+            ))
+
+        with transaction.atomic():
+            ConversationSummary.objects.filter(conversation_id__in=ids).delete()
+            ConversationSummary.objects.bulk_create(summaries, batch_size=1000)
+            ConversationSummary.objects.filter(conversation_id__in=ids).update(
+                unread_count=unread_since_watermark()
+            )
+
+        processed += len(conversations)
+        last_pk = conversations[-1].pk
+        if progress:
+            progress(processed)
+    return processed
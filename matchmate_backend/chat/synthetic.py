@@ -0,0 +1,125 @@
+"""
+Synthetic conversations and messages for benchmarks and local load testing.
+"""
+import random
+from collections import defaultdict
+
+from rest_framework.authtoken.models import Token
+
+from profiles.models import Profile
+from profiles.synthetic import pick, popularity
+
+from .models import Conversation, Message
+
+OPENERS = [
+    'Hi! I liked your profile.', 'Hello, how are you?', 'Namaste! Nice to meet you.',
+    'Hey, I see we are both from the same city.', 'Hi, would love to get to know you.',
+]
+REPLIES = [
+    'Thanks! How has your week been?', 'That sounds great.', 'What do you do on weekends?',
+    'I work in Pune as well.', 'My family would love to meet yours.', 'Haha, same here!',
+    'Let us talk over a call sometime.', 'I have been travelling a lot lately.',
+]
+
+# Conversation lengths follow a Pareto distribution: most threads are a few
+# messages long, a handful run into the hundreds
+MESSAGE_COUNT_SHAPE = 1.3
+MAX_MESSAGES_PER_CONVERSATION = 2000
+
+
+def message_count(rng, mean):
+    """Skewed message count for one conversation with roughly ``mean`` on average."""
+    # A Pareto variate with shape a has mean a / (a - 1)
+    scale = mean * (MESSAGE_COUNT_SHAPE - 1) / MESSAGE_COUNT_SHAPE
+    return min(MAX_MESSAGES_PER_CONVERSATION, max(1, int(scale * rng.paretovariate(MESSAGE_COUNT_SHAPE))))
+
+
+def _owner(first, second):
+    # Every unordered pair has exactly one owning side, so callers seeding
+    # disjoint ranges of initiators never create the same conversation twice
+    return min(first, second) if (first + second) % 2 == 0 else max(first, second)
+
+
+def seed_conversations(profile_ids, count, seed=0, messages_per_conversation=20, batch_size=5000, initiators=None):
+    """
+    Create up to ``count`` two-person conversations, each with a skewed
+    number of alternating messages. One side is drawn from the ``initiators``
+    positions of ``profile_ids`` (default: all), the other from everyone,
+    both weighted towards popular profiles. Disjoint ``initiators`` ranges
+    can be seeded in parallel. Summaries are not maintained; run
+    ``summaries.rebuild()`` afterwards. Returns ``(conversations, messages)``
+    created.
+    """
+    profile_ids = list(profile_ids)
+    initiators = initiators or range(len(profile_ids))
+    rng = random.Random(f'conversations:{seed}:{initiators.start}')
+    cum_weights = popularity(len(profile_ids), seed)
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        first = pick(rng, cum_weights, initiators.start, initiators.stop)
+        second = pick(rng, cum_weights)
+        if first != second and _owner(first, second) in initiators:
+            pairs.add((min(first, second), max(first, second)))
+    pairs = sorted(pairs)
+
+    Through = Conversation.participants.through
+    conversations_created = messages_created = 0
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        conversations = Conversation.objects.bulk_create([
+            Conversation(low_profile_id=low, high_profile_id=high)
+            for low, high in (Conversation.pair(profile_ids[first], profile_ids[second]) for first, second in chunk)
+        ])
+        Through.objects.bulk_create([
+            Through(conversation_id=conversation.pk, profile_id=profile_ids[index])
+            for conversation, pair in zip(conversations, chunk)
+            for index in pair
+        ])
+        messages = []
+        for conversation, (first, second) in zip(conversations, chunk):
+            senders = (profile_ids[first], profile_ids[second])
+            if rng.random() < 0.5:
+                senders = senders[::-1]
+            for n in range(message_count(rng, messages_per_conversation)):
+                text = rng.choice(OPENERS) if n == 0 else rng.choice(REPLIES)
+                messages.append(Message(conversation=conversation, sender_id=senders[n % 2], content=text))
+            if len(messages) >= batch_size:
+                Message.objects.bulk_create(messages, batch_size=batch_size)
+                messages_created += len(messages)
+                messages = []
+        Message.objects.bulk_create(messages, batch_size=batch_size)
+        messages_created += len(messages)
+        conversations_created += len(conversations)
+    return conversations_created, messages_created
+
+
+def chat_actors(count, seed=0):
+    """
+    Pick up to ``count`` profiles that have conversations and give each an
+    API token, for driving the API as them. Returns dicts with the
+    ``username``, ``user_id``, ``profile_id``, ``token`` and
+    ``conversations`` ids.
+    """
+    rng = random.Random(seed)
+    Through = Conversation.participants.through
+    conversations = defaultdict(list)
+    for conversation_id, profile_id in Through.objects.values_list('conversation_id', 'profile_id'):
+        conversations[profile_id].append(conversation_id)
+
+    profiles = list(Profile.objects.filter(pk__in=list(conversations)).select_related('user').order_by('pk'))
+    profiles = rng.sample(profiles, min(count, len(profiles)))
+    tokens = {token.user_id: token.key for token in Token.objects.bulk_create(
+        [Token(user=profile.user, key=Token.generate_key()) for profile in profiles]
+    )}
+    return [
+        {
+            'username': profile.user.username,
+            'user_id': profile.user_id,
+            'profile_id': profile.pk,
+            'token': tokens[profile.user_id],
+            'conversations': conversations[profile.pk],
+        }
+        for profile in profiles
+    ]
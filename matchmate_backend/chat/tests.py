@@ -1,3 +1,492 @@
+import importlib
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.apps import apps
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from matchmate_backend.asgi import application
+from profiles.models import Profile
+from profiles.synthetic import seed_profiles
+from profiles.tests import QueryPlanTestCase, make_profile
+from .models import Conversation, ConversationSummary, Message
+from . import summaries, synthetic
+from .views import ConversationViewSet, MessageViewSet, conversation_between
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        self.bob_token = Token.objects.create(user=self.bob.user)
+
+    def connect(self, token):
+        return WebsocketCommunicator(application, f'/ws/chat/?token={token}', headers=[(b'origin', b'http://localhost')])
+
+    def send_as_alice(self, content):
+        client = APIClient()
+        client.force_authenticate(self.alice.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                f'/api/chat/conversations/{self.conversation.id}/send_message/',
+                {'content': content}, format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    async def test_rejects_unknown_token(self):
+        communicator = self.connect('not-a-token')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_pushes_new_messages_to_participants(self):
+        communicator = self.connect(self.bob_token.key)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        sent = await sync_to_async(self.send_as_alice)('Hello Bob')
+
+        created = await communicator.receive_json_from()
+        self.assertEqual(created['type'], 'message.created')
+        self.assertEqual(created['conversation_id'], self.conversation.id)
+        self.assertEqual(created['message']['id'], sent['id'])
+        updated = await communicator.receive_json_from()
+        self.assertEqual(updated['type'], 'conversation.updated')
+        await communicator.disconnect()
+
+
+class ConversationListQueryTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def add_conversations(self, count, prefix):
+        seed_profiles(count, prefix=prefix)
+        others = list(Profile.objects.filter(user__username__startswith=f'{prefix}-'))
+        pairs = [Conversation.pair(self.me.id, other.id) for other in others]
+        conversations = Conversation.objects.bulk_create([
+            Conversation(low_profile_id=low, high_profile_id=high) for low, high in pairs
+        ])
+        Through = Conversation.participants.through
+        links = []
+        messages = []
+        for conversation, other in zip(conversations, others):
+            links.append(Through(conversation_id=conversation.id, profile_id=self.me.id))
+            links.append(Through(conversation_id=conversation.id, profile_id=other.id))
+            messages.append(Message(conversation=conversation, sender=other, content='Hi'))
+            messages.append(Message(conversation=conversation, sender=self.me, content='Hello'))
+        Through.objects.bulk_create(links)
+        Message.objects.bulk_create(messages)
+        # bulk_create bypasses the views that keep summaries current
+        summaries.rebuild()
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        return len(captured), response.json()
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        self.add_conversations(10, 'few')
+        few_queries, data = self.list_queries()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['unread_count'], 1)
+        self.assertEqual(data[0]['last_message']['content'], 'Hello')
+
+        self.add_conversations(990, 'many')
+        many_queries, data = self.list_queries()
+        self.assertEqual(len(data), 1000)
+        self.assertEqual(many_queries, few_queries)
+
+
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+        response = self.client.post('/api/chat/conversations/', {'other_user_id': self.bob.user_id}, format='json')
+        self.conversation_id = response.json()['id']
+
+    def summary(self, profile):
+        return ConversationSummary.objects.get(conversation_id=self.conversation_id, participant=profile)
+
+    def send(self, profile, content):
+        client = APIClient()
+        client.force_authenticate(profile.user)
+        response = client.post(f'/api/chat/conversations/{self.conversation_id}/send_message/', {'content': content}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_send_and_read_update_counters(self):
+        first = self.send(self.alice, 'Hi Bob')
+        self.send(self.alice, 'Are you there?')
+        self.assertEqual(self.summary(self.bob).unread_count, 2)
+        self.assertEqual(self.summary(self.alice).unread_count, 0)
+        self.assertEqual(self.summary(self.bob).last_message_preview, 'Are you there?')
+
+        bob = APIClient()
+        bob.force_authenticate(self.bob.user)
+        url = f'/api/chat/conversations/{self.conversation_id}/messages/{first}/mark_read/'
+        self.assertEqual(bob.patch(url).status_code, 200)
+        self.assertEqual(bob.patch(url).status_code, 200)
+        self.assertEqual(self.summary(self.bob).unread_count, 1)
+
+        inbox = bob.get('/api/chat/conversations/').json()
+        self.assertEqual(inbox[0]['unread_count'], 1)
+        self.assertEqual(inbox[0]['last_message']['content'], 'Are you there?')
+
+    def test_rebuild_reconciles_with_incremental_updates(self):
+        self.send(self.alice, 'Hi Bob')
+        self.send(self.bob, 'Hi Alice')
+        self.send(self.alice, 'How are you?')
+        fields = ('participant_id', 'last_message_id', 'last_message_preview', 'unread_count')
+        before = set(ConversationSummary.objects.values_list(*fields))
+        ConversationSummary.objects.update(last_message=None, last_message_preview='', unread_count=99)
+        summaries.rebuild()
+        self.assertEqual(set(ConversationSummary.objects.values_list(*fields)), before)
+
+
+class ConversationPairTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+
+    def start(self, profile, other):
+        client = APIClient()
+        client.force_authenticate(profile.user)
+        return client.post('/api/chat/conversations/', {'other_user_id': other.user_id}, format='json')
+
+    def test_either_side_gets_the_same_conversation(self):
+        first = self.start(self.alice, self.bob)
+        self.assertEqual(first.status_code, 201)
+        again = self.start(self.bob, self.alice)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['id'], first.json()['id'])
+        conversation = Conversation.objects.get()
+        self.assertEqual(
+            (conversation.low_profile_id, conversation.high_profile_id),
+            Conversation.pair(self.alice.id, self.bob.id),
+        )
+
+    def test_deleted_partners_leave_the_inbox(self):
+        with_bob, _ = conversation_between(self.alice, self.bob)
+        carol = make_profile('carol')
+        conversation_between(self.alice, carol)
+        client = APIClient()
+        client.force_authenticate(self.alice.user)
+        before = client.get('/api/chat/conversations/')
+        self.assertEqual(len(before.json()), 2)
+
+        carol_client = APIClient()
+        carol_client.force_authenticate(carol.user)
+        self.assertEqual(carol_client.delete('/api/profiles/delete_profile/').status_code, 200)
+        after = client.get('/api/chat/conversations/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual([summary['id'] for summary in after.json()], [with_bob.id])
+
+    def test_losing_a_concurrent_create_returns_the_winner(self):
+        winner, _ = conversation_between(self.alice, self.bob)
+        # The probe ran before the other request committed its row
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            conversation, created = conversation_between(self.bob, self.alice)
+        self.assertFalse(created)
+        self.assertEqual(conversation, winner)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_migration_merges_duplicates(self):
+        migration = importlib.import_module('chat.migrations.0006_conversation_unique_pair')
+        duplicates = Conversation.objects.bulk_create([Conversation(), Conversation()])
+        for conversation in duplicates:
+            conversation.participants.add(self.alice, self.bob)
+        Message.objects.create(conversation=duplicates[0], sender=self.alice, content='Hi Bob')
+        read = Message.objects.create(conversation=duplicates[1], sender=self.bob, content='Hi Alice')
+        latest = Message.objects.create(conversation=duplicates[1], sender=self.bob, content='Still there?')
+        summaries.rebuild()
+        ConversationSummary.objects.filter(participant=self.alice, conversation=duplicates[1]).update(
+            last_read_message=read,
+        )
+
+        migration.assign_pairs(apps, None)
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.id, duplicates[0].id)
+        self.assertEqual(conversation.messages.count(), 3)
+        self.assertEqual(
+            (conversation.low_profile_id, conversation.high_profile_id),
+            Conversation.pair(self.alice.id, self.bob.id),
+        )
+        alice = ConversationSummary.objects.get(participant=self.alice)
+        self.assertEqual(alice.last_message_id, latest.id)
+        self.assertEqual(alice.last_read_message_id, read.id)
+        self.assertEqual(alice.unread_count, 1)
+        self.assertEqual(ConversationSummary.objects.get(participant=self.bob).unread_count, 1)
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        self.messages = Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.alice, content=f'Message {n}')
+            for n in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob.user)
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [message['id'] for message in data['results']], data['has_more']
+
+    def test_latest_page_then_scroll_back(self):
+        url = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        ids = [message.id for message in self.messages]
+        self.assertEqual(self.ids(url, limit=3), (ids[4:], True))
+        self.assertEqual(self.ids(url, limit=3, before=ids[4]), (ids[1:4], True))
+        self.assertEqual(self.ids(url, limit=3, before=ids[1]), (ids[:1], False))
+
+    def test_since_returns_only_new_messages(self):
+        url = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        ids = [message.id for message in self.messages]
+        self.assertEqual(self.ids(url, since=ids[4]), (ids[5:], False))
+        self.assertEqual(self.ids(url, since=ids[-1]), ([], False))
+
+    def test_message_viewset_list_pages_the_same_way(self):
+        # The router's conversation-messages route shadows this one in
+        # urls.py, so call the view directly
+        view = MessageViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/', {'since': self.messages[4].id})
+        force_authenticate(request, self.bob.user)
+        response = view(request, conversation_pk=self.conversation.id)
+        self.assertEqual([m['id'] for m in response.data['results']], [m.id for m in self.messages[5:]])
+
+    def test_rejects_bad_parameters(self):
+        url = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        self.assertEqual(self.client.get(url, {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': 1, 'before': 2}).status_code, 400)
+
+    def test_rejects_anchors_outside_the_conversation(self):
+        url = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        other, _ = conversation_between(self.alice, make_profile('carol'))
+        foreign = Message.objects.create(conversation=other, sender=self.alice, content='Elsewhere')
+        for anchor in (999999, foreign.id):
+            for param in ('since', 'before'):
+                with self.subTest(anchor=anchor, param=param):
+                    response = self.client.get(url, {param: anchor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(param, response.json())
+
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        self.messages = Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.alice, content=f'Message {n}')
+            for n in range(200)
+        ])
+        summaries.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob.user)
+        self.url = f'/api/chat/conversations/{self.conversation.id}/mark_read/'
+
+    def test_single_write_marks_whole_thread_read(self):
+        summary = ConversationSummary.objects.get(conversation=self.conversation, participant=self.bob)
+        self.assertEqual(summary.unread_count, 200)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'last_read_message_id': self.messages[-1].id, 'unread_count': 0})
+        writes = [q for q in captured if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 1)
+
+    def test_partial_read_and_no_going_back(self):
+        response = self.client.post(self.url, {'message_id': self.messages[149].id}, format='json')
+        self.assertEqual(response.json()['unread_count'], 50)
+        response = self.client.post(self.url, {'message_id': self.messages[10].id}, format='json')
+        self.assertEqual(response.json()['last_read_message_id'], self.messages[149].id)
+
+        history = self.client.get(f'/api/chat/conversations/{self.conversation.id}/messages/', {'limit': 200}).json()
+        read_flags = [message['is_read'] for message in history['results']]
+        self.assertEqual(read_flags, [True] * 150 + [False] * 50)
+
+    def test_non_participant_gets_404(self):
+        outsider = make_profile('outsider')
+        client = APIClient()
+        client.force_authenticate(outsider.user)
+        self.assertEqual(client.post(self.url).status_code, 404)
+
+    def test_non_numeric_conversation_gets_404(self):
+        self.assertEqual(self.client.post('/api/chat/conversations/abc/mark_read/').status_code, 404)
+
+
+class ChatPayloadTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=sender, content=f'Message {n}')
+            for n, sender in enumerate([self.alice, self.bob] * 25)
+        ])
+        summaries.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+        self.url = f'/api/chat/conversations/{self.conversation.id}/messages/'
+
+    def test_senders_are_side_loaded_once(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual({message['sender'] for message in data['results']}, {self.alice.id, self.bob.id})
+        self.assertEqual(set(data['participants']), {str(self.alice.id), str(self.bob.id)})
+        self.assertEqual(
+            set(data['participants'][str(self.bob.id)]),
+            {'id', 'user_id', 'first_name', 'profile_picture', 'picture_variants'},
+        )
+
+    def test_fields_parameter_limits_payload(self):
+        data = self.client.get(self.url, {'fields': 'id,content'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'content'})
+        self.assertNotIn('participants', data)
+
+        inbox = self.client.get('/api/chat/conversations/', {'fields': 'id,unread_count'}).json()
+        self.assertEqual(inbox, [{'id': self.conversation.id, 'unread_count': 25}])
+
+    def test_inbox_uses_profile_cards(self):
+        inbox = self.client.get('/api/chat/conversations/').json()
+        self.assertEqual(inbox[0]['other_participant']['first_name'], 'Bob')
+        self.assertEqual(inbox[0]['last_message']['sender'], self.bob.id)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+        self.bob_client = APIClient()
+        self.bob_client.force_authenticate(self.bob.user)
+        self.bob_client.post(f'/api/chat/conversations/{self.conversation.id}/send_message/', {'content': 'Hi'})
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as captured:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        return first['ETag'], len(captured)
+
+    def test_unchanged_resources_answer_304(self):
+        for url in [
+            '/api/chat/conversations/',
+            f'/api/chat/conversations/{self.conversation.id}/messages/',
+        ]:
+            with self.subTest(url=url):
+                _, queries = self.revalidate(url)
+                self.assertLessEqual(queries, 3)
+
+    def test_changes_produce_new_etags(self):
+        inbox = '/api/chat/conversations/'
+        thread = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        inbox_etag, _ = self.revalidate(inbox)
+        thread_etag, _ = self.revalidate(thread)
+
+        self.bob_client.post(f'/api/chat/conversations/{self.conversation.id}/send_message/', {'content': 'Hello'})
+        self.assertEqual(self.client.get(inbox, HTTP_IF_NONE_MATCH=inbox_etag).status_code, 200)
+        thread_etag, _ = self.revalidate(thread)
+        self.client.post(f'/api/chat/conversations/{self.conversation.id}/send_message/', {'content': 'Hey'})
+        thread_etag, _ = self.revalidate(thread)
+        # Bob reading the thread changes is_read on Alice's view of it
+        self.bob_client.post(f'/api/chat/conversations/{self.conversation.id}/mark_read/')
+        self.assertEqual(self.client.get(thread, HTTP_IF_NONE_MATCH=thread_etag).status_code, 200)
+
+        # Query parameters are part of the tag
+        self.assertEqual(self.client.get(thread, {'limit': 1}, HTTP_IF_NONE_MATCH=thread_etag).status_code, 200)
+
+    def test_edits_produce_new_etags(self):
+        inbox = '/api/chat/conversations/'
+        thread = f'/api/chat/conversations/{self.conversation.id}/messages/'
+        inbox_etag, _ = self.revalidate(inbox)
+        thread_etag, _ = self.revalidate(thread)
+
+        message = Message.objects.get()
+        response = self.bob_client.patch(f'{thread}{message.id}/', {'content': 'Edited'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(thread, HTTP_IF_NONE_MATCH=thread_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['content'], 'Edited')
+        response = self.client.get(inbox, HTTP_IF_NONE_MATCH=inbox_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ConversationSummary.objects.get(participant=self.alice).last_message_preview, 'Edited')
+
+        # The edit count survives a rebuild, so no earlier tag comes back
+        thread_etag, _ = self.revalidate(thread)
+        summaries.rebuild()
+        self.assertEqual(self.client.get(thread, HTTP_IF_NONE_MATCH=thread_etag).status_code, 304)
+
+    def test_non_participant_gets_no_etag(self):
+        outsider = make_profile('outsider')
+        client = APIClient()
+        client.force_authenticate(outsider.user)
+        response = client.get(f'/api/chat/conversations/{self.conversation.id}/messages/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ChatQueryPlanTests(QueryPlanTestCase):
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.conversation, _ = conversation_between(self.alice, self.bob)
+        self.messages = Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.bob, content=f'Message {n}')
+            for n in range(5)
+        ])
+        summaries.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+        self.url = f'/api/chat/conversations/{self.conversation.id}/'
+
+    def test_inbox(self):
+        self.assertNoFullScans(lambda: self.client.get('/api/chat/conversations/'))
+
+    def test_message_history(self):
+        middle = self.messages[2].id
+        for params in [{}, {'before': middle}, {'since': middle}]:
+            with self.subTest(params=params):
+                self.assertNoFullScans(lambda: self.client.get(f'{self.url}messages/', params))
+
+    def test_send_and_read(self):
+        self.assertNoFullScans(lambda: self.client.post(f'{self.url}send_message/', {'content': 'Hi'}))
+        self.assertNoFullScans(lambda: self.client.post(f'{self.url}mark_read/'))
+
+    def test_start_conversation(self):
+        self.assertNoFullScans(lambda: self.client.post('/api/chat/conversations/', {'other_user_id': self.bob.user_id}))
+
 
-# Create your tests here.
+class SyntheticDataTests(TestCase):
+    def test_seeded_conversations_are_unique_pairs(self):
+        seed_profiles(30, prefix='seed')
+        profile_ids = list(Profile.objects.values_list('id', flat=True))
+        conversations, messages = synthetic.seed_conversations(profile_ids, 40, seed=1)
+        self.assertEqual(Conversation.objects.count(), conversations)
+        self.assertEqual(Message.objects.count(), messages)
+        Through = Conversation.participants.through
+        pairs = {}
+        for conversation_id, profile_id in Through.objects.values_list('conversation_id', 'profile_id'):
+            pairs.setdefault(conversation_id, set()).add(profile_id)
+        self.assertTrue(all(len(pair) == 2 for pair in pairs.values()))
+        self.assertEqual(len({frozenset(pair) for pair in pairs.values()}), conversations)
@@ -24,4 +24,4 @@ urlpatterns = [
     path('conversations/<int:conversation_pk>/messages/<int:pk>/mark_read/', 
          MessageViewSet.as_view({'patch': 'mark_read'}), 
          name='message-mark-read'),
-] 
\ No newline at end of file
+]
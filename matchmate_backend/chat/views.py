@@ -1,14 +1,135 @@
+import logging
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch, Q, Sum
+from django.utils import timezone
+from .models import Conversation, ConversationSummary, Message
+from .serializers import (
+    ConversationSerializer, ConversationSummarySerializer, MessageSerializer,
+    participant_cards, requested_fields,
+)
+from . import events, summaries
+from .pagination import paginate_messages
 from profiles.models import Profile
+from matchmate_backend.conditional import conditional, make_etag
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+def message_posted(conversation, message, message_data):
+    # Move the conversation to the top of everyone's inbox, update the inbox
+    # summaries and push the message to connected clients. Callers run this
+    # in the same transaction that saved the message.
+    Conversation.objects.filter(pk=conversation.pk).update(updated_at=timezone.now())
+    conversation.refresh_from_db(fields=['updated_at'])
+    summaries.record_message(message)
+    events.message_created(conversation, message_data)
+    events.conversation_updated(conversation)
+
+# Any new message, edit, read or new conversation changes one of these
+INBOX_AGGREGATES = {
+    'conversations': Count('id'),
+    'last_conversation': Max('conversation_id'),
+    'last_message': Max('last_message_id'),
+    'unread': Sum('unread_count'),
+    'edits': Sum('edits'),
+}
+
+# Deleting a profile nulls its side of every pair it was in; the partner's
+# inbox hides those conversations rather than listing them with nobody
+PAIRED = Q(conversation__low_profile__isnull=False, conversation__high_profile__isnull=False)
+
+def inbox_profiles(user):
+    # Everyone shown in the user's inbox; their latest edit is part of the tag
+    return Profile.objects.filter(conversations__summaries__participant__user=user)
+
+def inbox_etag(viewset, request):
+    inbox = ConversationSummary.objects.filter(PAIRED, participant__user=request.user).aggregate(**INBOX_AGGREGATES)
+    profiles = inbox_profiles(request.user).aggregate(updated=Max('updated_at'))
+    return make_etag(request.get_full_path(), request.user.id, inbox, profiles)
+
+def thread_state(conversation_id):
+    # The latest message, the edits so far, every participant's read
+    # watermark and their profiles determine a page of history
+    return (
+        ConversationSummary.objects
+        .filter(conversation_id=conversation_id)
+        .order_by('participant_id')
+        .values_list(
+            'participant__user_id', 'last_message_id', 'edits', 'last_read_message_id', 'participant__updated_at',
+        )
+    )
+
+def thread_etag(viewset, request, pk=None, conversation_pk=None):
+    rows = list(thread_state(pk or conversation_pk))
+    if request.user.id not in {row[0] for row in rows}:
+        return None
+    return make_etag(request.get_full_path(), request.user.id, rows)
+
+def conversation_between(profile, other_profile):
+    """
+    The one-to-one conversation of two profiles, created if there is none.
+    Returns ``(conversation, created)``. An existing conversation is a
+    single probe of the unique pair index; a concurrent request creating
+    the same pair loses on that index and returns the winner's row.
+    """
+    low, high = Conversation.pair(profile.id, other_profile.id)
+    conversation = Conversation.objects.filter(low_profile_id=low, high_profile_id=high).first()
+    if conversation is not None:
+        return conversation, False
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(low_profile_id=low, high_profile_id=high)
+            conversation.participants.add(low, high)
+            summaries.ensure_summaries(conversation)
+    except IntegrityError:
+        return Conversation.objects.get(low_profile_id=low, high_profile_id=high), False
+    return conversation, True
+
+def inbox_summaries(user_profile):
+    # The inbox is built from one small summary row per conversation;
+    # message history is never read here
+    return (
+        ConversationSummary.objects
+        .filter(PAIRED, participant=user_profile)
+        .select_related('conversation')
+        .prefetch_related(Prefetch(
+            'conversation__participants',
+            queryset=Profile.objects.select_related('user'),
+        ))
+        .order_by('-last_activity_at', '-conversation_id')
+    )
+
+def save_message(serializer, conversation, sender):
+    """Save a validated message and everything that follows from it, atomically."""
+    with transaction.atomic():
+        message = serializer.save(conversation=conversation, sender=sender)
+        message_posted(conversation, message, serializer.data)
+    logger.debug('Created message %s', message.id)
+    return message
+
+def message_page(request, conversation_id, messages, context):
+    # Senders are side-loaded once as profile cards instead of being embedded
+    # in every message
+    page, has_more = paginate_messages(messages, request.query_params)
+    context['read_watermarks'] = summaries.read_watermarks(conversation_id)
+    data = {
+        'results': MessageSerializer(page, many=True, context=context).data,
+        'has_more': has_more,
+    }
+    if not context.get('fields') or 'sender' in context['fields']:
+        participants = Profile.objects.filter(conversations__id=conversation_id).select_related('user')
+        data['participants'] = participant_cards(participants, context)
+    return data
+
 class ConversationViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -16,47 +137,35 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         try:
             user_profile = self.request.user.profile
-            # Get conversations where the current user is a participant
-            conversations = Conversation.objects.filter(participants=user_profile).distinct()
-            
-            # Create a set to track user IDs we've already seen
-            seen_user_ids = set()
-            unique_conversations = []
-            
-            # Filter out duplicate conversations with the same participants
-            for conv in conversations:
-                # Get all participants excluding the current user
-                other_participants = conv.participants.exclude(user=self.request.user)
-                
-                # If there are no other participants, skip this conversation
-                if not other_participants.exists():
-                    continue
-                    
-                # Get the first other participant's ID
-                other_user_id = other_participants.first().user.id
-                
-                # If we haven't seen this user before, add the conversation
-                if other_user_id not in seen_user_ids:
-                    seen_user_ids.add(other_user_id)
-                    unique_conversations.append(conv)
-            
-            # Log for debugging
-            print(f"User {self.request.user.username} has {len(unique_conversations)} unique conversations")
-            for conv in unique_conversations:
-                participants = conv.participants.all()
-                print(f"Conversation {conv.id} participants: {[p.user.username for p in participants]}")
-                
-            # Return a queryset containing only unique conversations
-            conv_ids = [conv.id for conv in unique_conversations]
-            return Conversation.objects.filter(id__in=conv_ids)
-        except Exception as e:
-            print(f"Error in get_queryset: {str(e)}")
-            # Return empty queryset instead of raising error
+        except Profile.DoesNotExist:
             return Conversation.objects.none()
+        if self.action != 'retrieve':
+            return Conversation.objects.filter(participants=user_profile)
+        # Participants, unread counts and the latest message all come from a
+        # fixed number of queries, however many conversations the user has
+        return Conversation.objects.for_inbox(user_profile)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = requested_fields(self.request)
+        return context
+
+    @conditional(inbox_etag)
+    def list(self, request, *args, **kwargs):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response([])
+
+        # Every pair of profiles has at most one conversation, so the inbox
+        # is the summary rows as they are
+        inbox = inbox_summaries(user_profile)
+        serializer = ConversationSummarySerializer(inbox, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         try:
-            print(f"Creating conversation with data: {request.data}")
+            logger.debug('Creating conversation with data: %s', request.data)
             other_user_id = request.data.get('other_user_id')
             if not other_user_id:
                 return Response(
@@ -89,56 +198,84 @@ class ConversationViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            print(f"Creating conversation between users: {user_profile.user.username} (ID: {user_profile.user.id}) and {other_profile.user.username} (ID: {other_profile.user.id})")
+            logger.debug('Creating conversation between users %s and %s', user_profile.user_id, other_profile.user_id)
 
-            # Check if conversation already exists
-            existing_conversations = Conversation.objects.filter(participants=user_profile).filter(participants=other_profile)
-            
-            if existing_conversations.exists():
-                existing_conversation = existing_conversations.first()
-                print(f"Found existing conversation with ID: {existing_conversation.id}")
-                
-                # Double-check participants
-                participants = existing_conversation.participants.all()
-                participant_usernames = [p.user.username for p in participants]
-                print(f"Participants: {participant_usernames}")
-                
-                serializer = self.get_serializer(existing_conversation)
+            conversation, created = conversation_between(user_profile, other_profile)
+            if not created:
+                logger.debug('Found existing conversation %s', conversation.id)
+                serializer = self.get_serializer(conversation)
                 return Response(serializer.data)
 
-            # Create new conversation
-            conversation = Conversation.objects.create()
-            conversation.participants.add(user_profile, other_profile)
-            print(f"Created new conversation with ID: {conversation.id}")
-            
-            # Verify participants were added correctly
-            participants = conversation.participants.all()
-            participant_usernames = [p.user.username for p in participants]
-            print(f"New conversation participants: {participant_usernames}")
+            logger.info(
+                'Created conversation %s between users %s and %s',
+                conversation.id, user_profile.user_id, other_profile.user_id,
+            )
+            events.conversation_updated(conversation)
             
             serializer = self.get_serializer(conversation)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
-            print(f"Error creating conversation: {str(e)}")
+            logger.exception('Error creating conversation')
             return Response(
                 {'error': f'Failed to create conversation: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     @action(detail=True, methods=['get'])
+    @conditional(thread_etag)
     def messages(self, request, pk=None):
         try:
             conversation = self.get_object()
-            messages = conversation.messages.all()
-            serializer = MessageSerializer(messages, many=True)
-            return Response(serializer.data)
+            data = message_page(request, conversation.pk, conversation.messages.all(), self.get_serializer_context())
+            return Response(data)
+        except (ValidationError, Http404):
+            raise
         except Exception as e:
-            print(f"Error getting messages: {str(e)}")
+            logger.exception('Error getting messages for conversation %s', pk)
             return Response(
                 {'error': f'Failed to get messages: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Mark everything up to ``message_id`` (default: the latest message) as
+        read by advancing the caller's read watermark with a single UPDATE.
+        """
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {'error': 'Your profile is not set up properly'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({'message_id': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated = summaries.advance_read_watermark(pk, user_profile, message_id)
+        summary = (
+            ConversationSummary.objects
+            .filter(conversation_id=pk, participant=user_profile)
+            .values('last_read_message_id', 'unread_count')
+            .first()
+        )
+        if summary is None:
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        if updated:
+            events.conversation_read(pk, request.user.id, summary['last_read_message_id'])
+        return Response(summary)
+
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -147,12 +284,30 @@ class MessageViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         try:
             conversation_id = self.kwargs.get('conversation_pk')
-            print(f"Getting messages for conversation {conversation_id}")
+            logger.debug('Getting messages for conversation %s', conversation_id)
             return Message.objects.filter(conversation_id=conversation_id)
         except Exception as e:
-            print(f"Error in MessageViewSet.get_queryset: {str(e)}")
+            logger.exception('Error in MessageViewSet.get_queryset')
             return Message.objects.none()
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = requested_fields(self.request)
+        return context
+
+    @conditional(thread_etag)
+    def list(self, request, *args, **kwargs):
+        conversation_pk = self.kwargs.get('conversation_pk')
+        data = message_page(request, conversation_pk, self.get_queryset(), self.get_serializer_context())
+        return Response(data)
+
+    def perform_update(self, serializer):
+        # The edit shows in the thread and, for the latest message, in
+        # everyone's inbox preview; both ETags follow the summaries
+        with transaction.atomic():
+            message = serializer.save()
+            summaries.record_edit(message)
+
     def create(self, request, *args, **kwargs):
         """
         Create a new message in the specified conversation.
@@ -160,10 +315,10 @@ class MessageViewSet(viewsets.ModelViewSet):
         try:
             # Extract the conversation ID from the URL
             conversation_pk = self.kwargs.get('conversation_pk')
-            print(f"Creating message in conversation {conversation_pk}")
-            print(f"Request method: {request.method}")
-            print(f"Request data: {request.data}")
-            print(f"Request user: {request.user.username}")
+            logger.debug(
+                'User %s creating message in conversation %s: %s',
+                request.user.pk, conversation_pk, request.data,
+            )
             
             # Get the conversation or return 404
             try:
@@ -184,26 +339,22 @@ class MessageViewSet(viewsets.ModelViewSet):
             # Validate the message content
             serializer = self.get_serializer(data=request.data)
             if not serializer.is_valid():
-                print(f"Message validation errors: {serializer.errors}")
+                logger.info('Message validation errors: %s', serializer.errors)
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
             # Save the message
             try:
-                message = serializer.save(
-                    conversation=conversation,
-                    sender=request.user.profile
-                )
-                print(f"Successfully created message with ID {message.id}")
+                save_message(serializer, conversation, request.user.profile)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             except Exception as e:
-                print(f"Error saving message: {str(e)}")
+                logger.exception('Error saving message in conversation %s', conversation_pk)
                 return Response(
                     {'error': f'Failed to save message: {str(e)}'}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
                 
         except Exception as e:
-            print(f"Unexpected error in MessageViewSet.create: {str(e)}")
+            logger.exception('Unexpected error in MessageViewSet.create')
             return Response(
                 {'error': f'Failed to create message: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -213,11 +364,16 @@ class MessageViewSet(viewsets.ModelViewSet):
     def mark_read(self, request, pk=None, conversation_pk=None):
         try:
             message = self.get_object()
-            message.is_read = True
-            message.save()
+            # Reading a message means having read everything before it too
+            with transaction.atomic():
+                updated = summaries.advance_read_watermark(message.conversation_id, request.user.profile, message.id)
+                message.is_read = True
+                message.save(update_fields=['is_read'])
+            if updated:
+                events.conversation_read(message.conversation_id, request.user.id, message.id)
             return Response({'status': 'message marked as read'})
         except Exception as e:
-            print(f"Error marking message as read: {str(e)}")
+            logger.exception('Error marking message %s as read', pk)
             return Response(
                 {'error': f'Failed to mark message as read: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -227,9 +383,10 @@ class MessageViewSet(viewsets.ModelViewSet):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def send_message(request, conversation_pk):
-    print(f"send_message view called with method: {request.method}")
-    print(f"Conversation ID: {conversation_pk}")
-    print(f"Request data: {request.data}")
+    logger.debug(
+        'User %s sending message to conversation %s: %s',
+        request.user.pk, conversation_pk, request.data,
+    )
     
     try:
         # Get the conversation or return 404
@@ -245,19 +402,15 @@ def send_message(request, conversation_pk):
         # Validate the message content
         serializer = MessageSerializer(data=request.data)
         if not serializer.is_valid():
-            print(f"Message validation errors: {serializer.errors}")
+            logger.info('Message validation errors: %s', serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         # Save the message
-        message = serializer.save(
-            conversation=conversation,
-            sender=request.user.profile
-        )
-        print(f"Successfully created message with ID {message.id}")
+        save_message(serializer, conversation, request.user.profile)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
         
     except Exception as e:
-        print(f"Error in send_message: {str(e)}")
+        logger.exception('Error in send_message')
         return Response(
             {'error': f'Failed to send message: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
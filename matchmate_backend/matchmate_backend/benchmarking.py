@@ -0,0 +1,93 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import contextlib
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextlib.contextmanager
+def throwaway_database(file_backed=False):
+    """
+    Run the block against a freshly created test database that is destroyed
+    afterwards, never the configured one. ``file_backed`` puts a SQLite test
+    database in a temporary file instead of shared memory and opens write
+    transactions immediately, so concurrent writers queue for the lock
+    rather than failing on it.
+    """
+    creation = connection.creation
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    old_test_name = settings_dict['TEST'].get('NAME')
+    old_options = dict(settings_dict['OPTIONS'])
+    temp_dir = None
+    if file_backed and connection.vendor == 'sqlite':
+        temp_dir = tempfile.TemporaryDirectory()
+        settings_dict['TEST']['NAME'] = os.path.join(temp_dir.name, 'benchmark.sqlite3')
+        settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=30)
+    setup_test_environment()
+    creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        settings_dict['TEST']['NAME'] = old_test_name
+        settings_dict['OPTIONS'] = old_options
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+def git_revision():
+    """The checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    wsgiref's server with requests handled by a fixed pool of threads, the
+    way a threaded WSGI worker (e.g. gunicorn's gthread) behaves: once every
+    thread is busy, further connections wait in the queue.
+    """
+    request_queue_size = 1024
+
+    def __init__(self, address, threads):
+        super().__init__(address, _QuietHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_wsgi(port, threads=10):
+    """Serve the project's WSGI application on localhost with ``threads`` threads."""
+    from django.core.wsgi import get_wsgi_application
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matchmate_backend.settings')
+    server = PooledWSGIServer(('127.0.0.1', port), threads)
+    server.set_app(get_wsgi_application())
+    server.serve_forever()
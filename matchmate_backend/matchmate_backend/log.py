@@ -0,0 +1,78 @@
+"""
+Structured, non-blocking logging.
+
+``BackgroundQueueHandler`` only puts records on a queue; a ``QueueListener``
+thread formats them as JSON lines and writes them to stderr. Messages use
+``%``-style arguments, so a record that is filtered out by level is never
+formatted, and one that is kept is formatted off the request thread.
+
+Values under sensitive keys (passwords, tokens, ...) are replaced with
+``'[redacted]'`` wherever they appear in arguments or ``extra`` fields.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from collections.abc import Mapping
+
+REDACTED = '[redacted]'
+SENSITIVE_KEYS = {'password', 'password2', 'token', 'key', 'authorization', 'secret', 'api_key'}
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+def redact(value):
+    """Copy of ``value`` with sensitive mapping entries masked, recursively."""
+    if isinstance(value, Mapping):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        if isinstance(record.args, Mapping):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS and not name.startswith('_'):
+                entry[name] = REDACTED if name.lower() in SENSITIVE_KEYS else redact(value)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread that writes them with ``JsonFormatter``
+    to stderr. Unlike ``QueueHandler`` it does not format on the caller's
+    thread; the record is shallow-copied so later changes cannot race.
+    """
+    def __init__(self):
+        super().__init__(queue.SimpleQueue())
+        target = logging.StreamHandler()
+        target.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit; drain the queue first
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
@@ -0,0 +1,158 @@
+"""
+Serving of uploaded media.
+
+``serve`` validates the path and answers conditional requests itself, then
+hands the body to the front-end proxy when ``MEDIA_SENDFILE`` is set:
+
+* ``'x-sendfile'``: Apache mod_xsendfile or lighttpd, which read the file
+  named by the absolute path in ``X-Sendfile``;
+* ``'x-accel-redirect'``: nginx, which serves ``MEDIA_ACCEL_REDIRECT_PREFIX
+  + path`` from an ``internal`` location.
+
+The proxy then streams the file and handles ``Range`` itself. Without a
+proxy the view returns a ``FileResponse``, which WSGI servers send with
+``sendfile()`` through ``wsgi.file_wrapper``, and answers single byte
+ranges. Files whose name is a content hash (see ``profiles.pictures``)
+never change, so they are cached as immutable for a year; anything else is
+revalidated with ``ETag``/``Last-Modified``.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .conditional import etag_matches
+
+# A file named after a hex digest of its content, e.g. card/3f2a...e1.webp
+CONTENT_HASHED = re.compile(r'(^|/)[0-9a-f]{20,}\.\w+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read-only view of ``length`` bytes of ``file`` from its current position."""
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` of the single byte range in ``header``, inclusive;
+    None to serve the whole file (no, malformed or multiple ranges), or
+    ``False`` when the range cannot be satisfied.
+    """
+    match = BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the final ``last`` bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > end:
+        return None if last and int(last) < start else False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    """Whether a ``Range`` request's ``If-Range`` still matches the file."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # If-Range requires the strong comparison
+        return etag in parse_etags(if_range)
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _not_modified(request, etag, mtime):
+    if request.META.get('HTTP_IF_NONE_MATCH'):
+        return etag_matches(request, etag)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('No such file')
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404('No such file')
+
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(info.st_mtime),
+        'Cache-Control': IMMUTABLE if CONTENT_HASHED.search(path) else REVALIDATE,
+        'Accept-Ranges': 'bytes',
+    }
+    if _not_modified(request, etag, info.st_mtime):
+        response = HttpResponseNotModified()
+        for name in ('ETag', 'Last-Modified', 'Cache-Control'):
+            response[name] = headers[name]
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Sendfile'] = full_path
+        return response
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path.lstrip('/')
+        return response
+
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and _if_range_matches(request, etag, info.st_mtime):
+        byte_range = parse_range(request.META['HTTP_RANGE'], info.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{info.st_size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type, headers=headers)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        length = end - start + 1
+        # An open-ended range keeps the real file, so sendfile() still applies
+        body = file if end == info.st_size - 1 else RangeFile(file, length)
+        response = FileResponse(body, status=206, content_type=content_type, headers=headers)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{info.st_size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
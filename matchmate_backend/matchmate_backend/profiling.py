@@ -0,0 +1,184 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` records wall time, database query count and time,
+serializer time and response size for each request, keyed by the resolved
+view name, into a fixed-size in-process ring buffer. ``stats_view`` serves
+per-view p50/p95/p99 aggregates to admins.
+
+Enable it with ``REQUEST_PROFILING = True``. ``REQUEST_PROFILING_SAMPLE_RATE``
+(0-1) profiles only that fraction of requests; unsampled requests cost one
+``random()`` call, so a low rate can stay on in production.
+"""
+import contextlib
+import contextvars
+import itertools
+import random
+import time
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import permissions, serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+Sample = namedtuple('Sample', 'view method status wall_ms queries db_ms serializer_ms bytes')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class RingBuffer:
+    """
+    Keeps the last ``size`` samples. Writers claim a slot from an
+    ``itertools.count``, whose ``next()`` is atomic under the GIL, so
+    recording never takes a lock; readers copy the slots.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._slots = [None] * size
+        self._cursor = itertools.count()
+
+    def append(self, sample):
+        self._slots[next(self._cursor) % self.size] = sample
+
+    def samples(self):
+        return [sample for sample in list(self._slots) if sample is not None]
+
+
+buffer = RingBuffer(getattr(settings, 'REQUEST_PROFILING_BUFFER_SIZE', 10_000))
+
+
+def reset():
+    global buffer
+    buffer = RingBuffer(buffer.size)
+
+
+class _Timings:
+    __slots__ = ('queries', 'db', 'serializer', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def _timed_data(data_property):
+    def data(self):
+        timings = _current.get()
+        if timings is None:
+            return data_property.fget(self)
+        # Serializers nest (method fields build their own), count the outermost
+        timings.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data_property.fget(self)
+        finally:
+            timings.serializer_depth -= 1
+            if not timings.serializer_depth:
+                timings.serializer += time.perf_counter() - started
+    data._profiled = True
+    return property(data)
+
+
+def install_serializer_timer():
+    """Time ``serializer.data`` while a request is being profiled."""
+    if not getattr(serializers.BaseSerializer.data.fget, '_profiled', False):
+        serializers.BaseSerializer.data = _timed_data(serializers.BaseSerializer.data)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0)
+        install_serializer_timer()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = _Timings()
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.queries += 1
+                timings.db += time.perf_counter() - started
+
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall = time.perf_counter() - started
+
+        match = request.resolver_match
+        buffer.append(Sample(
+            view=(match.view_name or match.route) if match else 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            wall_ms=wall * 1000,
+            queries=timings.queries,
+            db_ms=timings.db * 1000,
+            serializer_ms=timings.serializer * 1000,
+            bytes=0 if response.streaming else len(response.content),
+        ))
+        return response
+
+
+def _distribution(values):
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def aggregate(samples):
+    """Per-view request counts and p50/p95/p99 of every measurement."""
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample.view].append(sample)
+    return {
+        view: {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if row.status >= 500),
+            **{
+                field: _distribution([getattr(row, field) for row in rows])
+                for field in ('wall_ms', 'queries', 'db_ms', 'serializer_ms', 'bytes')
+            },
+        }
+        for view, rows in sorted(by_view.items())
+    }
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def stats_view(request):
+    if request.method == 'DELETE':
+        reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    samples = buffer.samples()
+    return Response({
+        'enabled': getattr(settings, 'REQUEST_PROFILING', False),
+        'sample_rate': getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0),
+        'samples': len(samples),
+        'views': aggregate(samples),
+    })
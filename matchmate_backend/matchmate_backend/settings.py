@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,8 @@ ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
 # Application definition
 
 INSTALLED_APPS = [
+    # Must come first so runserver serves the ASGI app, WebSockets included
+    'daphne',
     'jazzmin',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -42,11 +45,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'channels',
     'profiles',
     'chat',
 ]
 
 MIDDLEWARE = [
+    # Outermost so it times the whole stack; inactive unless REQUEST_PROFILING
+    'matchmate_backend.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -76,6 +82,113 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'matchmate_backend.wsgi.application'
+ASGI_APPLICATION = 'matchmate_backend.asgi.application'
+
+# Channel layer used to fan chat events out to WebSocket clients. The
+# in-memory layer only reaches sockets served by the same process; point
+# REDIS_URL at a Redis server to share events across workers.
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+
+# Logging
+# Records are queued and written as JSON lines to stderr by a background
+# thread (matchmate_backend/log.py). Request payload dumps are DEBUG, so at
+# the default level they are never formatted. django.request logs every 4xx
+# as a warning; only its errors (5xx) are kept. Test runs only show warnings.
+
+TESTING = sys.argv[1:2] == ['test']
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING' if TESTING else 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'background': {
+            '()': 'matchmate_backend.log.BackgroundQueueHandler',
+        },
+    },
+    'root': {
+        'handlers': ['background'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        **{
+            app: {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False}
+            for app in ('profiles', 'chat', 'matchmate_backend')
+        },
+        'django.request': {'handlers': ['background'], 'level': 'ERROR', 'propagate': False},
+    },
+}
+
+
+# Request profiling
+# Per-view timings served at /api/profiling/ to admins. A sample rate of
+# 0.01-0.05 keeps the overhead negligible in production.
+
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 1.0))
+REQUEST_PROFILING_BUFFER_SIZE = 10000
+
+
+# Caches
+# Per-user responses of the profile endpoints go in the 'responses' alias: a
+# bounded LRU in local memory, or Redis shared by all workers when REDIS_URL
+# is set. See profiles/response_cache.py. The users behind API tokens go in
+# the 'tokens' alias for TOKEN_CACHE_TTL seconds; see profiles/token_cache.py.
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))
+# Local-memory token caches are not invalidated across workers, so entries
+# expire within seconds unless Redis shares them
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300 if os.environ.get('REDIS_URL') else 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'profiles.response_cache.CountingLocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': RESPONSE_CACHE_MAX_ENTRIES,
+        },
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+        'TIMEOUT': TOKEN_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': TOKEN_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': TOKEN_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'TIMEOUT': 300,
+    }
+    # Shared, so an invalidation reaches every worker at once
+    CACHES['tokens'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'TIMEOUT': TOKEN_CACHE_TTL,
+    }
 
 
 # Database
@@ -84,7 +197,9 @@ WSGI_APPLICATION = 'matchmate_backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Concurrent requests queue for the write lock instead of failing
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
@@ -129,6 +244,25 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Let the front-end proxy send media files: 'x-sendfile' (Apache, lighttpd)
+# or 'x-accel-redirect' (nginx, with an internal location at the prefix
+# aliased to MEDIA_ROOT). Unset, Django streams them itself
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Threads that resize uploaded profile pictures; 0 processes them inline
+# once the upload's transaction commits
+PROFILE_PICTURE_WORKERS = int(os.environ.get('PROFILE_PICTURE_WORKERS', 2))
+
+# Columnar snapshot of profile match attributes, written by
+# export_profile_snapshot and memory-mapped read-only by every process that
+# uses it. Processes look for a replaced file at most this often (seconds)
+PROFILE_SNAPSHOT_PATH = os.environ.get('PROFILE_SNAPSHOT_PATH', str(BASE_DIR / 'profile_snapshot.bin'))
+PROFILE_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('PROFILE_SNAPSHOT_CHECK_INTERVAL', 5))
+if TESTING:
+    # Tests export their own snapshots; never serve a real one to them
+    PROFILE_SNAPSHOT_PATH = str(BASE_DIR / 'profile_snapshot.test.bin')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -168,7 +302,7 @@ CORS_ALLOW_ALL_ORIGINS = True  # Only use this in development!
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'profiles.token_cache.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from profiles import response_cache
+from profiles.tests import make_profile
+from . import log, media, profiling
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiling.reset()
+        response_cache.clear()
+        self.me = make_profile('me')
+        make_profile('other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def stats(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/profiling/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_records_per_view_aggregates(self):
+        for _ in range(3):
+            self.client.get('/api/profiles/potential_matches/')
+        self.client.get('/api/chat/conversations/')
+
+        views = self.stats()['views']
+        matches = views['profile-potential-matches']
+        self.assertEqual(matches['requests'], 3)
+        # Only the first request misses the response cache
+        self.assertEqual(matches['queries']['p50'], 0)
+        self.assertGreater(matches['queries']['p99'], 0)
+        self.assertGreater(matches['serializer_ms']['p99'], 0)
+        self.assertGreater(matches['bytes']['p50'], 0)
+        self.assertLessEqual(matches['wall_ms']['p50'], matches['wall_ms']['p99'])
+        self.assertIn('conversation-list', views)
+
+    def test_sampling_skips_requests(self):
+        with override_settings(REQUEST_PROFILING_SAMPLE_RATE=0.0):
+            client = APIClient()
+            client.force_authenticate(self.me.user)
+            client.get('/api/profiles/my_profile/')
+        self.assertEqual(self.stats()['samples'], 0)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/profiling/').status_code, 403)
+
+    def test_ring_buffer_keeps_latest(self):
+        ring = profiling.RingBuffer(3)
+        for n in range(5):
+            ring.append(n)
+        self.assertEqual(sorted(ring.samples()), [2, 3, 4])
+
+
+class LoggingTests(TestCase):
+    def format(self, msg, *args, **extra):
+        record = logging.makeLogRecord({
+            'name': 'chat.views', 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': msg, 'args': args, **extra,
+        })
+        return json.loads(log.JsonFormatter().format(record))
+
+    def test_json_with_redaction(self):
+        entry = self.format(
+            'Registration attempt: %s',
+            {'username': 'alice', 'password': 'hunter2', 'nested': [{'token': 'abc'}]},
+            user_id=7, authorization='Token abc',
+        )
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['user_id'], 7)
+        self.assertEqual(entry['authorization'], log.REDACTED)
+        self.assertIn("'username': 'alice'", entry['message'])
+        self.assertNotIn('hunter2', entry['message'])
+        self.assertNotIn('abc', entry['message'])
+
+    def test_filtered_records_are_never_formatted(self):
+        class Exploding:
+            def __str__(self):
+                raise AssertionError('formatted a filtered record')
+
+        logger = logging.getLogger('chat.views')
+        self.assertFalse(logger.isEnabledFor(logging.DEBUG))
+        logger.debug('Request data: %s', Exploding())
+
+    def test_handler_does_not_format_on_caller_thread(self):
+        handler = log.BackgroundQueueHandler()
+        self.addCleanup(handler.close)
+        record = logging.makeLogRecord({'msg': 'Hello %s', 'args': ({'password': 'x'},)})
+        prepared = handler.prepare(record)
+        self.assertEqual(prepared.msg, 'Hello %s')
+        self.assertEqual(prepared.args, record.args)
+
+
+class MediaServingTests(TestCase):
+    HASHED = 'profile_pictures/card/0123456789abcdef0123.jpg'
+    UPLOAD = 'profile_pictures/photo.jpg'
+    BODY = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for name in (self.HASHED, self.UPLOAD):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.BODY)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', headers=headers)
+
+    def test_serves_file_with_validators(self):
+        response = self.get(self.HASHED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.BODY)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.BODY)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_cache_control_depends_on_content_hashed_name(self):
+        self.assertEqual(self.get(self.HASHED)['Cache-Control'], media.IMMUTABLE)
+        self.assertEqual(self.get(self.UPLOAD)['Cache-Control'], media.REVALIDATE)
+
+    def test_conditional_requests(self):
+        first = self.get(self.UPLOAD)
+        response = self.get(self.UPLOAD, if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        response = self.get(self.UPLOAD, if_modified_since=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get(self.UPLOAD, if_none_match='"other"').status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.get(self.UPLOAD, range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.BODY[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.BODY)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.get(self.UPLOAD, range='bytes=1000-')
+        self.assertEqual(b''.join(response.streaming_content), self.BODY[1000:])
+        response = self.get(self.UPLOAD, range='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.BODY[-4:])
+
+        response = self.get(self.UPLOAD, range=f'bytes={len(self.BODY)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.BODY)}')
+        # Multiple ranges, or an If-Range that no longer matches, get the whole file
+        self.assertEqual(self.get(self.UPLOAD, range='bytes=0-1,5-6').status_code, 200)
+        self.assertEqual(self.get(self.UPLOAD, range='bytes=0-1', if_range='"stale"').status_code, 200)
+
+    def test_sendfile_offload(self):
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.get(self.HASHED)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.HASHED}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE)
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.get(self.HASHED)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.HASHED))
+
+    def test_rejects_missing_files_and_traversal(self):
+        self.assertEqual(self.get('profile_pictures/missing.jpg').status_code, 404)
+        self.assertEqual(self.get('profile_pictures').status_code, 404)
+        with self.assertLogs('django.security.SuspiciousFileOperation', 'ERROR'):
+            self.assertEqual(self.get('../settings.py').status_code, 400)
+        self.assertEqual(self.client.post(f'/media/{self.UPLOAD}').status_code, 405)
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.shortcuts import redirect
 from django.conf import settings
 from django.conf.urls.static import static
+from . import media
+from .profiling import stats_view
 
 def redirect_to_admin(request):
     return redirect('admin:index')
@@ -28,7 +30,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('profiles.urls')),
     path('api/chat/', include('chat.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/profiling/', stats_view, name='profiling-stats'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media.serve, name='media'),
+]
 
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
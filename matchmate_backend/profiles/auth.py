@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.response import Response
@@ -7,13 +9,15 @@ from rest_framework.permissions import AllowAny
 from django.contrib.auth import authenticate
 from .serializers import UserRegistrationSerializer
 
+logger = logging.getLogger(__name__)
+
 class CustomAuthToken(ObtainAuthToken):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        print("Login attempt with:", request.data)  # Debug print
         username = request.data.get('username')
         password = request.data.get('password')
+        logger.debug('Login attempt for %s', username)
         
         if not username or not password:
             return Response({
@@ -32,6 +36,7 @@ class CustomAuthToken(ObtainAuthToken):
                 'last_name': user.last_name
             })
         else:
+            logger.info('Failed login for %s', username)
             return Response({
                 'non_field_errors': ['Invalid credentials']
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -40,7 +45,7 @@ class RegisterView(APIView):
     permission_classes = [AllowAny]  # Allow anyone to register
     
     def post(self, request):
-        print("Received registration data:", request.data)  # Debug print
+        logger.debug('Registration attempt: %s', request.data)
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
@@ -51,5 +56,5 @@ class RegisterView(APIView):
                 'email': user.email,
                 'message': 'User registered successfully'
             }, status=status.HTTP_201_CREATED)
-        print("Validation errors:", serializer.errors)  # Debug print
+        logger.info('Registration validation errors: %s', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Offline geocoding and geohash radius search.
+
+Locations are geocoded from the gazetteer bundled in ``data/gazetteer.csv``
+without any network calls, and store the geohash of their coordinates. A
+geohash interleaves longitude and latitude bits and spells them in base 32,
+so every prefix is a grid cell and the places inside a cell share it: a
+prefix lookup is a range scan on an ordinary index, with no spatial
+extension needed.
+
+``within`` answers "within ``radius_km`` of a point" in two steps. ``cells``
+picks the finest grid whose cells cover the circle's bounding box in a few
+cells, and only rows in those cells are read; the exact haversine distance
+then drops the corners of the box.
+"""
+import csv
+import functools
+import math
+from pathlib import Path
+
+from django.db.models import Q
+
+from .lookups import normalize
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Stored precision, about 5 m
+PRECISION = 9
+# Covering a circle takes at most this many cells before a coarser grid is used
+MAX_CELLS = 9
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+@functools.lru_cache(maxsize=1)
+def gazetteer():
+    """``{normalized name: (latitude, longitude)}`` of every bundled place."""
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+        return {
+            normalize(row['name']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+def geocode(name):
+    """
+    Coordinates of the place ``name``, or None if the gazetteer does not
+    know it. ``'Damak, Jhapa'`` falls back to ``'Damak'``.
+    """
+    places = gazetteer()
+    point = places.get(normalize(name))
+    if point is None and ',' in name:
+        point = places.get(normalize(name.split(',', 1)[0]))
+    return point
+
+
+def _cell_size(precision):
+    """(height, width) in degrees of a cell of ``precision`` characters."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** (bits - bits // 2)
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """The geohash of a point."""
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bit = 0
+    even = True
+    while len(chars) < precision:
+        # Even bits halve longitude, odd bits latitude
+        if even:
+            middle = (west + east) / 2
+            if longitude >= middle:
+                value = value << 1 | 1
+                west = middle
+            else:
+                value <<= 1
+                east = middle
+        else:
+            middle = (south + north) / 2
+            if latitude >= middle:
+                value = value << 1 | 1
+                south = middle
+            else:
+                value <<= 1
+                north = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            value = bit = 0
+    return ''.join(chars)
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _rows(south, north, height):
+    """Indices of the cell rows ``south..north`` touches; rows do not wrap."""
+    count = round(180 / height)
+    first = min(math.floor((south + 90) / height), count - 1)
+    last = min(math.floor((north + 90) / height), count - 1)
+    return range(first, last + 1)
+
+
+def _columns(west, east, width):
+    """Indices of the cell columns ``west..east`` touches, wrapping at 180 degrees."""
+    count = round(360 / width)
+    first = math.floor((west + 180) / width)
+    last = math.floor((east + 180) / width)
+    if last - first + 1 >= count:
+        return range(count)
+    return [index % count for index in range(first, last + 1)]
+
+
+def cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes of the cells covering every point within ``radius_km``
+    of a point: the finest grid that needs at most ``MAX_CELLS`` of them, or
+    the single-character grid for radii that large.
+    """
+    d_latitude = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(latitude - d_latitude, -90.0), min(latitude + d_latitude, 90.0)
+    # A circle is widest in longitude at its latitude furthest from the
+    # equator; past a pole it spans every longitude
+    widest = math.radians(max(abs(south), abs(north)))
+    if d_latitude + abs(latitude) >= 90 or radius_km >= math.pi * EARTH_RADIUS_KM * math.cos(widest):
+        west, east = -180.0, 180.0
+    else:
+        d_longitude = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(widest)))
+        west, east = longitude - d_longitude, longitude + d_longitude
+
+    covering = None
+    for precision in range(1, PRECISION + 1):
+        height, width = _cell_size(precision)
+        rows, columns = _rows(south, north, height), _columns(west, east, width)
+        if covering is not None and len(rows) * len(columns) > MAX_CELLS:
+            break
+        covering = sorted({
+            encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+            for row in rows for column in columns
+        })
+    return covering
+
+
+def within(queryset, latitude, longitude, radius_km):
+    """
+    Ids of the rows of ``queryset`` (with ``geohash``, ``latitude`` and
+    ``longitude`` fields) within ``radius_km`` of a point.
+    """
+    # '{' sorts right after 'z', so each prefix is one index range
+    in_cells = Q()
+    for prefix in cells(latitude, longitude, radius_km):
+        in_cells |= Q(geohash__gte=prefix, geohash__lt=prefix + '{')
+    return [
+        pk
+        for pk, row_latitude, row_longitude in queryset.filter(in_cells).values_list('pk', 'latitude', 'longitude')
+        if haversine_km(latitude, longitude, row_latitude, row_longitude) <= radius_km
+    ]
@@ -0,0 +1,126 @@
+"""
+Expressing, accepting and listing interests.
+
+Two users have mutual interest when each has expressed interest in the
+other. That is decided once, when the second interest is inserted: the
+reverse row is a single probe of the ``(sender, receiver)`` unique index,
+and both rows get ``mutual_at`` stamped. Listings then just read an index.
+
+Listings are ordered newest first and paged by keyset: ``?cursor=<id>``
+continues after the interest with that id, and the response's ``next`` is
+the cursor of the following page (null on the last one). The cursor's
+interest must be in the listing: the page query fetches it too, and an
+unknown or foreign id is an invalid cursor rather than an empty page.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import response_cache
+from .matching import DEFAULT_PAGE_SIZE, InvalidCursor
+from .models import Interest
+
+
+def _lock_pair(first, second):
+    # Serializes the two directions of a pair, so concurrent interests in
+    # each other cannot both miss the reverse row. SQLite transactions
+    # already take the write lock up front and ignore FOR UPDATE.
+    list(User.objects.select_for_update().filter(pk=min(first, second)).values_list('pk'))
+
+
+def express(sender_id, receiver_id):
+    """
+    Record ``sender_id``'s interest in ``receiver_id``, marking both rows
+    mutual if the receiver already expressed interest in the sender.
+    Returns ``(interest, created)``.
+    """
+    existing = Interest.objects.filter(sender_id=sender_id, receiver_id=receiver_id).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            _lock_pair(sender_id, receiver_id)
+            now = timezone.now()
+            mutual = Interest.objects.filter(sender_id=receiver_id, receiver_id=sender_id).update(mutual_at=now)
+            interest = Interest.objects.create(
+                sender_id=sender_id, receiver_id=receiver_id, mutual_at=now if mutual else None,
+            )
+    except IntegrityError:
+        return Interest.objects.get(sender_id=sender_id, receiver_id=receiver_id), False
+    return interest, True
+
+
+def accept(receiver_id, sender_id):
+    """
+    Accept ``sender_id``'s interest in ``receiver_id``: mark it accepted and
+    express the receiver's interest in return, which makes the pair mutual.
+    Raises ``Interest.DoesNotExist`` if there is no such interest.
+    """
+    with transaction.atomic():
+        if not Interest.objects.filter(sender_id=sender_id, receiver_id=receiver_id).update(is_accepted=True):
+            raise Interest.DoesNotExist
+        express(receiver_id, sender_id)
+        transaction.on_commit(lambda: response_cache.invalidate_users([sender_id, receiver_id]))
+    return Interest.objects.select_related('sender__profile').get(sender_id=sender_id, receiver_id=receiver_id)
+
+
+def mark_mutual(interests=None):
+    """
+    Stamp ``mutual_at`` on every interest in ``interests`` (default: all)
+    whose reverse exists, for rows inserted in bulk. Returns the number of
+    rows updated.
+    """
+    interests = Interest.objects.all() if interests is None else interests
+    reverse = Interest.objects.filter(sender=OuterRef('receiver'), receiver=OuterRef('sender'))
+    return (
+        interests
+        .filter(Exists(reverse), mutual_at__isnull=True)
+        .update(mutual_at=Greatest('created_at', Subquery(reverse.values('created_at')[:1])))
+    )
+
+
+def sent(user):
+    return Interest.objects.filter(sender=user).select_related('receiver__profile').order_by('-created_at', '-id')
+
+
+def received(user):
+    return Interest.objects.filter(receiver=user).select_related('sender__profile').order_by('-created_at', '-id')
+
+
+def mutual(user):
+    return (
+        Interest.objects
+        .filter(sender=user, mutual_at__isnull=False)
+        .select_related('receiver__profile')
+        .order_by('-mutual_at', '-id')
+    )
+
+
+def paginate(interests, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return ``(rows, next_cursor)`` for one page of a listing ordered by
+    ``(-<timestamp>, -id)``. Only ``limit + 1`` rows are fetched, plus the
+    cursor's own row. Raises ``InvalidCursor`` if it is not in the listing.
+    """
+    field = interests.query.order_by[0].lstrip('-')
+    if cursor:
+        try:
+            pk = int(cursor)
+        except ValueError:
+            raise InvalidCursor(cursor)
+        # The anchor sorts first
+        anchor = Subquery(interests.filter(pk=pk).values(field)[:1])
+        interests = interests.filter(Q(**{f'{field}__lt': anchor}) | Q(**{field: anchor, 'id__lte': pk}))
+        rows = list(interests[:limit + 2])
+        if not rows or rows[0].pk != pk:
+            raise InvalidCursor(cursor)
+        rows = rows[1:]
+    else:
+        rows = list(interests[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].pk)
+    return rows, next_cursor
@@ -0,0 +1,85 @@
+"""
+Canonical religions and locations.
+
+Profiles store religions and locations as ids into the ``Religion`` and
+``Location`` tables, so matching compares small integers and spelling
+variants of the same place or faith match each other. Free text from the
+API goes through ``canonical``: whitespace is collapsed and known variants
+(``ALIASES``) are replaced by the canonical name. Entries are looked up by
+their ``key``, the canonical name normalized for case, accents and
+punctuation, and created on first use.
+"""
+import re
+import unicodedata
+
+# Normalized variant -> canonical name, by model name
+ALIASES = {
+    'religion': {
+        'hinduism': 'Hindu',
+        'islam': 'Muslim',
+        'islamic': 'Muslim',
+        'christianity': 'Christian',
+        'catholic': 'Christian',
+        'sikhism': 'Sikh',
+        'buddhism': 'Buddhist',
+        'jainism': 'Jain',
+        'zoroastrian': 'Parsi',
+        'zoroastrianism': 'Parsi',
+        'judaism': 'Jewish',
+    },
+    'location': {
+        'bombay': 'Mumbai',
+        'new delhi': 'Delhi',
+        'bangalore': 'Bengaluru',
+        'calcutta': 'Kolkata',
+        'madras': 'Chennai',
+        'poona': 'Pune',
+        'cochin': 'Kochi',
+        'gurgaon': 'Gurugram',
+        'baroda': 'Vadodara',
+        'trivandrum': 'Thiruvananthapuram',
+        'mysore': 'Mysuru',
+    },
+}
+
+
+def normalize(text):
+    """Case-, accent-, punctuation- and whitespace-insensitive form of ``text``."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def canonical(model, text):
+    """The canonical spelling of ``text`` as a ``model`` name."""
+    text = ' '.join(text.split())
+    return ALIASES[model._meta.model_name].get(normalize(text), text)
+
+
+def resolve(model, text, create=False):
+    """
+    The ``model`` entry ``text`` refers to, or None if there is none.
+    ``create`` adds a new canonical entry instead. Works with historical
+    models in migrations too.
+    """
+    name = canonical(model, text)
+    key = normalize(name)
+    if create:
+        return model.objects.get_or_create(key=key, defaults={'name': name})[0]
+    return model.objects.filter(key=key).first()
+
+
+def build(model, text):
+    """
+    The ``model`` entry ``text`` refers to, or an unsaved new one for
+    ``stored`` to save later, e.g. once the request it came in is valid.
+    """
+    name = canonical(model, text)
+    return resolve(model, name) or model(name=name, key=normalize(name))
+
+
+def stored(entry):
+    """``entry``, or if it was never saved, the stored entry with its key."""
+    if entry.pk is not None:
+        return entry
+    return type(entry).objects.get_or_create(key=entry.key, defaults={'name': entry.name})[0]
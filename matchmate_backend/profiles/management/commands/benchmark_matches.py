@@ -0,0 +1,110 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from matchmate_backend.benchmarking import throwaway_database
+from matchmate_backend.profiling import percentile
+from profiles import match_index, response_cache
+from profiles.models import Profile
+from profiles.synthetic import seed_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure potential_matches latency as the number of profiles grows. '
+        'Every request misses the response cache unless --cache is given; '
+        'hits and misses are reported separately. Runs against a throwaway '
+        'test database, never the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+            help='Profile counts to measure at, in increasing order.',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests per size.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cache', action='store_true',
+            help="Let repeated requests hit the response cache instead of invalidating the viewer's entries first.",
+        )
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        with throwaway_database():
+            results = self.run(sizes, options['requests'], options['seed'], options['cache'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'profiles':>10} {'cache':>6} {'reqs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for row in results:
+            for outcome in ('miss', 'hit'):
+                if row[outcome] is None:
+                    continue
+                timing = row[outcome]
+                self.stdout.write(
+                    f"{row['profiles']:>10} {outcome:>6} {timing['requests']:>6} {timing['p50_ms']:>8.2f} "
+                    f"{timing['p95_ms']:>8.2f} {timing['p99_ms']:>8.2f} {timing['queries']:>8}"
+                )
+        # Hits only measure the cache, so growth is judged on misses
+        if len(results) > 1 and results[0]['miss'] and results[-1]['miss']:
+            ratio = results[-1]['miss']['p95_ms'] / results[0]['miss']['p95_ms']
+            self.stdout.write(f'Cache miss p95 growth from smallest to largest size: {ratio:.2f}x')
+
+    def run(self, sizes, requests, seed, cache=False):
+        rng = random.Random(seed)
+        client = APIClient()
+        results = []
+        total = 0
+        for size in sizes:
+            self.stderr.write(f'Seeding up to {size} profiles...')
+            total += seed_profiles(size - total, seed=seed, prefix='bench', start=total)
+
+            viewers = list(Profile.objects.select_related('user').order_by('?')[:50])
+            # bulk_create skips the signals that maintain the match index, so
+            # build the lists of the profiles we are about to browse as
+            match_index.rebuild(profile_ids=[viewer.pk for viewer in viewers])
+            response_cache.clear()
+            samples = {'miss': [], 'hit': []}
+            for _ in range(requests):
+                viewer = rng.choice(viewers)
+                client.force_authenticate(viewer.user)
+                if not cache:
+                    # Otherwise nearly every repeat is served from the cache
+                    response_cache.invalidate_users([viewer.user_id])
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get('/api/profiles/potential_matches/')
+                    elapsed = (time.perf_counter() - started) * 1000
+                assert response.status_code == 200, response.content
+                samples[response['X-Cache'].lower()].append((elapsed, len(captured)))
+
+            results.append({
+                'profiles': size,
+                'requests': requests,
+                **{outcome: self.summarize(rows) for outcome, rows in samples.items()},
+            })
+        return results
+
+    @staticmethod
+    def summarize(rows):
+        if not rows:
+            return None
+        latencies = [latency for latency, _ in rows]
+        return {
+            'requests': len(rows),
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries': max(queries for _, queries in rows),
+        }
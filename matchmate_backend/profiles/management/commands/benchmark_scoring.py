@@ -0,0 +1,106 @@
+import heapq
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matchmate_backend.benchmarking import git_revision
+from profiles import scoring
+from profiles.match_index import INDEX_SIZE
+from profiles.synthetic import LOCATIONS, RELIGIONS, build_profile
+
+BATCH_SIZE = 50_000
+
+
+def synthetic_batches(size, seed):
+    """Unsaved profiles with ids 1..size, ``BATCH_SIZE`` at a time."""
+    # Stand-in lookup ids; nothing is saved
+    ids = {
+        'religion': {name: n + 1 for n, name in enumerate(RELIGIONS)},
+        'location': {name: n + 1 for n, name in enumerate(LOCATIONS)},
+    }
+    for start in range(0, size, BATCH_SIZE):
+        rng = random.Random(f'{seed}:{start}')
+        batch = []
+        for n in range(start, min(start + BATCH_SIZE, size)):
+            profile = build_profile(rng, None, ids)
+            profile.pk = n + 1
+            batch.append(profile)
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark ranking candidates for a viewer with per-object Python '
+        'scoring against vectorized NumPy scoring, on in-memory synthetic '
+        'profiles. Both paths must agree on the top-K.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000], help='Candidate counts.')
+        parser.add_argument('--viewers', type=int, default=10, help='Viewers ranked at each size.')
+        parser.add_argument('--k', type=int, default=INDEX_SIZE, help='Candidates kept per viewer.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {
+            'revision': git_revision(),
+            'k': options['k'],
+            'runs': [self.run(size, options) for size in options['sizes']],
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"top-{results['k']}, times are per viewer")
+        self.stdout.write(f"{'candidates':>10} {'load s':>8} {'python ms':>10} {'numpy ms':>9} {'speedup':>8}")
+        for run in results['runs']:
+            self.stdout.write(
+                f"{run['candidates']:>10} {run['load_s']:>8.2f} {run['python_ms']:>10.1f} "
+                f"{run['numpy_ms']:>9.2f} {run['speedup']:>7.0f}x"
+            )
+
+    def run(self, size, options):
+        k = options['k']
+        self.stderr.write(f'{size} candidates...')
+        arrays = scoring.ProfileArrays(size)
+        viewers = None
+        best = None
+        python_s = load_s = 0.0
+        position = 0
+        # Profiles are generated a batch at a time, so a million of them never
+        # sit in memory at once. Each batch is scored per object for every
+        # viewer, keeping a running top-K, and copied into the arrays.
+        for batch in synthetic_batches(size, options['seed']):
+            if viewers is None:
+                viewers = batch[:options['viewers']]
+                best = [[] for _ in viewers]
+            for n, viewer in enumerate(viewers):
+                started = time.perf_counter()
+                ids, scores = scoring.rank_profiles(viewer, batch, k)
+                best[n] = heapq.nsmallest(k, best[n] + [(-total, pk) for pk, total in zip(ids, scores)])
+                python_s += time.perf_counter() - started
+            started = time.perf_counter()
+            position = arrays.fill(position, [tuple(getattr(p, name) for name in scoring.COLUMNS) for p in batch])
+            load_s += time.perf_counter() - started
+
+        numpy_s = 0.0
+        for n, viewer in enumerate(viewers):
+            started = time.perf_counter()
+            ranked = scoring.rank(viewer, arrays, k)
+            numpy_s += time.perf_counter() - started
+            expected = ([pk for _, pk in best[n]], [-total for total, _ in best[n]])
+            if ranked != expected:
+                raise CommandError(f'NumPy and per-object rankings differ for viewer {viewer.pk}')
+
+        python_ms = python_s * 1000 / len(viewers)
+        numpy_ms = numpy_s * 1000 / len(viewers)
+        return {
+            'candidates': size,
+            'viewers': len(viewers),
+            'load_s': load_s,
+            'python_ms': python_ms,
+            'numpy_ms': numpy_ms,
+            'speedup': python_ms / numpy_ms,
+        }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from profiles import pictures
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the resized, metadata-free variants for every profile picture '
+        'that has none yet, such as uploads made before variants existed.'
+    )
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        processed = failed = 0
+        for profile_id in profiles.values_list('pk', flat=True).iterator():
+            try:
+                if pictures.process(profile_id) is not None:
+                    processed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Profile {profile_id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} pictures ({failed} failed)'))
@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from profiles import match_index, response_cache, scoring, snapshot
+
+
+def _rank_task(start, stop):
+    # Every worker maps the same snapshot file instead of loading its own
+    # copy, and reads viewers from it too, so workers never touch the database
+    candidates = snapshot.current()
+    lists = []
+    for position in range(start, stop):
+        viewer = candidates.profile(position)
+        lists.append((viewer.pk, *scoring.rank(viewer, candidates, match_index.INDEX_SIZE)))
+    return lists
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed mutual match index for every active profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Profiles recomputed per transaction.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help=(
+                'Processes ranking candidates. More than one exports a profile '
+                'snapshot they all map; this process writes their lists.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        def progress(done):
+            self.stdout.write(f'{done} profiles indexed')
+
+        if options['workers'] > 1:
+            total = self.rebuild_in_parallel(options['workers'], options['chunk_size'], progress)
+        else:
+            total = match_index.rebuild(chunk_size=options['chunk_size'], progress=progress)
+        # Cached match lists may predate the rebuild
+        response_cache.clear()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt match index for {total} profiles'))
+
+    def rebuild_in_parallel(self, workers, chunk_size, progress):
+        size = snapshot.export()
+        self.stdout.write(f'Exported {size} profiles to the snapshot')
+        match_index.drop_inactive()
+        total = 0
+        # Forked workers must open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(workers) as pool:
+            tasks = [pool.submit(_rank_task, start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+            for future in as_completed(tasks):
+                lists = future.result()
+                match_index.replace_lists(lists)
+                total += len(lists)
+                progress(total)
+        return total
@@ -0,0 +1,135 @@
+"""
+Maintenance of the precomputed ``MutualMatch`` index.
+
+Every active profile keeps up to ``INDEX_SIZE`` rows pointing at its best
+reciprocal candidates, so listing matches is a single range scan over
+``(profile, -score, candidate)`` instead of re-scoring the whole table.
+
+A profile's own list is recomputed whenever it changes. Its entries in other
+profiles' lists are updated in the same pass: it is removed everywhere, then
+added back to each candidate whose list is not full yet or whose weakest entry
+it beats. Lists can therefore grow slightly past ``INDEX_SIZE`` between full
+rebuilds, which trim them back.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from . import scoring
+from .matching import rank_candidates
+from .models import MutualMatch, Profile
+
+INDEX_SIZE = 500
+
+
+def _ranked(profile):
+    return rank_candidates(profile, Profile.objects.all()).values_list('id', 'match_score')
+
+
+def _lists_with_room(profile):
+    """
+    Reciprocal candidates of ``profile`` whose own list should gain it: the
+    list is not full yet, or ``profile`` scores at least as well as its
+    weakest entry.
+    """
+    lists = MutualMatch.objects.filter(profile=OuterRef('pk')).order_by().values('profile')
+    return (
+        rank_candidates(profile, Profile.objects.all())
+        .annotate(
+            entries=Coalesce(Subquery(lists.annotate(n=Count('id')).values('n')), 0),
+            lowest=Subquery(lists.annotate(low=Min('score')).values('low')),
+        )
+        .filter(Q(entries__lt=INDEX_SIZE) | Q(lowest__lte=F('match_score')))
+        .values_list('id', 'match_score')
+    )
+
+
+def is_complete(profile):
+    """
+    Whether ``profile``'s list holds every reciprocal candidate it has: it
+    has been built (an empty list is taken as not built yet) and is not
+    full, so nothing was left out past its best ``INDEX_SIZE``.
+    """
+    entries = MutualMatch.objects.filter(profile=profile).count()
+    return 0 < entries < INDEX_SIZE
+
+
+def listed_by(profile):
+    """Ids of the profiles whose lists currently include ``profile``."""
+    return set(MutualMatch.objects.filter(candidate=profile).values_list('profile_id', flat=True))
+
+
+@transaction.atomic
+def refresh_profile(profile):
+    """
+    Recompute ``profile``'s list and its place in its candidates' lists.
+    Returns the ids of the profiles whose lists included ``profile`` before
+    or after the refresh.
+    """
+    affected = listed_by(profile)
+    MutualMatch.objects.filter(profile=profile).delete()
+    MutualMatch.objects.filter(candidate=profile).delete()
+    if not profile.is_active:
+        return affected
+
+    entries = [
+        MutualMatch(profile_id=candidate_id, candidate_id=profile.pk, score=score)
+        for candidate_id, score in _lists_with_room(profile)
+    ]
+    entries.extend(
+        MutualMatch(profile_id=profile.pk, candidate_id=candidate_id, score=score)
+        for candidate_id, score in _ranked(profile)[:INDEX_SIZE]
+    )
+    MutualMatch.objects.bulk_create(entries, batch_size=1000)
+    affected.update(entry.profile_id for entry in entries if entry.candidate_id == profile.pk)
+    return affected
+
+
+def drop_inactive():
+    """Delete the lists of deactivated profiles, and entries pointing at them."""
+    MutualMatch.objects.filter(profile__is_active=False).delete()
+    MutualMatch.objects.filter(candidate__is_active=False).delete()
+
+
+def replace_lists(lists):
+    """
+    Replace whole lists in one transaction. ``lists`` holds
+    ``(profile_id, candidate_ids, scores)`` triples, as from ``scoring.rank``.
+    """
+    with transaction.atomic():
+        MutualMatch.objects.filter(profile_id__in=[profile_id for profile_id, _, _ in lists]).delete()
+        MutualMatch.objects.bulk_create([
+            MutualMatch(profile_id=profile_id, candidate_id=candidate_id, score=score)
+            for profile_id, candidate_ids, scores in lists
+            for candidate_id, score in zip(candidate_ids, scores)
+        ], batch_size=1000)
+
+
+def rebuild(chunk_size=1000, profile_ids=None, progress=None, candidates=None):
+    """
+    Recompute the lists of every active profile (or only ``profile_ids``),
+    ``chunk_size`` profiles per transaction. Candidates are scored with
+    NumPy from ``candidates`` (e.g. a ``snapshot.Snapshot``), or from arrays
+    loaded once up front, rather than with one SQL ranking query per
+    profile. Returns the number of profiles processed.
+    """
+    if profile_ids is None:
+        drop_inactive()
+        profiles = Profile.objects.filter(is_active=True)
+    else:
+        profiles = Profile.objects.filter(pk__in=profile_ids, is_active=True)
+    if candidates is None:
+        candidates = scoring.ProfileArrays.load(Profile.objects.filter(is_active=True))
+
+    processed = 0
+    last_pk = 0
+    while True:
+        chunk = list(profiles.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            break
+        replace_lists([(profile.pk, *scoring.rank(profile, candidates, INDEX_SIZE)) for profile in chunk])
+        processed += len(chunk)
+        last_pk = chunk[-1].pk
+        if progress:
+            progress(processed)
+    return processed
@@ -0,0 +1,160 @@
+import base64
+import binascii
+
+from django.db.models import Case, ExpressionWrapper, IntegerField, Q, Value, When
+
+# Points awarded for every partner preference that is satisfied. Each
+# preference is checked in both directions (the candidate fits the viewer's
+# preferences, and the viewer fits the candidate's), so a perfect match
+# scores twice the sum of these weights.
+MATCH_WEIGHTS = {
+    'height': 10,
+    'income': 10,
+    'religion': 25,
+    'marital_status': 20,
+    'education': 15,
+    'location': 20,
+}
+
+MAX_MATCH_SCORE = 2 * sum(MATCH_WEIGHTS.values())
+
+# Profile columns (attnames) that feed into filtering or scoring. Changing
+# any of them invalidates the profile's entries in the match index.
+MATCH_FIELDS = (
+    'age', 'height', 'religion_id', 'marital_status', 'education', 'income',
+    'location_id', 'is_active',
+    'preferred_age_min', 'preferred_age_max',
+    'preferred_height_min', 'preferred_height_max',
+    'preferred_religion_id', 'preferred_marital_status', 'preferred_education',
+    'preferred_location_id', 'preferred_income_min', 'preferred_income_max',
+)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def reciprocal_filter(profile):
+    """
+    Hard filters that both sides must pass: the candidate's age is inside the
+    viewer's preferred range and the viewer's age is inside the candidate's.
+    These map onto the partial index on age over active profiles.
+    """
+    return Q(
+        is_active=True,
+        age__gte=profile.preferred_age_min,
+        age__lte=profile.preferred_age_max,
+        preferred_age_min__lte=profile.age,
+        preferred_age_max__gte=profile.age,
+    )
+
+
+def _preference_checks(profile):
+    # (weight name, candidate fits viewer, viewer fits candidate)
+    return [
+        ('height',
+         Q(height__gte=profile.preferred_height_min, height__lte=profile.preferred_height_max),
+         Q(preferred_height_min__lte=profile.height, preferred_height_max__gte=profile.height)),
+        ('income',
+         Q(income__gte=profile.preferred_income_min, income__lte=profile.preferred_income_max),
+         Q(preferred_income_min__lte=profile.income, preferred_income_max__gte=profile.income)),
+        ('religion',
+         Q(religion_id=profile.preferred_religion_id),
+         Q(preferred_religion_id=profile.religion_id)),
+        ('marital_status',
+         Q(marital_status=profile.preferred_marital_status),
+         Q(preferred_marital_status=profile.marital_status)),
+        ('education',
+         Q(education=profile.preferred_education),
+         Q(preferred_education=profile.education)),
+        ('location',
+         Q(location_id=profile.preferred_location_id),
+         Q(preferred_location_id=profile.location_id)),
+    ]
+
+
+def score_expression(profile):
+    """SQL expression scoring a candidate row against ``profile`` both ways."""
+    score = Value(0)
+    for name, theirs, mine in _preference_checks(profile):
+        weight = MATCH_WEIGHTS[name]
+        score += Case(When(theirs, then=Value(weight)), default=Value(0))
+        score += Case(When(mine, then=Value(weight)), default=Value(0))
+    return score
+
+
+def rank_candidates(profile, queryset):
+    """
+    Restrict ``queryset`` to reciprocal candidates for ``profile`` and order
+    them by compatibility score, best first. Ties are broken by id so the
+    ordering is stable enough to paginate with a cursor.
+    """
+    return (
+        queryset
+        .filter(reciprocal_filter(profile))
+        .exclude(pk=profile.pk)
+        .annotate(match_score=ExpressionWrapper(
+            score_expression(profile), output_field=IntegerField()
+        ))
+        .order_by('-match_score', 'id')
+    )
+
+
+def unranked_candidates(queryset):
+    """Fallback ordering for viewers who have not filled in a profile yet."""
+    return (
+        queryset
+        .filter(is_active=True)
+        .annotate(match_score=Value(0, output_field=IntegerField()))
+        .order_by('-match_score', 'id')
+    )
+
+
+def encode_cursor(score, pk):
+    raw = f'{score}:{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, pk = base64.urlsafe_b64decode(padded).decode().split(':')
+        return int(score), int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidCursor(cursor)
+
+
+def after_cursor(queryset, cursor, score_field='match_score', id_field='id'):
+    """Keyset condition for rows that sort after ``cursor``."""
+    score, pk = decode_cursor(cursor)
+    return queryset.filter(
+        Q(**{f'{score_field}__lt': score}) | Q(**{score_field: score, f'{id_field}__gt': pk})
+    )
+
+
+def paginate(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, score_field='match_score', id_field='id'):
+    """
+    Return ``(rows, next_cursor)`` for one page of a ranked queryset ordered
+    by ``(-score_field, id_field)``. Only ``limit + 1`` rows are fetched; the
+    extra row tells us whether another page exists.
+    """
+    if cursor:
+        queryset = after_cursor(queryset, cursor, score_field, id_field)
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, score_field), getattr(last, id_field))
+    return rows, next_cursor
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
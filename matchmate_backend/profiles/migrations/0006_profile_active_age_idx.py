@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_contact'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_active', 'age'], name='profile_active_age_idx'),
+        ),
+    ]
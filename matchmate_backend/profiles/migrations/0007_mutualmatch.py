@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_profile_active_age_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MutualMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField()),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matched_by', to='profiles.profile')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_entries', to='profiles.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', '-score', 'candidate'], name='mutualmatch_ranking_idx')],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'candidate'), name='mutualmatch_unique_pair')],
+            },
+        ),
+    ]
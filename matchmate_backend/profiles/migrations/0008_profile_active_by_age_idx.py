@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0007_mutualmatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='profile',
+            name='profile_active_age_idx',
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['age'], name='profile_active_by_age_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Greatest
+
+
+def mark_mutual(apps, schema_editor):
+    # A pair became mutual when its second interest was expressed
+    Interest = apps.get_model('profiles', 'Interest')
+    reverse = Interest.objects.filter(sender=OuterRef('receiver'), receiver=OuterRef('sender'))
+    Interest.objects.filter(Exists(reverse)).update(
+        mutual_at=Greatest('created_at', Subquery(reverse.values('created_at')[:1])),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0009_profile_picture_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interest',
+            name='mutual_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_mutual, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='interest',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='interest_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interest',
+            index=models.Index(fields=['receiver', '-created_at', '-id'], name='interest_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interest',
+            index=models.Index(condition=models.Q(('mutual_at__isnull', False)), fields=['sender', '-mutual_at', '-id'], name='interest_mutual_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def reference(model):
+    return models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=f'profiles.{model}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0010_interest_listings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('key', models.CharField(max_length=200, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Religion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        # Filled in by 0012 from the free-text columns, then swapped in by 0013.
+        # The free-text columns become nullable so that migrating backwards can
+        # re-add them empty for 0012 to restore.
+        *(
+            migrations.AlterField(model_name='profile', name=field, field=models.CharField(max_length=max_length, null=True))
+            for field, max_length in [('religion', 100), ('location', 200), ('preferred_religion', 100), ('preferred_location', 200)]
+        ),
+        migrations.AddField(model_name='profile', name='religion_ref', field=reference('religion')),
+        migrations.AddField(model_name='profile', name='location_ref', field=reference('location')),
+        migrations.AddField(model_name='profile', name='preferred_religion_ref', field=reference('religion')),
+        migrations.AddField(model_name='profile', name='preferred_location_ref', field=reference('location')),
+    ]
@@ -0,0 +1,128 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copy of profiles.lookups.ALIASES as of this migration; later
+# changes to the live table must not change what this backfill wrote
+ALIASES = {
+    'religion': {
+        'hinduism': 'Hindu',
+        'islam': 'Muslim',
+        'islamic': 'Muslim',
+        'christianity': 'Christian',
+        'catholic': 'Christian',
+        'sikhism': 'Sikh',
+        'buddhism': 'Buddhist',
+        'jainism': 'Jain',
+        'zoroastrian': 'Parsi',
+        'zoroastrianism': 'Parsi',
+        'judaism': 'Jewish',
+    },
+    'location': {
+        'bombay': 'Mumbai',
+        'new delhi': 'Delhi',
+        'bangalore': 'Bengaluru',
+        'calcutta': 'Kolkata',
+        'madras': 'Chennai',
+        'poona': 'Pune',
+        'cochin': 'Kochi',
+        'gurgaon': 'Gurugram',
+        'baroda': 'Vadodara',
+        'trivandrum': 'Thiruvananthapuram',
+        'mysore': 'Mysuru',
+    },
+}
+
+# Free-text column -> lookup model
+FIELDS = {
+    'religion': 'Religion',
+    'location': 'Location',
+    'preferred_religion': 'Religion',
+    'preferred_location': 'Location',
+}
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def resolve(model, text):
+    text = ' '.join(text.split())
+    name = ALIASES[model._meta.model_name].get(normalize(text), text)
+    return model.objects.get_or_create(key=normalize(name), defaults={'name': name})[0]
+
+
+def backfill(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    models = {name: apps.get_model('profiles', name) for name in set(FIELDS.values())}
+    ids = {}
+
+    def lookup(model_name, text):
+        if (model_name, text) not in ids:
+            ids[model_name, text] = resolve(models[model_name], text).pk
+        return ids[model_name, text]
+
+    # One batch of profiles per UPDATE, walking the primary key
+    last_pk = 0
+    while True:
+        rows = list(
+            Profile.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', *FIELDS)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        Profile.objects.bulk_update(
+            [
+                Profile(pk=pk, **{
+                    f'{field}_ref_id': lookup(model_name, text)
+                    for (field, model_name), text in zip(FIELDS.items(), values)
+                })
+                for pk, *values in rows
+            ],
+            [f'{field}_ref' for field in FIELDS],
+        )
+        last_pk = rows[-1][0]
+
+
+def restore(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    models = {name: apps.get_model('profiles', name) for name in set(FIELDS.values())}
+    names = {
+        model_name: dict(model.objects.values_list('pk', 'name'))
+        for model_name, model in models.items()
+    }
+    last_pk = 0
+    while True:
+        rows = list(
+            Profile.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', *(f'{field}_ref' for field in FIELDS))[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        Profile.objects.bulk_update(
+            [
+                Profile(pk=pk, **{
+                    field: names[model_name][ref]
+                    for (field, model_name), ref in zip(FIELDS.items(), refs)
+                })
+                for pk, *refs in rows
+            ],
+            list(FIELDS),
+        )
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0011_religion_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, restore),
+    ]
@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+FIELDS = {
+    'religion': 'religion',
+    'location': 'location',
+    'preferred_religion': 'religion',
+    'preferred_location': 'location',
+}
+
+
+def swap(field, model):
+    return [
+        migrations.RemoveField(model_name='profile', name=field),
+        migrations.RenameField(model_name='profile', old_name=f'{field}_ref', new_name=field),
+        migrations.AlterField(
+            model_name='profile',
+            name=field,
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=f'profiles.{model}'),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0012_backfill_religion_location'),
+    ]
+
+    operations = [operation for field, model in FIELDS.items() for operation in swap(field, model)]
@@ -0,0 +1,160 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copies of profiles.geo and its gazetteer as of this migration
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+
+# Normalized name -> (latitude, longitude)
+GAZETTEER = {
+    'agra': (27.1767, 78.0081),
+    'ahmedabad': (23.0225, 72.5714),
+    'amritsar': (31.6340, 74.8723),
+    'aurangabad': (19.8762, 75.3433),
+    'bengaluru': (12.9716, 77.5946),
+    'bhaktapur': (27.6710, 85.4298),
+    'bhopal': (23.2599, 77.4126),
+    'bhubaneswar': (20.2961, 85.8245),
+    'biratnagar': (26.4525, 87.2718),
+    'birgunj': (27.0104, 84.8770),
+    'butwal': (27.7006, 83.4484),
+    'chandigarh': (30.7333, 76.7794),
+    'chennai': (13.0827, 80.2707),
+    'coimbatore': (11.0168, 76.9558),
+    'damak': (26.6588, 87.7032),
+    'darjeeling': (27.0410, 88.2663),
+    'dehradun': (30.3165, 78.0322),
+    'delhi': (28.6139, 77.2090),
+    'dharan': (26.8125, 87.2836),
+    'faridabad': (28.4089, 77.3178),
+    'ghaziabad': (28.6692, 77.4538),
+    'guwahati': (26.1445, 91.7362),
+    'gurugram': (28.4595, 77.0266),
+    'hyderabad': (17.3850, 78.4867),
+    'indore': (22.7196, 75.8577),
+    'jaipur': (26.9124, 75.7873),
+    'jalandhar': (31.3260, 75.5762),
+    'jammu': (32.7266, 74.8570),
+    'jodhpur': (26.2389, 73.0243),
+    'kanpur': (26.4499, 80.3319),
+    'kathmandu': (27.7172, 85.3240),
+    'kochi': (9.9312, 76.2673),
+    'kolkata': (22.5726, 88.3639),
+    'kozhikode': (11.2588, 75.7804),
+    'lalitpur': (27.6644, 85.3188),
+    'lucknow': (26.8467, 80.9462),
+    'ludhiana': (30.9010, 75.8573),
+    'madurai': (9.9252, 78.1198),
+    'mangaluru': (12.9141, 74.8560),
+    'mumbai': (19.0760, 72.8777),
+    'mysuru': (12.2958, 76.6394),
+    'nagpur': (21.1458, 79.0882),
+    'nashik': (19.9975, 73.7898),
+    'navi mumbai': (19.0330, 73.0297),
+    'noida': (28.5355, 77.3910),
+    'panaji': (15.4909, 73.8278),
+    'patna': (25.5941, 85.1376),
+    'pokhara': (28.2096, 83.9856),
+    'pune': (18.5204, 73.8567),
+    'raipur': (21.2514, 81.6296),
+    'rajkot': (22.3039, 70.8022),
+    'ranchi': (23.3441, 85.3096),
+    'shimla': (31.1048, 77.1734),
+    'siliguri': (26.7271, 88.3953),
+    'srinagar': (34.0837, 74.7973),
+    'surat': (21.1702, 72.8311),
+    'thane': (19.2183, 72.9781),
+    'thiruvananthapuram': (8.5241, 76.9366),
+    'udaipur': (24.5854, 73.7125),
+    'vadodara': (22.3072, 73.1812),
+    'varanasi': (25.3176, 82.9739),
+    'vijayawada': (16.5062, 80.6480),
+    'visakhapatnam': (17.6868, 83.2185),
+}
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def geocode(name):
+    point = GAZETTEER.get(normalize(name))
+    if point is None and ',' in name:
+        point = GAZETTEER.get(normalize(name.split(',', 1)[0]))
+    return point
+
+
+def encode(latitude, longitude):
+    south, north, west, east = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bit = 0
+    even = True
+    while len(chars) < PRECISION:
+        if even:
+            middle = (west + east) / 2
+            if longitude >= middle:
+                value = value << 1 | 1
+                west = middle
+            else:
+                value <<= 1
+                east = middle
+        else:
+            middle = (south + north) / 2
+            if latitude >= middle:
+                value = value << 1 | 1
+                south = middle
+            else:
+                value <<= 1
+                north = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            value = bit = 0
+    return ''.join(chars)
+
+
+def geocode_locations(apps, schema_editor):
+    # Historical models skip Location.save(), so geocode here
+    Location = apps.get_model('profiles', 'Location')
+    located = []
+    for location in Location.objects.filter(latitude__isnull=True):
+        point = geocode(location.name)
+        if point is not None:
+            location.latitude, location.longitude = point
+            location.geohash = encode(*point)
+            located.append(location)
+    Location.objects.bulk_update(located, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0013_profile_religion_location_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocode_locations, migrations.RunPython.noop),
+    ]
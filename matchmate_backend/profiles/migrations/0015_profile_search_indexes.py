@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0014_location_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['religion', 'age'], name='profile_active_religion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['location', 'age'], name='profile_active_location_idx'),
+        ),
+    ]
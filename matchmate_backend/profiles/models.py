@@ -1,18 +1,70 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from . import geo
+
 class Interest(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interests_sent')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interests_received')
     created_at = models.DateTimeField(auto_now_add=True)
     is_accepted = models.BooleanField(default=False)
+    # Set on both directions of a pair once each has expressed interest in
+    # the other; see profiles.interests
+    mutual_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('sender', 'receiver')
+        indexes = [
+            # Sent and received listings, newest first
+            models.Index(fields=['sender', '-created_at', '-id'], name='interest_sent_idx'),
+            models.Index(fields=['receiver', '-created_at', '-id'], name='interest_received_idx'),
+            models.Index(
+                fields=['sender', '-mutual_at', '-id'], name='interest_mutual_idx',
+                condition=models.Q(mutual_at__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} -> {self.receiver.username}"
 
+class Religion(models.Model):
+    """
+    Canonical religion. Profiles refer to it by id, so spelling variants of
+    the same religion match; see ``profiles.lookups``.
+    """
+    name = models.CharField(max_length=100)
+    # Normalized name, what free text is looked up by
+    key = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class Location(models.Model):
+    """
+    Canonical location; see ``Religion``. Geocoded from the bundled
+    gazetteer when saved, if it knows the place; see ``profiles.geo``.
+    """
+    name = models.CharField(max_length=200)
+    key = models.CharField(max_length=200, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Of the coordinates, for radius search; empty if not geocoded
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        if self.latitude is None:
+            self.geocode()
+        super().save(*args, **kwargs)
+
+    def geocode(self):
+        point = geo.geocode(self.name)
+        if point is not None:
+            self.latitude, self.longitude = point
+            self.geohash = geo.encode(*point)
+
+    def __str__(self):
+        return self.name
+
 class Profile(models.Model):
     GENDER_CHOICES = [
         ('M', 'Male'),
@@ -39,16 +91,18 @@ class Profile(models.Model):
     
     # Profile Picture
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
+    # Resized, metadata-free copies of the picture; see profiles.pictures
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # Personal Information
     age = models.IntegerField()
     height = models.DecimalField(max_digits=5, decimal_places=2)  # in cm
-    religion = models.CharField(max_length=100)
+    religion = models.ForeignKey(Religion, on_delete=models.PROTECT, related_name='+')
     marital_status = models.CharField(max_length=20, choices=MARITAL_STATUS_CHOICES)
     education = models.CharField(max_length=20, choices=EDUCATION_CHOICES)
     occupation = models.CharField(max_length=100)
     income = models.DecimalField(max_digits=12, decimal_places=2)  # annual income
-    location = models.CharField(max_length=200)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='+')
     bio = models.TextField(blank=True)
     
     # Partner Preferences
@@ -56,10 +110,10 @@ class Profile(models.Model):
     preferred_age_max = models.IntegerField()
     preferred_height_min = models.DecimalField(max_digits=5, decimal_places=2)
     preferred_height_max = models.DecimalField(max_digits=5, decimal_places=2)
-    preferred_religion = models.CharField(max_length=100)
+    preferred_religion = models.ForeignKey(Religion, on_delete=models.PROTECT, related_name='+')
     preferred_marital_status = models.CharField(max_length=20, choices=MARITAL_STATUS_CHOICES)
     preferred_education = models.CharField(max_length=20, choices=EDUCATION_CHOICES)
-    preferred_location = models.CharField(max_length=200)
+    preferred_location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='+')
     preferred_income_min = models.DecimalField(max_digits=12, decimal_places=2)
     preferred_income_max = models.DecimalField(max_digits=12, decimal_places=2)
     
@@ -68,9 +122,54 @@ class Profile(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        indexes = [
+            # Backs the reciprocal age filter when ranking candidates. Partial,
+            # because SQLite cannot seek on a bare boolean term, and only
+            # active profiles are ever ranked
+            models.Index(fields=['age'], condition=models.Q(is_active=True), name='profile_active_by_age_idx'),
+            # Searches ranked live filter on religion or location (radius
+            # searches on a set of locations) along with the age range
+            models.Index(
+                fields=['religion', 'age'], condition=models.Q(is_active=True), name='profile_active_religion_idx',
+            ),
+            models.Index(
+                fields=['location', 'age'], condition=models.Q(is_active=True), name='profile_active_location_idx',
+            ),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signal handlers can tell whether a save
+        # actually changed anything the match index depends on
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class MutualMatch(models.Model):
+    """
+    One row per (profile, candidate) pair where the candidate is among the
+    profile's best reciprocal matches. Maintained by ``profiles.match_index``.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='match_entries')
+    candidate = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='matched_by')
+    score = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'candidate'], name='mutualmatch_unique_pair'),
+        ]
+        indexes = [
+            # Match listings read one profile's entries best first
+            models.Index(fields=['profile', '-score', 'candidate'], name='mutualmatch_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id} -> {self.candidate_id} ({self.score})"
+
 class Contact(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
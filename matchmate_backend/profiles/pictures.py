@@ -0,0 +1,171 @@
+"""
+Off-request processing of uploaded profile pictures.
+
+Saving a profile with a new picture schedules ``process`` on a small thread
+pool once the transaction commits. Processing re-encodes the upload without
+its metadata (EXIF, GPS, ICC profiles), renders every entry of ``VARIANTS``
+as JPEG and WebP, and stores each file under a name derived from its
+content, so the URLs can be cached forever. The result is recorded in
+``Profile.picture_variants``:
+
+    {'original': 'profile_pictures/full/3f2a....jpg',
+     'thumb': {'jpeg': '...', 'webp': '...'}, 'card': {...}, 'full': {...}}
+
+``original`` is the ``profile_picture`` the variants were made from; until
+it matches the current picture the serializers fall back to the upload.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import match_index, response_cache
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'profile_pictures'
+
+# name -> (width, height, crop). Cropped variants are exactly that size;
+# the others are only scaled down to fit
+VARIANTS = {
+    'thumb': (96, 96, True),      # chat and list avatars
+    'card': (400, 300, True),     # match grid cards
+    'full': (1080, 1080, False),  # profile page
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PROFILE_PICTURE_WORKERS, thread_name_prefix='profile-pictures',
+        )
+    return _executor
+
+
+def schedule(profile_id):
+    """
+    Process the profile's picture once the current transaction commits, on
+    the worker pool, or inline when ``PROFILE_PICTURE_WORKERS`` is 0.
+    """
+    if settings.PROFILE_PICTURE_WORKERS <= 0:
+        transaction.on_commit(lambda: process(profile_id))
+    else:
+        transaction.on_commit(lambda: _pool().submit(_run_in_worker, profile_id))
+
+
+def _run_in_worker(profile_id):
+    try:
+        process(profile_id)
+    except Exception:
+        logger.exception('Processing the picture of profile %s failed', profile_id)
+    finally:
+        # Worker threads hold their own connection; do not leak it
+        close_old_connections()
+
+
+def render(image, width, height, crop):
+    """``image`` resized for one variant, as an RGB image without metadata."""
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    # Saving without exif/icc_profile arguments writes no metadata at all
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def store(variant, fmt, data):
+    """Save ``data`` under a content-hashed name and return that name."""
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    name = f'{UPLOAD_DIR}/{variant}/{digest}.{FORMATS[fmt][1]}'
+    # Identical content gets the identical name, so an existing file is reused
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def build_variants(source):
+    """Render and store every variant of the image file ``source``."""
+    with Image.open(source) as image:
+        # Apply the EXIF orientation before the EXIF data is dropped
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        variants = {}
+        for variant, (width, height, crop) in VARIANTS.items():
+            rendered = render(image, width, height, crop)
+            variants[variant] = {fmt: store(variant, fmt, encode(rendered, fmt)) for fmt in FORMATS}
+    return variants
+
+
+def process(profile_id):
+    """
+    Build the variants for the profile's current picture and replace the
+    upload with its stripped full-size JPEG. Returns the variants, or None
+    when there was nothing (left) to do.
+    """
+    profile = Profile.objects.filter(pk=profile_id).only('profile_picture', 'picture_variants', 'user_id').first()
+    if profile is None or not profile.profile_picture:
+        return None
+    upload = profile.profile_picture.name
+    if profile.picture_variants.get('original') == upload:
+        return None
+
+    with default_storage.open(upload, 'rb') as source:
+        variants = build_variants(source)
+    original = variants['full']['jpeg']
+    variants['original'] = original
+
+    # Only apply the result if nobody uploaded another picture meanwhile.
+    # update() skips the post_save handler, so invalidate here
+    updated = Profile.objects.filter(pk=profile_id, profile_picture=upload).update(
+        profile_picture=original, picture_variants=variants, updated_at=timezone.now(),
+    )
+    if not updated:
+        return None
+    if upload != original:
+        # The upload still carries its metadata
+        default_storage.delete(upload)
+    listed_by = match_index.listed_by(profile)
+    response_cache.invalidate_users([
+        profile.user_id, *Profile.objects.filter(pk__in=listed_by).values_list('user_id', flat=True),
+    ])
+    return variants
+
+
+def variant_urls(profile, request=None):
+    """
+    URLs of the profile's picture variants, ``{'thumb': {'jpeg': url,
+    'webp': url}, ...}``, or None while the current picture is unprocessed.
+    """
+    variants = profile.picture_variants
+    if not profile.profile_picture or variants.get('original') != profile.profile_picture.name:
+        return None
+    urls = {}
+    for variant in VARIANTS:
+        urls[variant] = {}
+        for fmt, name in variants[variant].items():
+            url = default_storage.url(name)
+            urls[variant][fmt] = request.build_absolute_uri(url) if request is not None else url
+    return urls
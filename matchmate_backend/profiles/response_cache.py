@@ -0,0 +1,138 @@
+"""
+Per-user response cache for read-heavy ``ProfileViewSet`` actions.
+
+Entries live in the ``responses`` cache alias: a bounded LRU in local memory
+by default, or any shared Django cache backend (Redis when ``REDIS_URL`` is
+set). Keys combine the user, a per-user version, the action and the
+normalized query parameters. Invalidating a user replaces their version, so
+it works on any backend without scanning keys; superseded entries simply age
+out of the LRU or expire.
+"""
+import functools
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+
+ALIAS = 'responses'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def stats():
+    """Hit/miss/eviction counters for this process, plus the hit rate."""
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_rate'] = data['hits'] / lookups if lookups else None
+    return data
+
+
+def reset_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+class CountingLocMemCache(LocMemCache):
+    """
+    ``LocMemCache`` that reports evictions. Reads move entries to the back of
+    its LRU order; with ``CULL_FREQUENCY`` equal to ``MAX_ENTRIES`` a full
+    cache evicts exactly one least recently used entry per insert.
+    """
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        _count('evictions', before - len(self._cache))
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _version_key(user_id):
+    return f'responses:{user_id}:version'
+
+
+def _version(cache, user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Never reuse an old version if the version key itself was evicted
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def normalize_params(params):
+    """Sorted, non-empty query parameters as a canonical string."""
+    items = sorted(
+        (name, value)
+        for name in params
+        for value in params.getlist(name)
+        if value != ''
+    )
+    return urlencode(items)
+
+
+def cache_key(user_id, action, params):
+    cache = _cache()
+    return f'responses:{user_id}:{_version(cache, user_id)}:{action}:{normalize_params(params)}'
+
+
+def invalidate_users(user_ids):
+    """Drop every cached response of ``user_ids``."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    version = time.time_ns()
+    _cache().set_many({_version_key(user_id): version for user_id in user_ids}, timeout=None)
+    _count('invalidations', len(user_ids))
+
+
+def clear():
+    _cache().clear()
+
+
+def uncached(response):
+    """
+    Keep ``response`` out of the cache, e.g. because no invalidation would
+    cover what it shows. Returns ``response``.
+    """
+    response.uncached = True
+    return response
+
+
+def cached(action):
+    """
+    Cache successful responses of a viewset action per user and query
+    string, except those marked ``uncached``. Responses carry ``X-Cache:
+    HIT`` or ``MISS``.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            key = cache_key(request.user.id, action, request.query_params)
+            data = _cache().get(key)
+            if data is not None:
+                _count('hits')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+            _count('misses')
+            response = view(self, request, *args, **kwargs)
+            if response.status_code == 200 and not getattr(response, 'uncached', False):
+                _cache().set(key, response.data)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
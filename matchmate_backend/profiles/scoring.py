@@ -0,0 +1,254 @@
+"""
+Vectorized match scoring with NumPy.
+
+``matching.rank_candidates`` scores candidates in SQL, one query per viewer.
+Rebuilding the match index that way re-reads the whole profile table for
+every profile. Instead, ``ProfileArrays`` loads the scoring attributes of
+all candidates once into typed arrays:
+
+* ages as ``int32``, heights as ``float32`` and incomes as ``float64``
+  (their ``Decimal`` values fit exactly enough to compare);
+* categorical fields dictionary-encoded to ``int32`` codes, with a field and
+  its preference sharing one vocabulary so they compare as integers. Religion
+  and location are already ids into their lookup tables, and are encoded the
+  same way to keep the codes dense.
+
+``rank`` then scores a viewer against every candidate in one vectorized
+pass and picks the best ``k`` with ``argpartition``, in the same order as
+``rank_candidates``: score descending, then id. It takes the same search
+filters and keyset cursor as ``potential_matches``.
+
+``score_profile`` and ``rank_profiles`` are the per-object equivalents, used
+as the reference in tests and the ``benchmark_scoring`` command.
+"""
+import heapq
+from types import SimpleNamespace
+
+import numpy as np
+
+from .matching import MATCH_WEIGHTS
+
+# (field, preferred minimum, preferred maximum, dtype)
+RANGES = [
+    ('height', 'preferred_height_min', 'preferred_height_max', np.float32),
+    ('income', 'preferred_income_min', 'preferred_income_max', np.float64),
+]
+
+# (weight name, field, preferred value), by column name
+CATEGORIES = [
+    ('religion', 'religion_id', 'preferred_religion_id'),
+    ('marital_status', 'marital_status', 'preferred_marital_status'),
+    ('education', 'education', 'preferred_education'),
+    ('location', 'location_id', 'preferred_location_id'),
+]
+
+AGES = ('age', 'preferred_age_min', 'preferred_age_max')
+
+COLUMNS = (
+    'id', *AGES,
+    *(name for fields in RANGES for name in fields[:3]),
+    *(name for fields in CATEGORIES for name in fields[1:]),
+)
+
+
+class ProfileArrays:
+    """
+    Scoring attributes of ``size`` profiles, one array per field, in
+    ``COLUMNS`` order. ``vocabularies`` maps each categorical field to its
+    ``{value: code}`` dictionary.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.columns = {'id': np.empty(size, dtype=np.int64)}
+        for name in AGES:
+            self.columns[name] = np.empty(size, dtype=np.int32)
+        for *names, dtype in RANGES:
+            for name in names:
+                self.columns[name] = np.empty(size, dtype=dtype)
+        self.vocabularies = {}
+        for _, field, preferred in CATEGORIES:
+            self.vocabularies[field] = {}
+            self.columns[field] = np.empty(size, dtype=np.int32)
+            self.columns[preferred] = np.empty(size, dtype=np.int32)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def fill(self, start, rows):
+        """Store ``rows`` (tuples in ``COLUMNS`` order) from position ``start``."""
+        if not rows:
+            return start
+        stop = start + len(rows)
+        values = dict(zip(COLUMNS, zip(*rows)))
+        for name in ('id', *AGES, *(name for fields in RANGES for name in fields[:3])):
+            self.columns[name][start:stop] = values[name]
+        for _, field, preferred in CATEGORIES:
+            vocabulary = self.vocabularies[field]
+            for name in (field, preferred):
+                self.columns[name][start:stop] = [vocabulary.setdefault(value, len(vocabulary)) for value in values[name]]
+        return stop
+
+    def code(self, field, value):
+        """The code of ``value`` for a categorical field, or -1 if no profile has it."""
+        return self.vocabularies[field].get(value, -1)
+
+    @classmethod
+    def load(cls, queryset, chunk_size=10_000):
+        """Arrays for the profiles in ``queryset``, read ``chunk_size`` rows at a time."""
+        arrays = cls(queryset.count())
+        position = 0
+        chunk = []
+        for row in queryset.order_by('pk').values_list(*COLUMNS).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                position = arrays.fill(position, chunk)
+                chunk = []
+        position = arrays.fill(position, chunk)
+        # Rows inserted since the count are skipped; deleted ones shrink the arrays
+        arrays.truncate(position)
+        return arrays
+
+    @classmethod
+    def from_profiles(cls, profiles):
+        profiles = list(profiles)
+        arrays = cls(len(profiles))
+        arrays.fill(0, [tuple(getattr(profile, name) for name in COLUMNS) for profile in profiles])
+        return arrays
+
+    def profile(self, position):
+        """The profile at ``position``, decoded, with the attributes ``score`` reads."""
+        values = {name: self.columns[name][position].item() for name in COLUMNS}
+        for _, field, preferred in CATEGORIES:
+            vocabulary = list(self.vocabularies[field])
+            values[field] = vocabulary[values[field]]
+            values[preferred] = vocabulary[values[preferred]]
+        return SimpleNamespace(pk=values['id'], **values)
+
+    def truncate(self, size):
+        if size < self.size:
+            self.size = size
+            self.columns = {name: column[:size] for name, column in self.columns.items()}
+
+
+def score(viewer, arrays):
+    """
+    Return ``(mask, scores)`` for ``viewer`` against every profile in
+    ``arrays``: whether each passes the reciprocal age filter (and is not the
+    viewer), and its score, checking each preference in both directions.
+    """
+    mask = (
+        (arrays['age'] >= viewer.preferred_age_min)
+        & (arrays['age'] <= viewer.preferred_age_max)
+        & (arrays['preferred_age_min'] <= viewer.age)
+        & (arrays['preferred_age_max'] >= viewer.age)
+        & (arrays['id'] != viewer.pk)
+    )
+    scores = np.zeros(arrays.size, dtype=np.int16)
+    for field, low, high, dtype in RANGES:
+        weight = MATCH_WEIGHTS[field]
+        theirs = (arrays[field] >= dtype(getattr(viewer, low))) & (arrays[field] <= dtype(getattr(viewer, high)))
+        value = dtype(getattr(viewer, field))
+        mine = (arrays[low] <= value) & (arrays[high] >= value)
+        scores += weight * theirs
+        scores += weight * mine
+    for name, field, preferred in CATEGORIES:
+        weight = MATCH_WEIGHTS[name]
+        scores += weight * (arrays[field] == arrays.code(field, getattr(viewer, preferred)))
+        scores += weight * (arrays[preferred] == arrays.code(field, getattr(viewer, field)))
+    return mask, scores
+
+
+def top_k(ids, scores, k):
+    """
+    Positions of the ``k`` best ``scores``, best first, ties broken by
+    ``ids``. ``argpartition`` finds the k-th best score in linear time; only
+    the candidates at or above it are sorted.
+    """
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        threshold = scores[np.argpartition(-scores.astype(np.int32), k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((ids[candidates], -scores[candidates].astype(np.int32)))
+    return candidates[order[:k]]
+
+
+def filter_mask(arrays, criteria):
+    """
+    Which profiles in ``arrays`` pass ``criteria``, Django-style lookups on
+    ``COLUMNS``: ``exact`` (no suffix), ``in``, ``gte`` and ``lte``, as in
+    ``Profile.objects.filter(**criteria)``.
+    """
+    mask = np.ones(arrays.size, dtype=bool)
+    for lookup, value in criteria.items():
+        name, _, operator = lookup.partition('__')
+        column = arrays[name]
+        if name in arrays.vocabularies:
+            values = [arrays.code(name, item) for item in value] if operator == 'in' else arrays.code(name, value)
+        else:
+            values = [column.dtype.type(item) for item in value] if operator == 'in' else column.dtype.type(value)
+        if operator == '':
+            mask &= column == values
+        elif operator == 'in':
+            mask &= np.isin(column, values)
+        elif operator == 'gte':
+            mask &= column >= values
+        elif operator == 'lte':
+            mask &= column <= values
+        else:
+            raise ValueError(f'Unsupported lookup {lookup!r}')
+    return mask
+
+
+def rank(viewer, arrays, k, criteria=None, after=None):
+    """
+    The ``k`` best reciprocal candidates for ``viewer`` as ``(ids, scores)``
+    lists, in ``rank_candidates`` order. ``criteria`` filters candidates as
+    in ``filter_mask``; ``after``, a ``(score, id)`` cursor, skips those up
+    to and including it.
+    """
+    mask, scores = score(viewer, arrays)
+    if criteria:
+        mask &= filter_mask(arrays, criteria)
+    if after is not None:
+        after_score, after_id = after
+        mask &= (scores < after_score) | ((scores == after_score) & (arrays['id'] > after_id))
+    positions = np.flatnonzero(mask)
+    ids, scores = arrays['id'][positions], scores[positions]
+    best = top_k(ids, scores, k)
+    return ids[best].tolist(), scores[best].tolist()
+
+
+def score_profile(viewer, candidate):
+    """Per-object ``score``: the score of ``candidate``, or None if it is filtered out."""
+    if not (
+        viewer.preferred_age_min <= candidate.age <= viewer.preferred_age_max
+        and candidate.preferred_age_min <= viewer.age <= candidate.preferred_age_max
+        and candidate.pk != viewer.pk
+    ):
+        return None
+    total = 0
+    for field, low, high, _ in RANGES:
+        if getattr(viewer, low) <= getattr(candidate, field) <= getattr(viewer, high):
+            total += MATCH_WEIGHTS[field]
+        if getattr(candidate, low) <= getattr(viewer, field) <= getattr(candidate, high):
+            total += MATCH_WEIGHTS[field]
+    for name, field, preferred in CATEGORIES:
+        if getattr(candidate, field) == getattr(viewer, preferred):
+            total += MATCH_WEIGHTS[name]
+        if getattr(candidate, preferred) == getattr(viewer, field):
+            total += MATCH_WEIGHTS[name]
+    return total
+
+
+def rank_profiles(viewer, candidates, k):
+    """Per-object ``rank`` over an iterable of profiles."""
+    scored = (
+        (-total, candidate.pk)
+        for candidate in candidates
+        if (total := score_profile(viewer, candidate)) is not None
+    )
+    best = heapq.nsmallest(k, scored)
+    return [pk for _, pk in best], [-total for total, _ in best]
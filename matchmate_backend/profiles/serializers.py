@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Profile, Contact
+from .models import Profile, Contact, Interest, Religion, Location
+from . import lookups, pictures
 from django.contrib.auth.models import User
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -24,14 +26,109 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
 
+class PictureVariantsField(serializers.Field):
+    """
+    URLs of the resized picture variants, keyed by size and then format, or
+    null until the current picture has been processed.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, profile):
+        return pictures.variant_urls(profile, self.context.get('request'))
+
+class LookupField(serializers.Field):
+    """
+    A canonical ``Religion`` or ``Location``, read and written as its name.
+    Names are normalized and aliases resolved by ``lookups``. A name not seen
+    before validates to an unsaved entry; the serializer saving it stores
+    the entry, so rejected requests never add any.
+    """
+    default_error_messages = {
+        'invalid': 'Not a valid string.',
+        'blank': 'This field may not be blank.',
+        'max_length': 'Ensure this field has no more than {max_length} characters.',
+    }
+
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.max_length = model._meta.get_field('name').max_length
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return value.name
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        if not data.strip():
+            self.fail('blank')
+        if len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+        return lookups.build(self.model, data)
+
 class ProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    picture_variants = PictureVariantsField()
+    religion = LookupField(Religion)
+    location = LookupField(Location)
+    preferred_religion = LookupField(Religion)
+    preferred_location = LookupField(Location)
     
     class Meta:
         model = Profile
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+    def store_lookups(self, validated_data):
+        for name, field in self.fields.items():
+            if isinstance(field, LookupField) and name in validated_data:
+                validated_data[name] = lookups.stored(validated_data[name])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        self.store_lookups(validated_data)
+        return super().create(validated_data)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        self.store_lookups(validated_data)
+        return super().update(instance, validated_data)
+
+class ProfileCardSerializer(serializers.ModelSerializer):
+    """
+    Just enough of a profile to render a name and avatar, for payloads that
+    repeat profiles many times such as chat. Expects ``user`` to be loaded.
+    """
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    picture_variants = PictureVariantsField()
+
+    class Meta:
+        model = Profile
+        fields = ('id', 'user_id', 'first_name', 'profile_picture', 'picture_variants')
+        read_only_fields = fields
+
+class MatchSerializer(ProfileSerializer):
+    match_score = serializers.IntegerField(read_only=True)
+
+class InterestSerializer(serializers.ModelSerializer):
+    """
+    An interest as listed to one of its parties: ``profile`` is the card of
+    the other party, or null if they have no profile. Expects that party's
+    user and profile to be loaded.
+    """
+    profile = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Interest
+        fields = ('id', 'sender_id', 'receiver_id', 'profile', 'created_at', 'is_accepted', 'mutual_at')
+        read_only_fields = fields
+
+    def get_profile(self, obj):
+        other = obj.receiver if obj.sender_id == self.context['request'].user.id else obj.sender
+        profile = getattr(other, 'profile', None)
+        return ProfileCardSerializer(profile, context=self.context).data if profile else None
+
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import match_index, pictures, response_cache, token_cache
+from .matching import MATCH_FIELDS
+from .models import Interest, MutualMatch, Profile
+
+
+def _match_fields_changed(instance, created, update_fields):
+    if created:
+        return True
+    if update_fields is not None:
+        # update_fields may name foreign keys either way, e.g. 'religion'
+        columns = {Profile._meta.get_field(name).attname for name in update_fields}
+        return bool(columns & set(MATCH_FIELDS))
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        return True
+    return any(
+        field not in loaded or getattr(instance, field) != loaded[field]
+        for field in MATCH_FIELDS
+    )
+
+
+def _owners(profile_ids):
+    return Profile.objects.filter(pk__in=profile_ids).values_list('user_id', flat=True)
+
+
+@receiver(post_save, sender=Profile)
+def refresh_match_index(sender, instance, created, update_fields, raw=False, **kwargs):
+    if raw:
+        return
+    # Deleted profiles drop out of the index through the CASCADE on MutualMatch
+    if _match_fields_changed(instance, created, update_fields):
+        instance._loaded_values = {
+            **getattr(instance, '_loaded_values', {}),
+            **{field: getattr(instance, field) for field in MATCH_FIELDS},
+        }
+        listed_by = match_index.refresh_profile(instance)
+    else:
+        listed_by = match_index.listed_by(instance)
+    # The profile's own responses, and every match list that shows it
+    response_cache.invalidate_users([instance.user_id, *_owners(listed_by)])
+
+
+@receiver(post_save, sender=Profile)
+def schedule_picture_processing(sender, instance, created, update_fields, raw=False, **kwargs):
+    if raw or not instance.profile_picture:
+        return
+    if update_fields is not None and 'profile_picture' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    name = instance.profile_picture.name
+    if not created and loaded is not None and loaded.get('profile_picture') == name:
+        return
+    if instance.picture_variants.get('original') == name:
+        return
+    if loaded is not None:
+        loaded['profile_picture'] = name
+    pictures.schedule(instance.pk)
+
+
+@receiver(pre_delete, sender=Profile)
+def remember_listing_profiles(sender, instance, **kwargs):
+    # The CASCADE removes the index entries before post_delete runs
+    instance._listed_by = match_index.listed_by(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def invalidate_deleted_profile(sender, instance, **kwargs):
+    listed_by = getattr(instance, '_listed_by', set())
+    response_cache.invalidate_users([instance.user_id, *_owners(listed_by)])
+
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields, raw=False, **kwargs):
+    # Cached tokens carry the user's is_active; logins only touch last_login
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    token_cache.invalidate_users([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_token(sender, instance, raw=False, created=False, **kwargs):
+    # Deleting the user (delete_profile) cascades here too; a new token
+    # cannot be cached yet
+    if not raw and not created:
+        token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields, raw=False, **kwargs):
+    # Profiles embed the user's names and email; logins only touch last_login
+    if raw or (update_fields is not None and not set(update_fields) & set(USER_FIELDS)):
+        return
+    listed_by = MutualMatch.objects.filter(candidate__user=instance).values_list('profile_id', flat=True)
+    response_cache.invalidate_users([instance.pk, *_owners(listed_by)])
+
+
+@receiver([post_save, post_delete], sender=Interest)
+def invalidate_interest_parties(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    response_cache.invalidate_users([instance.sender_id, instance.receiver_id])
@@ -0,0 +1,146 @@
+"""
+Read-only columnar snapshot of the match attributes of active profiles.
+
+The ``export_profile_snapshot`` command writes the ``scoring.ProfileArrays``
+of every active profile to ``PROFILE_SNAPSHOT_PATH``. Every process that
+opens it maps the same file, so the columns are read zero-copy and share one
+page-cache footprint however many worker processes there are. Request
+handlers rank from it when the match index cannot answer a search (see
+``profiles.views.ranked_live``), and ``rebuild_match_index --workers``
+shares it between its workers.
+
+Layout, little-endian::
+
+    MAGIC | header length (uint64) | JSON header | padding | columns...
+
+The header lists each column's dtype and offset (aligned to ``ALIGNMENT``
+bytes from the start of the file) and, for every categorical field, its
+values in code order. Snapshots are written to a temporary file and renamed
+into place, so readers see either the old file or the new one, never a torn
+write. ``current()`` notices the rename and reopens the file; mappings of the
+old file stay valid for as long as something references them.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Profile
+from .scoring import ProfileArrays
+
+MAGIC = b'MMPROF01'
+ALIGNMENT = 64
+
+_lock = threading.Lock()
+_current = None
+_checked_at = 0.0
+
+
+class InvalidSnapshot(ValueError):
+    pass
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write(arrays, path):
+    """Write ``arrays`` to ``path`` atomically."""
+    columns = {name: np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('<')) for name, column in arrays.columns.items()}
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        offset = _aligned(offset)
+        layout[name] = {'dtype': column.dtype.str, 'offset': offset}
+        offset += column.nbytes
+    header = {
+        'size': arrays.size,
+        'created_at': timezone.now().isoformat(),
+        'columns': layout,
+        'vocabularies': {field: list(vocabulary) for field, vocabulary in arrays.vocabularies.items()},
+    }
+    encoded = json.dumps(header).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(encoded))
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(encoded)))
+            f.write(encoded)
+            for name, column in columns.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(column.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+
+
+def export(path=None):
+    """Snapshot every active profile to ``path`` (default: the setting). Returns the profile count."""
+    arrays = ProfileArrays.load(Profile.objects.filter(is_active=True))
+    write(arrays, path or settings.PROFILE_SNAPSHOT_PATH)
+    return arrays.size
+
+
+class Snapshot(ProfileArrays):
+    """
+    A snapshot file mapped read-only. Works wherever ``ProfileArrays`` does,
+    e.g. ``scoring.rank``; its columns are views of the mapping.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The file that was opened, to notice when another is renamed over it
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise InvalidSnapshot(f'{path} is not a profile snapshot')
+        (length,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + length])
+        data_start = _aligned(start + length)
+
+        self.size = header['size']
+        self.created_at = header['created_at']
+        self.columns = {
+            name: np.frombuffer(self._mmap, dtype=column['dtype'], count=self.size, offset=data_start + column['offset'])
+            for name, column in header['columns'].items()
+        }
+        self.vocabularies = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in header['vocabularies'].items()
+        }
+
+
+def current():
+    """
+    This process's mapping of ``PROFILE_SNAPSHOT_PATH``, or None if there is
+    no snapshot. The file is checked for a replacement at most every
+    ``PROFILE_SNAPSHOT_CHECK_INTERVAL`` seconds.
+    """
+    global _current, _checked_at
+    path = settings.PROFILE_SNAPSHOT_PATH
+    with _lock:
+        now = time.monotonic()
+        if _current is not None and now - _checked_at < settings.PROFILE_SNAPSHOT_CHECK_INTERVAL:
+            return _current
+        _checked_at = now
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _current = None
+            return None
+        if _current is None or _current.identity != (stat.st_ino, stat.st_mtime_ns):
+            _current = Snapshot(path)
+        return _current
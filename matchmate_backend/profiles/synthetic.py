@@ -0,0 +1,151 @@
+"""
+Synthetic users and profiles for benchmarks and local load testing.
+"""
+import bisect
+import functools
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from . import lookups
+from .models import Interest, Location, Profile, Religion
+
+RELIGIONS = ['Hindu', 'Muslim', 'Christian', 'Sikh', 'Buddhist', 'Jain', 'Parsi', 'Jewish']
+RELIGION_WEIGHTS = [60, 15, 8, 6, 4, 4, 2, 1]
+
+LOCATIONS = [
+    'Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Chennai', 'Kolkata', 'Pune',
+    'Ahmedabad', 'Jaipur', 'Lucknow', 'Kochi', 'Chandigarh', 'Indore', 'Surat',
+]
+
+MARITAL_STATUSES = [choice for choice, _ in Profile.MARITAL_STATUS_CHOICES]
+MARITAL_STATUS_WEIGHTS = [85, 9, 3, 3]
+
+EDUCATIONS = [choice for choice, _ in Profile.EDUCATION_CHOICES]
+EDUCATION_WEIGHTS = [15, 45, 30, 5, 5]
+
+OCCUPATIONS = ['Engineer', 'Doctor', 'Teacher', 'Designer', 'Accountant', 'Lawyer', 'Manager']
+
+
+def _pick(rng, values, weights):
+    return rng.choices(values, weights)[0]
+
+
+def lookup_ids():
+    """The ``ids`` ``build_profile`` takes, creating any missing entries."""
+    return {
+        'religion': {name: lookups.resolve(Religion, name, create=True).pk for name in RELIGIONS},
+        'location': {name: lookups.resolve(Location, name, create=True).pk for name in LOCATIONS},
+    }
+
+
+def build_profile(rng, user, ids):
+    """
+    Return an unsaved ``Profile`` for ``user`` with plausible preferences.
+    ``ids`` maps ``'religion'`` and ``'location'`` to ``{name: id}``.
+    """
+    age = rng.randint(21, 45)
+    height = round(rng.gauss(165, 9), 2)
+    income = rng.randrange(300_000, 5_000_000, 10_000)
+    religion = _pick(rng, RELIGIONS, RELIGION_WEIGHTS)
+    location = rng.choice(LOCATIONS)
+    religions, locations = ids['religion'], ids['location']
+    # Most people prefer someone close in age, of the same religion and
+    # nearby; a minority are open to anything.
+    return Profile(
+        user=user,
+        age=age,
+        height=Decimal(str(height)),
+        religion_id=religions[religion],
+        marital_status=_pick(rng, MARITAL_STATUSES, MARITAL_STATUS_WEIGHTS),
+        education=_pick(rng, EDUCATIONS, EDUCATION_WEIGHTS),
+        occupation=rng.choice(OCCUPATIONS),
+        income=Decimal(income),
+        location_id=locations[location],
+        preferred_age_min=max(18, age - rng.randint(2, 6)),
+        preferred_age_max=age + rng.randint(2, 8),
+        preferred_height_min=Decimal(str(round(height - rng.uniform(5, 20), 2))),
+        preferred_height_max=Decimal(str(round(height + rng.uniform(5, 20), 2))),
+        preferred_religion_id=religions[religion if rng.random() < 0.8 else _pick(rng, RELIGIONS, RELIGION_WEIGHTS)],
+        preferred_marital_status='NEVER_MARRIED' if rng.random() < 0.85 else _pick(rng, MARITAL_STATUSES, MARITAL_STATUS_WEIGHTS),
+        preferred_education=_pick(rng, EDUCATIONS, EDUCATION_WEIGHTS),
+        preferred_location_id=locations[location if rng.random() < 0.6 else rng.choice(LOCATIONS)],
+        preferred_income_min=Decimal(max(0, income - rng.randrange(0, 2_000_000, 10_000))),
+        preferred_income_max=Decimal(income + rng.randrange(500_000, 5_000_000, 10_000)),
+    )
+
+
+def seed_profiles(count, seed=0, prefix='synthetic', start=0, batch_size=5000, password='!'):
+    """
+    Create ``count`` users with profiles using ``bulk_create``. Usernames are
+    ``<prefix>-<n>`` starting at ``start``, so repeated calls can grow an
+    existing data set. Each batch draws from its own generator, seeded by
+    ``seed`` and its first username, so the same users come out however the
+    range is split across calls or processes. ``password`` is stored as is,
+    so pass a hash from ``make_password`` to let the users log in. Returns
+    the number of profiles created.
+    """
+    ids = lookup_ids()
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        first = start + created
+        rng = random.Random(f'{seed}:{first}')
+        users = User.objects.bulk_create([
+            User(
+                username=f'{prefix}-{n}',
+                first_name=f'User{n}',
+                password=password,
+            )
+            for n in range(first, first + size)
+        ])
+        # SQLite and Postgres both return primary keys from bulk_create
+        Profile.objects.bulk_create([build_profile(rng, user, ids) for user in users])
+        created += size
+    return created
+
+
+@functools.lru_cache(maxsize=4)
+def popularity(count, seed=0):
+    """
+    Cumulative Pareto weights for ``count`` people: a minority receive most
+    of the attention. Cached, as every batch of a seeding run shares them.
+    """
+    rng = random.Random(f'popularity:{seed}')
+    return list(itertools.accumulate(rng.paretovariate(1.5) for _ in range(count)))
+
+
+def pick(rng, cum_weights, start=0, stop=None):
+    """Weighted random index in ``range(start, stop)`` given cumulative weights."""
+    stop = len(cum_weights) if stop is None else stop
+    low = cum_weights[start - 1] if start else 0.0
+    return bisect.bisect_right(cum_weights, rng.uniform(low, cum_weights[stop - 1]), start, stop - 1)
+
+
+def seed_interests(user_ids, count, seed=0, batch_size=5000, senders=None):
+    """
+    Create up to ``count`` interests from users at the ``senders`` positions
+    of ``user_ids`` (default: all) to popular users; about a third are
+    accepted. Disjoint ``senders`` ranges never create the same interest, so
+    they can be seeded in parallel. Returns the number created.
+    """
+    user_ids = list(user_ids)
+    senders = senders or range(len(user_ids))
+    rng = random.Random(f'interests:{seed}:{senders.start}')
+    cum_weights = popularity(len(user_ids), seed)
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        sender = rng.randrange(senders.start, senders.stop)
+        receiver = pick(rng, cum_weights)
+        if sender != receiver:
+            pairs.add((user_ids[sender], user_ids[receiver]))
+    interests = [
+        Interest(sender_id=sender, receiver_id=receiver, is_accepted=rng.random() < 0.3)
+        for sender, receiver in sorted(pairs)
+    ]
+    Interest.objects.bulk_create(interests, batch_size=batch_size, ignore_conflicts=True)
+    return len(interests)
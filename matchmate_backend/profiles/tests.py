@@ -1,3 +1,825 @@
-from django.test import TestCase
+import io
+import math
+import random
+import re
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import Interest, Location, MutualMatch, Profile, Religion
+from . import geo, interests, lookups, match_index, matching, pictures, response_cache, scoring, snapshot, synthetic, token_cache
+
+
+def make_profile(username, **overrides):
+    user = User.objects.create_user(username=username, password='pass', first_name=username.title())
+    fields = dict(
+        age=30,
+        height=Decimal('170.00'),
+        religion='Hindu',
+        marital_status='NEVER_MARRIED',
+        education='BACHELORS',
+        occupation='Engineer',
+        income=Decimal('1000000.00'),
+        location='Pune',
+        preferred_age_min=25,
+        preferred_age_max=35,
+        preferred_height_min=Decimal('150.00'),
+        preferred_height_max=Decimal('190.00'),
+        preferred_religion='Hindu',
+        preferred_marital_status='NEVER_MARRIED',
+        preferred_education='BACHELORS',
+        preferred_location='Pune',
+        preferred_income_min=Decimal('500000.00'),
+        preferred_income_max=Decimal('2000000.00'),
+    )
+    fields.update(overrides)
+    for name, model in [('religion', Religion), ('location', Location), ('preferred_religion', Religion), ('preferred_location', Location)]:
+        if isinstance(fields[name], str):
+            fields[name] = lookups.resolve(model, fields[name], create=True)
+    return Profile.objects.create(user=user, **fields)
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Base class for tests that EXPLAIN every SELECT a request issues and fail
+    on full table scans. Postgres is told to avoid sequential scans, so tiny
+    test tables cannot hide a missing index.
+    """
+    SQLITE_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)')
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+    def full_scans(self, sql):
+        plan = self.explain(sql)
+        if connection.vendor == 'postgresql':
+            return [line for line in plan if 'Seq Scan' in line]
+        return [line for line in plan if self.SQLITE_SCAN.search(line)]
+
+    def assertNoFullScans(self, request, indexes=()):
+        """
+        Call ``request()`` and check the plan of each SELECT it ran, and
+        that some plan uses each of ``indexes``.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            response = request()
+        selects = [query['sql'] for query in captured if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        plans = []
+        for sql in selects:
+            scans = self.full_scans(sql)
+            self.assertEqual(scans, [], f'Full table scan in: {sql}')
+            plans.extend(self.explain(sql))
+        for index in indexes:
+            self.assertTrue(any(index in line for line in plans), f'{index} unused in: {plans}')
+        return response
+
+
+class PotentialMatchesTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def get(self, **params):
+        response = self.client.get('/api/profiles/potential_matches/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranks_by_reciprocal_score(self):
+        perfect = make_profile('perfect')
+        partial = make_profile('partial', location='Delhi', preferred_location='Delhi')
+        data = self.get()
+        self.assertEqual([row['id'] for row in data['results']], [perfect.id, partial.id])
+        self.assertEqual(data['results'][0]['match_score'], matching.MAX_MATCH_SCORE)
+        self.assertLess(data['results'][1]['match_score'], matching.MAX_MATCH_SCORE)
+
+    def test_excludes_candidates_outside_either_age_preference(self):
+        make_profile('too_old', age=50, preferred_age_min=40, preferred_age_max=60)
+        make_profile('wants_older', preferred_age_min=40, preferred_age_max=60)
+        make_profile('inactive', is_active=False)
+        self.assertEqual(self.get()['results'], [])
+
+    def test_cursor_pagination_walks_every_candidate_once(self):
+        expected = {make_profile(f'candidate{n}').id for n in range(5)}
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.get(**params)
+            seen.extend(row['id'] for row in data['results'])
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/profiles/potential_matches/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_profiles_without_an_index_are_ranked_live(self):
+        perfect = make_profile('perfect')
+        MutualMatch.objects.all().delete()
+        data = self.get()
+        self.assertEqual([row['id'] for row in data['results']], [perfect.id])
+        self.assertEqual(data['results'][0]['match_score'], matching.MAX_MATCH_SCORE)
+
+    @mock.patch.object(match_index, 'INDEX_SIZE', 1)
+    def test_short_pages_of_a_full_list_reach_past_it(self):
+        perfect = make_profile('perfect')
+        delhi = make_profile('delhi', location='Delhi')
+        self.assertEqual(MutualMatch.objects.filter(profile=self.me).count(), 1)
+        self.assertEqual([row['id'] for row in self.get(location='Delhi')['results']], [delhi.id])
+        self.assertEqual([row['id'] for row in self.get(age_min=20, age_max=40)['results']], [perfect.id, delhi.id])
+
+    def test_filters_narrow_a_complete_list(self):
+        perfect = make_profile('perfect')
+        make_profile('delhi', location='Delhi')
+        with mock.patch.object(matching, 'rank_candidates') as rank_candidates:
+            self.assertEqual([row['id'] for row in self.get(location='Pune')['results']], [perfect.id])
+            self.assertEqual(self.get(location='Mumbai')['results'], [])
+        rank_candidates.assert_not_called()
+
+    @mock.patch.object(match_index, 'INDEX_SIZE', 1)
+    def test_live_pages_are_not_cached(self):
+        make_profile('perfect')
+        delhi = make_profile('delhi', location='Delhi')
+        response_cache.clear()
+        response = self.client.get('/api/profiles/potential_matches/', {'location': 'Delhi'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [delhi.id])
+        # Outside the viewer's list, so no invalidation reaches the viewer
+        delhi.is_active = False
+        delhi.save()
+        self.assertEqual(self.get(location='Delhi')['results'], [])
+
+
+class LookupTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def test_spellings_resolve_to_one_entry(self):
+        mumbai = lookups.resolve(Location, 'Mumbai', create=True)
+        for text in ('mumbai', ' MUMBAI ', 'Bombay', 'bombay.'):
+            with self.subTest(text=text):
+                self.assertEqual(lookups.resolve(Location, text), mumbai)
+        self.assertEqual(lookups.resolve(Religion, 'Islam', create=True).name, 'Muslim')
+        self.assertEqual(lookups.resolve(Location, 'São Paulo', create=True).key, 'sao paulo')
+        self.assertIsNone(lookups.resolve(Location, 'Atlantis'))
+
+    def test_profiles_are_written_and_read_by_name(self):
+        response = self.client.post(
+            '/api/profiles/update_profile/', {'location': '  bombay ', 'preferred_religion': 'hinduism'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['location'], response.json()['preferred_religion']), ('Mumbai', 'Hindu'))
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.preferred_religion_id, self.me.religion_id)
+        for value in ('', '   ', 7, 'x' * 201):
+            with self.subTest(value=value):
+                response = self.client.post('/api/profiles/update_profile/', {'location': value}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_rejected_requests_add_no_entries(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('new', password='pw'))
+        response = client.post(
+            '/api/profiles/', {'age': 'old', 'location': 'Spam2', 'preferred_religion': 'Spam3'}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/profiles/update_profile/', {'age': 'old', 'preferred_location': 'Spam4'}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Location.objects.filter(name__startswith='Spam').exists())
+        self.assertFalse(Religion.objects.filter(name__startswith='Spam').exists())
+        response = self.client.post('/api/profiles/update_profile/', {'location': 'Spam4'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.location, Location.objects.get(key='spam4'))
+
+    def test_filters_compare_ids(self):
+        mumbai = make_profile('mumbai', location='Mumbai')
+        make_profile('pune')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/profiles/potential_matches/', {'location': 'Bombay'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [mumbai.id])
+        self.assertIn(f'"location_id" = {mumbai.location_id}', '\n'.join(q['sql'] for q in queries.captured_queries))
+        response = self.client.get('/api/profiles/potential_matches/', {'location': 'Atlantis'})
+        self.assertEqual(response.json()['results'], [])
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def test_encode_and_distance(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        mumbai, pune = geo.geocode('Mumbai'), geo.geocode('pune')
+        self.assertAlmostEqual(geo.haversine_km(*mumbai, *pune), 120, delta=2)
+        self.assertEqual(geo.geocode('Damak, Jhapa'), geo.geocode('Damak'))
+        self.assertIsNone(geo.geocode('Atlantis'))
+
+    def test_cells_cover_the_circle(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            latitude, longitude = rng.uniform(-89, 89), rng.uniform(-180, 180)
+            radius_km = 10 ** rng.uniform(-1, 3.5)
+            prefixes = geo.cells(latitude, longitude, radius_km)
+            self.assertLessEqual(len(prefixes), 32)
+            # A point at a random bearing on the circle itself
+            distance, bearing = radius_km / geo.EARTH_RADIUS_KM, rng.uniform(0, 2 * math.pi)
+            phi, lam = math.radians(latitude), math.radians(longitude)
+            phi2 = math.asin(math.sin(phi) * math.cos(distance) + math.cos(phi) * math.sin(distance) * math.cos(bearing))
+            lam2 = lam + math.atan2(
+                math.sin(bearing) * math.sin(distance) * math.cos(phi),
+                math.cos(distance) - math.sin(phi) * math.sin(phi2),
+            )
+            point = geo.encode(math.degrees(phi2), (math.degrees(lam2) + 180) % 360 - 180)
+            self.assertTrue(any(point.startswith(prefix) for prefix in prefixes), (latitude, longitude, radius_km))
+
+    def test_locations_are_geocoded_on_creation(self):
+        bombay = lookups.resolve(Location, 'Bombay', create=True)
+        self.assertEqual((bombay.latitude, bombay.longitude), geo.geocode('Mumbai'))
+        self.assertEqual(bombay.geohash, geo.encode(*geo.geocode('Mumbai')))
+        self.assertEqual(lookups.resolve(Location, 'Atlantis', create=True).geohash, '')
+
+    def test_radius_search(self):
+        pune = make_profile('pune')
+        mumbai = make_profile('mumbai', location='Mumbai')
+        make_profile('delhi', location='Delhi')
+        make_profile('atlantis', location='Atlantis')
+        url = '/api/profiles/potential_matches/'
+        for radius_km, expected in [('50', [pune.id]), ('150', [pune.id, mumbai.id])]:
+            with self.subTest(radius_km=radius_km):
+                response = self.client.get(url, {'radius_km': radius_km})
+                self.assertEqual(sorted(row['id'] for row in response.json()['results']), expected)
+        for radius_km in ('x', '-5', '0', 'nan', 'inf'):
+            with self.subTest(radius_km=radius_km):
+                self.assertEqual(self.client.get(url, {'radius_km': radius_km}).status_code, 400)
+        self.me.location = lookups.resolve(Location, 'Atlantis')
+        self.me.save()
+        self.assertEqual(self.client.get(url, {'radius_km': '50'}).status_code, 400)
+
+    @mock.patch.object(match_index, 'INDEX_SIZE', 1)
+    def test_radius_search_reaches_past_the_index(self):
+        pune = make_profile('pune')
+        mumbai = make_profile('mumbai', location='Mumbai')
+        self.assertEqual(list(MutualMatch.objects.filter(profile=self.me).values_list('candidate_id', flat=True)), [pune.id])
+        response = self.client.get('/api/profiles/potential_matches/', {'radius_km': '150'})
+        self.assertEqual(sorted(row['id'] for row in response.json()['results']), [pune.id, mumbai.id])
+
+
+class MatchIndexTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.other = make_profile('other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def pairs(self):
+        return set(MutualMatch.objects.values_list('profile_id', 'candidate_id', 'score'))
+
+    def test_new_profile_is_indexed_both_ways(self):
+        score = matching.MAX_MATCH_SCORE
+        self.assertEqual(self.pairs(), {(self.me.id, self.other.id, score), (self.other.id, self.me.id, score)})
+
+    def test_preference_update_through_api_reindexes(self):
+        response = self.client.post('/api/profiles/update_profile/', {'preferred_age_min': 40, 'preferred_age_max': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pairs(), set())
+
+    def test_unrelated_update_keeps_index(self):
+        MutualMatch.objects.all().delete()
+        response = self.client.post('/api/profiles/update_profile/', {'bio': 'Hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pairs(), set())
+
+    def test_delete_profile_drops_entries(self):
+        response = self.client.delete('/api/profiles/delete_profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pairs(), set())
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        make_profile('third', location='Delhi')
+        make_profile('fourth', religion='Sikh', preferred_religion='Sikh')
+        incremental = self.pairs()
+        MutualMatch.objects.all().delete()
+        match_index.rebuild(chunk_size=2)
+        self.assertEqual(self.pairs(), incremental)
+
+
+class InterestTests(TestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.others = [make_profile(f'other{n}') for n in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def express(self, profile, target):
+        client = APIClient()
+        client.force_authenticate(profile.user)
+        return client.post(f'/api/profiles/{target.user_id}/express_interest/')
+
+    def test_second_direction_makes_the_pair_mutual(self):
+        first, second = self.others[:2]
+        self.assertFalse(self.express(self.me, first).json()['mutual'])
+        response = self.express(first, self.me)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['mutual'])
+        self.assertEqual(Interest.objects.filter(mutual_at__isnull=False).count(), 2)
+        self.express(self.me, second)
+
+        mutual = self.client.get('/api/profiles/mutual_interests/').json()
+        self.assertEqual([row['profile']['user_id'] for row in mutual['results']], [first.user_id])
+        self.assertEqual(self.express(self.me, first).json()['already_expressed'], True)
+
+    def test_listings_page_newest_first(self):
+        for other in self.others:
+            self.express(self.me, other)
+            self.express(other, self.me)
+        for action in ('interests_sent', 'interests_received'):
+            seen, cursor = [], None
+            while True:
+                params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+                page = self.client.get(f'/api/profiles/{action}/', params).json()
+                seen += [row['profile']['user_id'] for row in page['results']]
+                cursor = page['next']
+                if not cursor:
+                    break
+            self.assertEqual(seen, [other.user_id for other in reversed(self.others)])
+        self.assertEqual(self.client.get('/api/profiles/interests_sent/', {'cursor': 'x'}).status_code, 400)
+
+    def test_cursors_outside_the_listing_are_rejected(self):
+        first, second = self.others[:2]
+        self.express(first, self.me)
+        self.express(first, second)
+        received = Interest.objects.get(sender=first.user, receiver=self.me.user)
+        foreign = Interest.objects.get(sender=first.user, receiver=second.user)
+        for action, cursor in [
+            ('interests_sent', received.pk), ('interests_sent', foreign.pk), ('interests_sent', 999999),
+            ('mutual_interests', received.pk),
+        ]:
+            with self.subTest(action=action, cursor=cursor):
+                response = self.client.get(f'/api/profiles/{action}/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/profiles/interests_received/', {'cursor': received.pk})
+        self.assertEqual(response.json(), {'results': [], 'next': None})
+
+    def test_accept_is_mutual_and_atomic(self):
+        sender = self.others[0]
+        self.express(sender, self.me)
+        response = self.client.post(f'/api/profiles/{sender.user_id}/accept_interest/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_accepted'])
+        self.assertIsNotNone(response.json()['mutual_at'])
+        self.assertTrue(Interest.objects.filter(sender=self.me.user, receiver=sender.user, mutual_at__isnull=False).exists())
+
+        stranger = self.others[1]
+        self.assertEqual(self.client.post(f'/api/profiles/{stranger.user_id}/accept_interest/').status_code, 404)
+        self.assertFalse(Interest.objects.filter(sender=self.me.user, receiver=stranger.user).exists())
+
+    def test_bulk_inserted_pairs_are_marked(self):
+        first = self.others[0]
+        Interest.objects.bulk_create([
+            Interest(sender=self.me.user, receiver=first.user),
+            Interest(sender=first.user, receiver=self.me.user),
+            Interest(sender=self.me.user, receiver=self.others[1].user),
+        ])
+        self.assertEqual(interests.mark_mutual(), 2)
+        self.assertEqual(interests.mark_mutual(), 0)
+
+
+def matching_rank(viewer, k):
+    ranked = matching.rank_candidates(viewer, Profile.objects.all()).values_list('id', 'match_score')[:k]
+    return [pk for pk, _ in ranked], [total for _, total in ranked]
+
+
+class ScoringTests(TestCase):
+    def setUp(self):
+        synthetic.seed_profiles(300, seed=3)
+        self.profiles = list(Profile.objects.order_by('pk'))
+        self.arrays = scoring.ProfileArrays.load(Profile.objects.all(), chunk_size=64)
+
+    def test_vectorized_ranking_matches_sql_and_per_object(self):
+        self.assertEqual(self.arrays.size, 300)
+        for viewer in self.profiles[:20]:
+            for k in (1, 10, 500):
+                with self.subTest(viewer=viewer.pk, k=k):
+                    expected = matching_rank(viewer, k)
+                    self.assertEqual(scoring.rank(viewer, self.arrays, k), expected)
+                    self.assertEqual(scoring.rank_profiles(viewer, self.profiles, k), expected)
+
+    def test_categories_share_a_vocabulary(self):
+        same = self.arrays['religion_id'] == self.arrays['preferred_religion_id']
+        self.assertEqual(same.tolist(), [p.religion_id == p.preferred_religion_id for p in self.profiles])
+        viewer = self.profiles[0]
+        viewer.preferred_religion_id = Religion.objects.create(name='Nobody has this', key='nobody has this').pk
+        self.assertEqual(self.arrays.code('religion_id', viewer.preferred_religion_id), -1)
+        ids, scores = scoring.rank(viewer, self.arrays, 500)
+        self.assertEqual(scores, [scoring.score_profile(viewer, Profile.objects.get(pk=pk)) for pk in ids])
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        synthetic.seed_profiles(50, seed=5)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = f'{self.directory}/profiles.bin'
+        settings = override_settings(PROFILE_SNAPSHOT_PATH=self.path, PROFILE_SNAPSHOT_CHECK_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        snapshot._current = None
+        self.addCleanup(setattr, snapshot, '_current', None)
+
+    def test_round_trip_is_zero_copy(self):
+        self.assertEqual(snapshot.export(), 50)
+        arrays = scoring.ProfileArrays.load(Profile.objects.filter(is_active=True))
+        mapped = snapshot.Snapshot(self.path)
+        self.assertEqual(mapped.size, 50)
+        self.assertEqual(mapped.vocabularies, arrays.vocabularies)
+        for name in scoring.COLUMNS:
+            self.assertEqual(mapped[name].dtype, arrays[name].dtype)
+            self.assertEqual(mapped[name].tolist(), arrays[name].tolist())
+            self.assertFalse(mapped[name].flags.writeable)
+        viewer = Profile.objects.first()
+        self.assertEqual(scoring.rank(viewer, mapped, 10), scoring.rank(viewer, arrays, 10))
+
+    def test_viewers_decode_from_the_snapshot(self):
+        snapshot.export()
+        mapped = snapshot.current()
+        for position, profile in enumerate(Profile.objects.order_by('pk')[:10]):
+            viewer = mapped.profile(position)
+            self.assertEqual((viewer.pk, viewer.location_id), (profile.pk, profile.location_id))
+            self.assertEqual(scoring.rank(viewer, mapped, 10), matching_rank(profile, 10))
+
+    def test_current_follows_atomic_replacement(self):
+        self.assertIsNone(snapshot.current())
+        snapshot.export()
+        first = snapshot.current()
+        self.assertIs(snapshot.current(), first)
+
+        synthetic.seed_profiles(5, seed=5, prefix='late')
+        snapshot.export()
+        second = snapshot.current()
+        self.assertEqual(second.size, 55)
+        # The replaced file stays mapped for whoever still holds it
+        self.assertEqual(first.size, 50)
+        self.assertEqual(len(first['id'].tolist()), 50)
+
+    def walk(self, client, **params):
+        response_cache.clear()
+        rows, cursor = [], None
+        while True:
+            data = client.get('/api/profiles/potential_matches/', {**params, 'limit': 4, 'cursor': cursor or ''}).json()
+            rows.extend((row['id'], row['match_score']) for row in data['results'])
+            if not (cursor := data['next']):
+                return rows
+
+    def test_searches_past_the_index_rank_from_the_snapshot(self):
+        # Seeded profiles have no index lists, so every search ranks live
+        viewer = max(
+            Profile.objects.filter(is_active=True),
+            key=lambda profile: matching.rank_candidates(profile, Profile.objects.all()).count(),
+        )
+        pick = matching.rank_candidates(viewer, Profile.objects.select_related('location')).last()
+        client = APIClient()
+        client.force_authenticate(viewer.user)
+        searches = [
+            {}, {'age_min': pick.age, 'age_max': pick.age + 5}, {'location': pick.location.name}, {'radius_km': 1000},
+        ]
+        expected = [self.walk(client, **params) for params in searches]
+        self.assertTrue(all(expected))
+
+        snapshot.export()
+        with mock.patch.object(matching, 'rank_candidates') as rank_candidates:
+            self.assertEqual([self.walk(client, **params) for params in searches], expected)
+        rank_candidates.assert_not_called()
+
+        # Only the page is read back, without profiles deactivated since
+        gone = expected[0][0][0]
+        Profile.objects.filter(pk=gone).update(is_active=False)
+        self.assertEqual(self.walk(client), [row for row in expected[0] if row[0] != gone])
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot')
+        with self.assertRaises(snapshot.InvalidSnapshot):
+            snapshot.Snapshot(self.path)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.clear()
+        response_cache.reset_stats()
+        self.me = make_profile('me')
+        self.other = make_profile('other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_my_profile_is_cached_until_updated(self):
+        self.assertEqual(self.get('/api/profiles/my_profile/')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/profiles/my_profile/')['X-Cache'], 'HIT')
+
+        self.client.post('/api/profiles/update_profile/', {'bio': 'Updated'})
+        response = self.get('/api/profiles/my_profile/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['bio'], 'Updated')
+
+    def test_match_params_are_normalized(self):
+        url = '/api/profiles/potential_matches/'
+        self.assertEqual(self.get(url, religion='Hindu', limit=5)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(f'{url}?limit=5&religion=Hindu&location=')['X-Cache'], 'HIT')
+        self.assertEqual(self.get(url, religion='Sikh', limit=5)['X-Cache'], 'MISS')
+
+    def test_candidate_change_invalidates_lists_showing_it(self):
+        url = '/api/profiles/potential_matches/'
+        self.get(url)
+        self.other.bio = 'New bio'
+        self.other.save()
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['bio'], 'New bio')
+
+        # An unrelated profile leaves the cached list alone
+        make_profile('stranger', age=60, preferred_age_min=55, preferred_age_max=65)
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+    def test_deleted_candidate_disappears(self):
+        url = '/api/profiles/potential_matches/'
+        self.assertEqual(len(self.get(url).json()['results']), 1)
+        self.other.user.delete()
+        self.assertEqual(self.get(url).json()['results'], [])
+
+    def test_my_profile_conditional_get(self):
+        first = self.get('/api/profiles/my_profile/')
+        response = self.client.get('/api/profiles/my_profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post('/api/profiles/update_profile/', {'bio': 'Updated'})
+        response = self.client.get('/api/profiles/my_profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_counters(self):
+        self.get('/api/profiles/my_profile/')
+        self.get('/api/profiles/my_profile/')
+        cache = response_cache.CountingLocMemCache('evictions', {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2}})
+        for n in range(4):
+            cache.set(n, n)
+        stats = response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 1, 2))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+
+class ProfileQueryPlanTests(QueryPlanTestCase):
+    def setUp(self):
+        self.me = make_profile('me')
+        self.other = make_profile('other')
+        make_profile('third', location='Delhi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+        response_cache.clear()
+
+    def test_potential_matches(self):
+        url = '/api/profiles/potential_matches/'
+        response = self.assertNoFullScans(lambda: self.client.get(url, {'limit': 1}))
+        cursor = response.json()['next']
+        self.assertNoFullScans(lambda: self.client.get(url, {'limit': 1, 'cursor': cursor}))
+        self.assertNoFullScans(lambda: self.client.get(url, {
+            'age_min': 25, 'age_max': 35, 'religion': 'Hindu', 'marital_status': 'NEVER_MARRIED',
+            'education': 'BACHELORS', 'location': 'Pune', 'radius_km': 100,
+        }))
+
+    @mock.patch.object(match_index, 'INDEX_SIZE', 1)
+    def test_searches_ranked_live(self):
+        # Lists are full, so short pages are completed from the table
+        url = '/api/profiles/potential_matches/'
+        self.assertNoFullScans(
+            lambda: self.client.get(url, {'religion': 'Hindu', 'age_min': 25, 'age_max': 35}),
+            indexes=['profile_active_religion_idx'],
+        )
+        self.assertNoFullScans(
+            lambda: self.client.get(url, {'radius_km': 2000}),
+            indexes=['location_geohash', 'profile_active_location_idx'],
+        )
+
+    def test_profile_reads_and_writes(self):
+        self.assertNoFullScans(lambda: self.client.get('/api/profiles/my_profile/'))
+        # Reindexes the profile and invalidates the lists showing it
+        self.assertNoFullScans(lambda: self.client.post('/api/profiles/update_profile/', {'age': 31}))
+        self.assertNoFullScans(lambda: self.client.post(f'/api/profiles/{self.other.user_id}/express_interest/'))
+
+    def test_interest_listings(self):
+        received, _ = interests.express(self.other.user_id, self.me.user_id)
+        sent, _ = interests.express(self.me.user_id, self.other.user_id)
+        for action, cursor in [('interests_sent', sent), ('interests_received', received), ('mutual_interests', sent)]:
+            with self.subTest(action=action):
+                url = f'/api/profiles/{action}/'
+                self.assertNoFullScans(lambda: self.client.get(url))
+                response = self.assertNoFullScans(lambda: self.client.get(url, {'cursor': cursor.pk}))
+                self.assertEqual(response.status_code, 200)
+        self.assertNoFullScans(lambda: self.client.post(f'/api/profiles/{self.other.user_id}/accept_interest/'))
+
+
+class SyntheticDataTests(TestCase):
+    def snapshot(self, prefix):
+        return [
+            (username.split('-')[1], age, religion, location)
+            for username, age, religion, location in Profile.objects
+            .filter(user__username__startswith=f'{prefix}-')
+            .order_by('user__username')
+            .values_list('user__username', 'age', 'religion__name', 'location__name')
+        ]
+
+    def test_split_seeding_matches_single_run(self):
+        synthetic.seed_profiles(10, seed=3, prefix='whole', batch_size=5)
+        synthetic.seed_profiles(5, seed=3, prefix='split', start=5, batch_size=5)
+        synthetic.seed_profiles(5, seed=3, prefix='split', start=0, batch_size=5)
+        self.assertEqual(self.snapshot('whole'), self.snapshot('split'))
+
+    def test_interests_from_disjoint_sender_ranges_never_collide(self):
+        synthetic.seed_profiles(20, prefix='seed')
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        created = sum(
+            synthetic.seed_interests(user_ids, 30, senders=senders)
+            for senders in (range(0, 10), range(10, 20))
+        )
+        self.assertEqual(Interest.objects.count(), created)
+
+
+def jpeg_upload(name='photo.jpg', size=(1600, 1200), color=(200, 80, 40)):
+    exif = Image.Exif()
+    exif[0x0110] = 'Phone 12'   # Model
+    exif[0x0112] = 6            # Orientation: rotated 90 degrees
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(PROFILE_PICTURE_WORKERS=0)
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.me = make_profile('me')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me.user)
+
+    def upload(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/profiles/update_profile/', {'profile_picture': jpeg_upload(**kwargs)}, format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.me.refresh_from_db()
+        return response
+
+    def test_upload_is_processed_into_stripped_variants(self):
+        response = self.upload()
+        # The upload response is rendered before processing runs
+        self.assertIsNone(response.data['picture_variants'])
+        self.assertTrue(response.data['profile_picture'].endswith('photo.jpg'))
+        self.assertFalse(default_storage.exists(response.data['profile_picture'].split('/media/')[1]))
+
+        variants = self.me.picture_variants
+        self.assertEqual(self.me.profile_picture.name, variants['original'])
+        self.assertEqual(self.me.profile_picture.name, variants['full']['jpeg'])
+        for variant, (width, height, crop) in pictures.VARIANTS.items():
+            for fmt, name in variants[variant].items():
+                self.assertRegex(name, rf'^profile_pictures/{variant}/[0-9a-f]{{20}}\.(jpg|webp)$')
+                with default_storage.open(name) as f, Image.open(f) as image:
+                    self.assertEqual(image.format, pictures.FORMATS[fmt][0])
+                    self.assertFalse(image.getexif())
+                    if crop:
+                        self.assertEqual(image.size, (width, height))
+        # The EXIF orientation was applied before it was dropped
+        with default_storage.open(variants['full']['jpeg']) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (810, 1080))
+
+    def test_serializers_expose_variant_urls(self):
+        self.upload()
+        data = self.client.get('/api/profiles/my_profile/').data
+        self.assertEqual(set(data['picture_variants']), set(pictures.VARIANTS))
+        self.assertTrue(data['picture_variants']['card']['webp'].startswith('http://testserver/media/profile_pictures/card/'))
+        self.assertTrue(data['profile_picture'].endswith(self.me.picture_variants['original']))
+
+    def test_identical_content_reuses_files(self):
+        self.upload()
+        first = self.me.picture_variants
+        self.upload(name='again.jpg')
+        self.assertEqual(self.me.picture_variants, first)
+
+    def test_stale_variants_are_hidden_after_a_new_upload(self):
+        self.upload()
+        self.me.profile_picture = jpeg_upload(name='new.jpg', color=(10, 10, 10))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.me.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(pictures.variant_urls(self.me))
+        callbacks[0]()
+        self.me.refresh_from_db()
+        self.assertIsNotNone(pictures.variant_urls(self.me))
+
+    def test_unrelated_saves_do_not_reprocess(self):
+        self.upload()
+        self.me.bio = 'Hello'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.me.save()
+        self.assertEqual(callbacks, [])
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        token_cache.reset_stats()
+        self.me = make_profile('me')
+        self.token = Token.objects.create(user=self.me.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self):
+        return self.client.get('/api/profiles/cache_stats/')
+
+    def test_cached_token_saves_a_query(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.get().status_code, 403)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(len(second), len(first) - 1)
+        self.assertFalse(any('authtoken_token' in query['sql'] for query in second))
+        stats = token_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+        self.assertNotIn(self.token.key, str(token_cache.cache_key(self.token.key)))
+
+    def test_caches_only_the_user_id_and_status(self):
+        self.get()
+        self.assertEqual(token_cache._cache().get(token_cache.cache_key(self.token.key)), (self.me.user_id, True))
+        token = token_cache.get_token(self.token.key)
+        self.assertEqual((token.user.pk, token.user.is_active), (self.me.user_id, True))
+        # Everything else is read on demand
+        self.assertEqual(token.user.username, 'me')
+        self.assertEqual(self.client.get('/api/profiles/my_profile/').json()['user']['username'], 'me')
+
+    def test_deactivated_user_is_rejected(self):
+        self.get()
+        self.me.user.is_active = False
+        self.me.user.save()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deleted_token_is_rejected(self):
+        self.get()
+        self.token.delete()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deleted_account_is_rejected(self):
+        self.get()
+        response = self.client.delete('/api/profiles/delete_profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_logins_keep_the_entry(self):
+        self.get()
+        self.client.post('/api/auth/login/', {'username': 'me', 'password': 'pass'})
+        self.get()
+        self.assertEqual(token_cache.stats()['invalidations'], 0)
+
+    def test_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/profiles/token_cache_stats/').status_code, 403)
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get('/api/profiles/token_cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.json())
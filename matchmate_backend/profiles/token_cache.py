@@ -0,0 +1,114 @@
+"""
+Cache of API tokens, so authenticating a request does not query
+``authtoken_token`` joined to ``auth_user`` every time.
+
+Only the token's ``(user_id, is_active)`` is stored, in the ``tokens`` cache
+alias under a hash of the key, for ``TOKEN_CACHE_TTL`` seconds; never the
+user itself, whose password hash must not end up in a shared cache. Hits
+return the token with a ``User`` whose other fields are deferred, so they
+are only read from the database if a view uses them.
+
+Signal handlers in ``profiles.signals`` evict a token when it is deleted or
+its user changes, e.g. is deactivated or deleted. With Redis (``REDIS_URL``)
+the eviction reaches every worker. The local-memory default is only cleared
+in the process that made the change, so its TTL is a few seconds: that is
+how long other workers may still accept a deleted or deactivated user.
+"""
+import hashlib
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+ALIAS = 'tokens'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def stats():
+    """Hit/miss/invalidation counters for this process, plus the hit rate."""
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_rate'] = data['hits'] / lookups if lookups else None
+    return data
+
+
+def reset_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def cache_key(key):
+    # Never put the credential itself in a (possibly shared) cache
+    return 'tokens:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _query(key):
+    return Token.objects.filter(key=key).values_list('user_id', 'user__is_active')
+
+
+def _token(key, user_id, is_active):
+    # As if loaded with .only(): the rest of the user is fetched on access
+    user = User.from_db(DEFAULT_DB_ALIAS, ['id', 'is_active'], [user_id, is_active])
+    token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id'], [key, user_id])
+    token.user = user
+    return token
+
+
+def get_token(key):
+    """
+    The token for ``key`` with its user's id and ``is_active`` loaded, or
+    None if there is none.
+    """
+    entry = _cache().get(cache_key(key))
+    if entry is not None:
+        _count('hits')
+        return _token(key, *entry)
+    _count('misses')
+    entry = _query(key).first()
+    if entry is None:
+        return None
+    _cache().set(cache_key(key), entry)
+    return _token(key, *entry)
+
+
+def invalidate(keys):
+    keys = list(keys)
+    if keys:
+        _cache().delete_many([cache_key(key) for key in keys])
+        _count('invalidations', len(keys))
+
+
+def invalidate_users(user_ids):
+    invalidate(Token.objects.filter(user_id__in=list(user_ids)).values_list('key', flat=True))
+
+
+def clear():
+    _cache().clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that looks tokens up through the cache."""
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (token.user, token)
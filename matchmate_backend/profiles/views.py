@@ -1,20 +1,72 @@
+import logging
+import math
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from .models import Profile, Interest, Contact
-from .serializers import ProfileSerializer, ContactSerializer
+from .models import Profile, Interest, Contact, MutualMatch, Religion, Location
+from .serializers import ProfileSerializer, MatchSerializer, ContactSerializer, InterestSerializer
+from . import geo, interests, lookups, match_index, matching, response_cache, scoring, snapshot, token_cache
+from matchmate_backend.conditional import conditional, make_etag
+
+logger = logging.getLogger(__name__)
+
+# Foreign keys every serialized profile renders by name
+LOOKUP_RELATIONS = ('religion', 'location', 'preferred_religion', 'preferred_location')
 
 # Create your views here.
 
+def my_profile_etag(viewset, request):
+    # The profile embeds the user, which has no updated_at of its own
+    row = (
+        Profile.objects.filter(user=request.user)
+        .values_list('id', 'updated_at', 'user__username', 'user__email', 'user__first_name', 'user__last_name')
+        .first()
+    )
+    if row is None:
+        return None
+    return make_etag('my_profile', *row)
+
+def ranked_live(profile, criteria, cursor, limit):
+    """
+    One page of ``profile``'s reciprocal candidates passing ``criteria``,
+    ranked over every active profile. With a profile snapshot, candidates
+    are scored from its memory-mapped columns, and only the page is read
+    from the database (dropping profiles deactivated since the export);
+    otherwise the table is ranked in SQL.
+    """
+    candidates = snapshot.current()
+    if candidates is None:
+        matches = matching.rank_candidates(
+            profile, Profile.objects.filter(**criteria).select_related('user', *LOOKUP_RELATIONS)
+        )
+        return matching.paginate(matches, cursor, limit)
+
+    after = matching.decode_cursor(cursor) if cursor else None
+    ids, scores = scoring.rank(profile, candidates, limit + 1, criteria, after)
+    next_cursor = None
+    if len(ids) > limit:
+        ids, scores = ids[:limit], scores[:limit]
+        next_cursor = matching.encode_cursor(scores[-1], ids[-1])
+    profiles = Profile.objects.filter(pk__in=ids, is_active=True).select_related('user', *LOOKUP_RELATIONS).in_bulk()
+    page = []
+    for pk, score in zip(ids, scores):
+        if pk in profiles:
+            profiles[pk].match_score = score
+            page.append(profiles[pk])
+    return page, next_cursor
+
+
 class ProfileViewSet(viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Profile.objects.filter(user=self.request.user)
+        return Profile.objects.filter(user=self.request.user).select_related(*LOOKUP_RELATIONS)
     
     @action(detail=False, methods=['DELETE'])
     def delete_profile(self, request):
@@ -31,7 +83,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     def create(self, request, *args, **kwargs):
-        print("Received data:", request.data)  # Debug print
+        logger.debug('Creating profile for user %s: %s', request.user.pk, request.data)
         
         # Check if user already has a profile
         if Profile.objects.filter(user=request.user).exists():
@@ -46,13 +98,13 @@ class ProfileViewSet(viewsets.ModelViewSet):
                 self.perform_create(serializer)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             except Exception as e:
-                print("Error creating profile:", str(e))  # Debug print
+                logger.exception('Error creating profile for user %s', request.user.pk)
                 return Response(
                     {"detail": f"Error creating profile: {str(e)}"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         else:
-            print("Validation errors:", serializer.errors)  # Debug print
+            logger.info('Profile validation errors: %s', serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def perform_create(self, serializer):
@@ -69,45 +121,121 @@ class ProfileViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
+    @conditional(my_profile_etag)
+    @response_cache.cached('my_profile')
     def my_profile(self, request):
-        profile = get_object_or_404(Profile, user=request.user)
+        profile = get_object_or_404(Profile.objects.select_related(*LOOKUP_RELATIONS), user=request.user)
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @response_cache.cached('potential_matches')
     def potential_matches(self, request):
-        # Get all profiles except the current user's
-        matches = Profile.objects.exclude(user=request.user)
-        
         # Get the user's profile
         user_profile = Profile.objects.filter(user=request.user).first()
+        limit = matching.page_size(request.query_params.get('limit'))
+        cursor = request.query_params.get('cursor')
         
-        # Only apply filters if user has a profile and preferences
-        if user_profile:
-            # Apply filters only if they are set in the request query params
-            age_min = request.query_params.get('age_min')
-            age_max = request.query_params.get('age_max')
-            if age_min and age_max:
-                matches = matches.filter(age__gte=age_min, age__lte=age_max)
-            
-            religion = request.query_params.get('religion')
-            if religion:
-                matches = matches.filter(religion=religion)
-            
-            marital_status = request.query_params.get('marital_status')
-            if marital_status:
-                matches = matches.filter(marital_status=marital_status)
-            
-            education = request.query_params.get('education')
-            if education:
-                matches = matches.filter(education=education)
-            
-            location = request.query_params.get('location')
-            if location:
-                matches = matches.filter(location=location)
+        # Without a profile there are no preferences to rank by
+        if not user_profile:
+            matches = matching.unranked_candidates(
+                Profile.objects.exclude(user=request.user).select_related('user', *LOOKUP_RELATIONS)
+            )
+            try:
+                page, next_cursor = matching.paginate(matches, cursor, limit)
+            except matching.InvalidCursor:
+                return Response({"detail": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+            serializer = MatchSerializer(page, many=True, context=self.get_serializer_context())
+            return response_cache.uncached(Response({"results": serializer.data, "next": next_cursor}))
         
-        serializer = self.get_serializer(matches, many=True)
-        return Response(serializer.data)
+        # Search filters, as lookups on the candidate's profile. Religion and
+        # location go through the same aliases as profiles, then compare ids;
+        # a name nobody has matches nothing, until somebody has it
+        criteria = {}
+        age_min = request.query_params.get('age_min')
+        age_max = request.query_params.get('age_max')
+        if age_min and age_max:
+            criteria.update(age__gte=age_min, age__lte=age_max)
+        
+        religion = request.query_params.get('religion')
+        if religion:
+            religion = lookups.resolve(Religion, religion)
+            if religion is None:
+                return response_cache.uncached(Response({"results": [], "next": None}))
+            criteria['religion_id'] = religion.pk
+        
+        marital_status = request.query_params.get('marital_status')
+        if marital_status:
+            criteria['marital_status'] = marital_status
+        
+        education = request.query_params.get('education')
+        if education:
+            criteria['education'] = education
+        
+        location = request.query_params.get('location')
+        if location:
+            location = lookups.resolve(Location, location)
+            if location is None:
+                return response_cache.uncached(Response({"results": [], "next": None}))
+            criteria['location_id'] = location.pk
+        
+        # Candidates living within radius_km of the viewer. The geohash
+        # cells around the viewer narrow the locations down before the
+        # exact distance check; candidates are then matched by location id
+        radius_km = request.query_params.get('radius_km')
+        if radius_km:
+            try:
+                radius_km = float(radius_km)
+            except ValueError:
+                radius_km = None
+            if radius_km is None or not math.isfinite(radius_km) or radius_km <= 0:
+                return Response({"detail": "Invalid radius_km"}, status=status.HTTP_400_BAD_REQUEST)
+            origin = user_profile.location
+            if origin.latitude is None:
+                return Response(
+                    {"detail": "Your location could not be geocoded"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            criteria['location_id__in'] = geo.within(Location.objects.all(), origin.latitude, origin.longitude, radius_km)
+        
+        # Reciprocal matches are precomputed, best first; filters narrow the
+        # viewer's index entries
+        entries = (
+            MutualMatch.objects
+            .filter(profile=user_profile, **{f'candidate__{name}': value for name, value in criteria.items()})
+            .select_related('candidate__user', *(f'candidate__{name}' for name in LOOKUP_RELATIONS))
+            .order_by('-score', 'candidate_id')
+        )
+        try:
+            page, next_cursor = matching.paginate(
+                entries, cursor, limit, score_field='score', id_field='candidate_id'
+            )
+        except matching.InvalidCursor:
+            return Response({"detail": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # A short page is the true end unless the list may have left
+        # candidates out; only then is it completed by ranking the table
+        # live, from the same cursor. Nothing invalidates such a page when
+        # candidates outside the list change, so it is not cached
+        if next_cursor is None and not match_index.is_complete(user_profile):
+            page, next_cursor = ranked_live(user_profile, criteria, cursor, limit)
+            serializer = MatchSerializer(page, many=True, context=self.get_serializer_context())
+            return response_cache.uncached(Response({"results": serializer.data, "next": next_cursor}))
+        
+        candidates = []
+        for entry in page:
+            entry.candidate.match_score = entry.score
+            candidates.append(entry.candidate)
+        serializer = MatchSerializer(candidates, many=True, context=self.get_serializer_context())
+        return Response({"results": serializer.data, "next": next_cursor})
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(response_cache.stats())
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def token_cache_stats(self, request):
+        return Response(token_cache.stats())
 
     @action(detail=True, methods=['post'])
     def express_interest(self, request, pk=None):
@@ -121,29 +249,25 @@ class ProfileViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check if interest already exists
-            if Interest.objects.filter(sender=request.user, receiver=target_profile.user).exists():
+            interest, created = interests.express(request.user.id, target_profile.user_id)
+            if not created:
                 # Instead of error, return success with already_expressed flag
                 return Response(
                     {
                         "detail": "You have already expressed interest in this profile",
                         "already_expressed": True,
+                        "mutual": interest.mutual_at is not None,
                         "user_id": target_profile.user.id,
                         "user_name": target_profile.user.first_name
                     },
                     status=status.HTTP_200_OK
                 )
             
-            # Create new interest
-            Interest.objects.create(
-                sender=request.user,
-                receiver=target_profile.user
-            )
-            
             return Response(
                 {
                     "detail": "Interest expressed successfully",
                     "already_expressed": False,
+                    "mutual": interest.mutual_at is not None,
                     "user_id": target_profile.user.id,
                     "user_name": target_profile.user.first_name
                 },
@@ -161,6 +285,40 @@ class ProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['post'])
+    def accept_interest(self, request, pk=None):
+        # pk is the user id of the sender, as in express_interest
+        try:
+            interest = interests.accept(request.user.id, int(pk))
+        except (ValueError, Interest.DoesNotExist):
+            return Response(
+                {"detail": "This user has not expressed interest in you"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = InterestSerializer(interest, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    def interest_page(self, request, listing):
+        limit = matching.page_size(request.query_params.get('limit'))
+        try:
+            page, next_cursor = interests.paginate(listing, request.query_params.get('cursor'), limit)
+        except matching.InvalidCursor:
+            return Response({"detail": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = InterestSerializer(page, many=True, context=self.get_serializer_context())
+        return Response({"results": serializer.data, "next": next_cursor})
+
+    @action(detail=False, methods=['get'])
+    def interests_sent(self, request):
+        return self.interest_page(request, interests.sent(request.user))
+
+    @action(detail=False, methods=['get'])
+    def interests_received(self, request):
+        return self.interest_page(request, interests.received(request.user))
+
+    @action(detail=False, methods=['get'])
+    def mutual_interests(self, request):
+        return self.interest_page(request, interests.mutual(request.user))
+
 class ContactViewSet(viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer